@@ -0,0 +1,314 @@
+"""Benchmarks for ThreadsClient, run against in-process fakes (no network).
+
+    python benchmarks/bench_threads_client.py                  # JSON to stdout
+    python benchmarks/bench_threads_client.py --output bench.json --quick
+    python benchmarks/bench_threads_client.py --http           # also via a local mock server
+
+Sections:
+    request_overhead    per-call cost of _request over zero-latency transports
+    post_thread         end-to-end post_thread latency split into create / poll / publish
+    polling_throughput  container status checks per second, serial and threaded
+    concurrent_publish  publish_many (sync and async) throughput with simulated latency
+    memory              tracemalloc and RSS footprint of N network-free client instances
+
+Compare two JSON files from different versions to spot regressions.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from threads_client import AsyncFakeTransport, AsyncThreadsClient, ContainerPoller, FakeTransport, ThreadsClient  # noqa: E402
+from threads_mock_server import MockThreadsAPI, MockThreadsServer, MockTransport  # noqa: E402
+
+USER_ID = '17900000000000001'
+
+
+def _summary(samples) -> dict:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def _fake_transport(latency=0.0, transport_class=FakeTransport):
+    transport = transport_class(latency=latency)
+    transport.add('GET', '/me', {'id': USER_ID, 'username': 'bench'})
+    transport.add('POST', '/threads', {'id': '1790000000000000'})
+    transport.add('GET', '/1790000000000000', {'id': '1790000000000000', 'status': 'FINISHED'})
+    transport.add('POST', '/threads_publish', {'id': '1800000000000000'})
+    transport.add('GET', '/threads_publishing_limit', {'data': [{'quota_usage': 0, 'config': {'quota_total': 250}}]})
+    return transport
+
+
+def _mock_client(api=None, **kwargs):
+    api = api or MockThreadsAPI()
+    token = api.issue_token(user_id=USER_ID)
+    return ThreadsClient(token, transport=MockTransport(api), user_id=USER_ID, **kwargs), api
+
+
+def bench_request_overhead(iterations, use_http) -> dict:
+    results = {}
+    client = ThreadsClient('bench-token', transport=_fake_transport(), user_id=USER_ID)
+    url = f'{client.base_url_v1}/me'
+    for _ in range(min(iterations, 100)):
+        client._request('GET', url, params={'fields': 'id'})
+    started = time.perf_counter()
+    for _ in range(iterations):
+        client._request('GET', url, params={'fields': 'id'})
+    elapsed = time.perf_counter() - started
+    results['fake_transport'] = {'calls': iterations, 'us_per_call': elapsed / iterations * 1e6}
+
+    client, _ = _mock_client()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        client.retrieve_profiles()
+    elapsed = time.perf_counter() - started
+    results['mock_transport'] = {'calls': iterations, 'us_per_call': elapsed / iterations * 1e6}
+
+    if use_http:
+        api = MockThreadsAPI()
+        token = api.issue_token(user_id=USER_ID)
+        with MockThreadsServer(api) as server:
+            client = ThreadsClient(token, base_url_v1=server.base_url_v1, user_id=USER_ID)
+            calls = max(iterations // 10, 100)
+            client.retrieve_profiles()
+            started = time.perf_counter()
+            for _ in range(calls):
+                client.retrieve_profiles()
+            elapsed = time.perf_counter() - started
+            client.close()
+        results['http_mock_server'] = {'calls': calls, 'us_per_call': elapsed / calls * 1e6}
+    return results
+
+
+def bench_post_thread(posts) -> dict:
+    results = {}
+    for media_type, image_url, delay in (('TEXT', None, 0.0), ('IMAGE', 'https://example.invalid/a.jpg', 0.05)):
+        api = MockThreadsAPI(processing_delays={media_type: delay}, publish_limit=posts + 1)
+        client, _ = _mock_client(api, poller=ContainerPoller(initial_interval=0.01))
+        stages = {'create': [], 'poll': [], 'publish': []}
+        totals = []
+        create_thread, publish_thread = client.create_thread, client.publish_thread
+        poll_started = [None]
+
+        def timed_create(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return create_thread(*args, **kwargs)
+            finally:
+                stages['create'].append(time.perf_counter() - started)
+                poll_started[0] = time.perf_counter()
+
+        def timed_publish(*args, **kwargs):
+            stages['poll'].append(time.perf_counter() - poll_started[0])
+            started = time.perf_counter()
+            try:
+                return publish_thread(*args, **kwargs)
+            finally:
+                stages['publish'].append(time.perf_counter() - started)
+
+        client.create_thread, client.publish_thread = timed_create, timed_publish
+        for i in range(posts):
+            started = time.perf_counter()
+            client.post_thread(f'benchmark post {i}', image_url)
+            totals.append(time.perf_counter() - started)
+        results[media_type] = {
+            'processing_delay_s': delay,
+            'total': _summary(totals),
+            **{stage: _summary(samples) for stage, samples in stages.items()},
+        }
+    return results
+
+
+def bench_polling_throughput(polls, latency) -> dict:
+    results = {}
+    client, _ = _mock_client()
+    container_id = client.create_thread('poll me')['id']
+    started = time.perf_counter()
+    for _ in range(polls):
+        client.get_container_status(container_id)
+    elapsed = time.perf_counter() - started
+    results['serial_zero_latency'] = {'polls': polls, 'polls_per_sec': polls / elapsed}
+
+    client = ThreadsClient('bench-token', transport=_fake_transport(latency), user_id=USER_ID)
+    threaded_polls = max(polls // 10, 100)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(lambda _: client.get_container_status('1790000000000000'), range(threaded_polls)))
+    elapsed = time.perf_counter() - started
+    results['threaded_32_workers'] = {
+        'polls': threaded_polls, 'latency_s': latency, 'polls_per_sec': threaded_polls / elapsed,
+    }
+    return results
+
+
+def bench_concurrent_publish(posts, latency) -> dict:
+    results = {}
+    client = ThreadsClient('bench-token', transport=_fake_transport(latency), user_id=USER_ID)
+    started = time.perf_counter()
+    outcomes = list(client.publish_many([f'post {i}' for i in range(posts)], max_workers=32))
+    elapsed = time.perf_counter() - started
+    results['sync_publish_many'] = {
+        'posts': posts, 'latency_s': latency, 'errors': sum(1 for o in outcomes if o['error']),
+        'seconds': elapsed, 'posts_per_sec': posts / elapsed,
+    }
+
+    async def run_async():
+        transport = _fake_transport(latency, AsyncFakeTransport)
+        async with AsyncThreadsClient('bench-token', transport=transport, user_id=USER_ID) as async_client:
+            return [outcome async for outcome in async_client.publish_many(
+                [f'post {i}' for i in range(posts)], max_concurrency=256,
+            )]
+
+    started = time.perf_counter()
+    outcomes = asyncio.run(run_async())
+    elapsed = time.perf_counter() - started
+    results['async_publish_many'] = {
+        'posts': posts, 'latency_s': latency, 'errors': sum(1 for o in outcomes if o['error']),
+        'seconds': elapsed, 'posts_per_sec': posts / elapsed,
+    }
+    return results
+
+
+def _memory_factory(label):
+    if label == 'shared_transport':
+        shared = FakeTransport()
+        return lambda i: ThreadsClient(f'token-{i}', user_id=str(i), transport=shared)
+    return lambda i: ThreadsClient(f'token-{i}', user_id=str(i))
+
+
+def _rss_bytes():
+    """Resident set size of this process (Linux /proc only, else None)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _rss_probe(label, count):
+    """Print the RSS growth from building `count` clients (run in a fresh interpreter)."""
+    factory = _memory_factory(label)
+    factory(-1).close()
+    gc.collect()
+    before = _rss_bytes()
+    clients = [factory(i) for i in range(count)]
+    after = _rss_bytes()
+    print(json.dumps(None if before is None else after - before))
+    for client in clients:
+        client.close()
+
+
+def _rss_growth(label, count):
+    """RSS growth measured in a subprocess, so earlier sections' freed memory can't hide it.
+
+    tracemalloc only sees Python objects; native allocations (SQLite
+    connections, OpenSSL contexts) only show up here.
+    """
+    try:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--rss-probe', label, str(count)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    except (subprocess.CalledProcessError, ValueError, IndexError):
+        return None
+
+
+def bench_memory(counts) -> dict:
+    results = {}
+    for count in counts:
+        for label in ('default_transport', 'shared_transport'):
+            factory = _memory_factory(label)
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            clients = [factory(i) for i in range(count)]
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+            result = {'clients': count, 'total_kib': allocated / 1024, 'bytes_per_client': allocated / count}
+            for client in clients:
+                client.close()
+            del clients
+            rss = _rss_growth(label, count)
+            if rss is not None:
+                result.update({'rss_kib': rss / 1024, 'rss_bytes_per_client': rss / count})
+            results[f'{label}_{count}'] = result
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--quick', action='store_true', help='smaller iteration counts')
+    parser.add_argument('--http', action='store_true', help='also measure over a local MockThreadsServer')
+    parser.add_argument('--latency', type=float, default=0.01, help='simulated API latency for concurrency runs')
+    parser.add_argument('--only', nargs='*', help='run only these sections')
+    parser.add_argument('--rss-probe', nargs=2, metavar=('LABEL', 'COUNT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.rss_probe:
+        _rss_probe(args.rss_probe[0], int(args.rss_probe[1]))
+        return
+
+    scale = 0.1 if args.quick else 1.0
+    sections = {
+        'request_overhead': lambda: bench_request_overhead(int(20000 * scale), args.http),
+        'post_thread': lambda: bench_post_thread(max(int(200 * scale), 10)),
+        'polling_throughput': lambda: bench_polling_throughput(int(20000 * scale), args.latency),
+        'concurrent_publish': lambda: bench_concurrent_publish(max(int(1000 * scale), 50), args.latency),
+        'memory': lambda: bench_memory([1000] if args.quick else [1000, 10000]),
+    }
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+        },
+    }
+    for name, run in sections.items():
+        if args.only and name not in args.only:
+            continue
+        started = time.perf_counter()
+        report[name] = run()
+        report[name]['section_seconds'] = time.perf_counter() - started
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from threads_client import (
+    FakeTransport,
+    RetryBudget,
+    ThreadsClient,
+    ThreadsRateLimitError,
+    ThreadsTransientError,
+)
+
+
+@pytest.fixture
+def client():
+    client = ThreadsClient(
+        'token', transport=FakeTransport(), user_id='1', coalesce_gets=False, retry_budget=RetryBudget(burst=100),
+    )
+    yield client
+    client.close()
+
+
+def test_retry_budget_caps_retries_at_a_fraction_of_traffic():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, burst=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_retry_budget_refills_over_time_up_to_burst():
+    budget = RetryBudget(ratio=0, min_per_second=100, burst=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    time.sleep(0.02)
+    assert budget.withdraw()
+    time.sleep(0.05)
+    assert budget.balance == pytest.approx(1)
+
+
+def test_retry_delay_uses_decorrelated_jitter(client):
+    error = ThreadsTransientError('boom')
+    delays = [client._retry_delay(error, 10) for _ in range(10)]
+    assert all(client.INITIAL_BACKOFF_SECONDS <= delay <= 30 for delay in delays)
+    assert len(set(delays)) > 1
+    assert client._retry_delay(error, 1000) <= client.MAX_BACKOFF_SECONDS
+
+
+def test_retry_delay_honours_retry_after(client):
+    error = ThreadsRateLimitError('slow down', retry_after=42)
+    delay = client._retry_delay(error, 5)
+    assert 42 <= delay <= 42 + client.INITIAL_BACKOFF_SECONDS
+
+
+def test_retry_after_beyond_the_wait_limit_gives_up(client):
+    error = ThreadsRateLimitError('slow down', retry_after=client.MAX_RETRY_WAIT_SECONDS + 1)
+    with pytest.raises(ThreadsRateLimitError, match='asked to wait'):
+        client._retry_delay(error, 5)
+
+
+def test_retry_delay_gives_up_when_the_budget_is_empty():
+    client = ThreadsClient(
+        'token', transport=FakeTransport(), user_id='1',
+        retry_budget=RetryBudget(ratio=0, min_per_second=0, burst=0),
+    )
+    with pytest.raises(ThreadsTransientError, match='retry budget exhausted'):
+        client._retry_delay(ThreadsTransientError('boom'), 5)
+    client.close()
+
+
+def test_long_retry_after_fails_the_call_without_retrying():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'error': {'code': 4}}, status=429, headers={'Retry-After': '3600'})
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+    with pytest.raises(ThreadsRateLimitError, match='asked to wait 3600s'):
+        client.retrieve_profiles()
+    assert len(transport.requests) == 1
+    client.close()
+
+
+def test_empty_retry_budget_stops_retries(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+    transport = FakeTransport()
+    transport.add('GET', '/me', status=500)
+    client = ThreadsClient(
+        'token', transport=transport, user_id='1', coalesce_gets=False,
+        retry_budget=RetryBudget(ratio=0, min_per_second=0, burst=1),
+    )
+    with pytest.raises(ThreadsTransientError, match='retry budget exhausted'):
+        client.retrieve_profiles()
+    assert len(transport.requests) == 2
+    client.close()
+
+
+@pytest.mark.parametrize('percent, expected', [(50, 0.0), (80, 0.0), (90, 5.0), (100, 10.0)])
+def test_usage_above_the_threshold_pauses_the_next_call(client, percent, expected):
+    client._record_usage({'x-app-usage': f'{{"call_count": {percent}}}'})
+    assert client.api_usage['max_percent'] == percent
+    assert client._usage_pause() == pytest.approx(expected, abs=0.1)
+
+
+def test_usage_headers_on_responses_throttle_the_client(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'USAGE_MAX_PAUSE_SECONDS', 0.2)
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1'}, headers={'X-App-Usage': '{"call_count": 100}'})
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+    client.retrieve_profiles()
+    assert client.api_usage['max_percent'] == 100
+    started = time.monotonic()
+    client.retrieve_profiles()
+    assert time.monotonic() - started >= 0.15
+    client.close()
@@ -0,0 +1,151 @@
+import time
+
+import pytest
+
+from threads_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FakeTransport,
+    RateLimiter,
+    ThreadsClient,
+    ThreadsPermanentError,
+    ThreadsTransientError,
+)
+
+
+def test_breaker_opens_at_the_failure_rate():
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= breaker.open_seconds
+
+
+def test_breaker_needs_min_calls_before_opening():
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_forgets_outcomes_outside_the_window():
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=2, window=0.02)
+    breaker.record_failure()
+    time.sleep(0.03)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['calls'] == 1
+
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.01, probes=2)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['calls'] == 0
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_released_probe_slot_can_be_claimed_again():
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+
+
+def test_open_circuit_fails_fast_without_spending_call_budget(fast_backoff):
+    transport = FakeTransport()
+    transport.add('GET', '/me', status=500)
+    limiter = RateLimiter(capacity=100)
+    client = ThreadsClient(
+        'token', transport=transport, user_id='1', coalesce_gets=False, rate_limiter=limiter,
+        circuit_breakers={'me': CircuitBreaker(min_calls=2, open_seconds=60)},
+    )
+    with pytest.raises(CircuitOpenError) as excinfo:
+        client.retrieve_profiles()
+    assert isinstance(excinfo.value.__cause__, ThreadsTransientError)
+    assert len(transport.requests) == 2
+    remaining = limiter.remaining
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        client.retrieve_profiles()
+    assert excinfo.value.circuit == 'me'
+    assert excinfo.value.retry_after > 0
+    assert len(transport.requests) == 2
+    assert limiter.remaining == remaining
+    assert client.circuit_states()['me']['state'] == CircuitBreaker.OPEN
+    client.close()
+
+
+def test_circuits_are_tracked_per_endpoint(fast_backoff):
+    transport = FakeTransport()
+    transport.add('GET', '/me', status=500)
+    transport.add('GET', '/container', {'status': 'FINISHED'})
+    client = ThreadsClient(
+        'token', transport=transport, user_id='1', coalesce_gets=False,
+        circuit_breaker_factory=lambda: CircuitBreaker(min_calls=2),
+    )
+    with pytest.raises(CircuitOpenError):
+        client.retrieve_profiles()
+    assert client.get_container_status('container') == 'FINISHED'
+    states = client.circuit_states()
+    assert states['me']['state'] == CircuitBreaker.OPEN
+    assert states['container_status']['state'] == CircuitBreaker.CLOSED
+    client.close()
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'error': {'code': 100}}, status=400)
+    client = ThreadsClient(
+        'token', transport=transport, user_id='1', coalesce_gets=False,
+        circuit_breaker_factory=lambda: CircuitBreaker(min_calls=1),
+    )
+    for _ in range(3):
+        with pytest.raises(ThreadsPermanentError):
+            client.retrieve_profiles()
+    state = client.circuit_states()['me']
+    assert (state['state'], state['calls'], state['failures']) == (CircuitBreaker.CLOSED, 3, 0)
+    client.close()
+
+
+def test_disabled_breakers():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1'})
+    client = ThreadsClient('token', transport=transport, user_id='1', circuit_breaker_factory=None)
+    assert client.retrieve_profiles() == {'id': '1'}
+    assert client.circuit_breaker('me') is None
+    assert client.circuit_states() == {}
+    client.close()
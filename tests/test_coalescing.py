@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from threads_client import (
+    AsyncFakeTransport,
+    AsyncThreadsClient,
+    DeadlineExceeded,
+    FakeTransport,
+    ThreadsClient,
+    ThreadsPermanentError,
+    deadline_scope,
+)
+
+
+def run_concurrently(*callables):
+    """Start each callable in its own thread, staggered so the first one leads; returns results or exceptions."""
+    results = [None] * len(callables)
+
+    def run(index, fn):
+        try:
+            results[index] = fn()
+        except BaseException as e:
+            results[index] = e
+
+    threads = []
+    for index, fn in enumerate(callables):
+        thread = threading.Thread(target=run, args=(index, fn))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def make_client(transport, **kwargs):
+    return ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=True, **kwargs)
+
+
+def test_identical_gets_share_one_request():
+    transport = FakeTransport(latency=0.2)
+    transport.add('GET', '/me', {'id': '1', 'tags': []})
+    client = make_client(transport)
+    results = run_concurrently(*[client.retrieve_profiles] * 5)
+    assert len(transport.requests) == 1
+    assert all(result == {'id': '1', 'tags': []} for result in results)
+    # Every caller gets its own copy of the body
+    results[0]['tags'].append('mine')
+    assert results[1]['tags'] == []
+
+
+def test_api_errors_are_shared():
+    transport = FakeTransport(latency=0.2)
+    transport.add('GET', '/me', {'error': {'message': 'bad', 'code': 100}}, status=400)
+    client = make_client(transport)
+    results = run_concurrently(*[client.retrieve_profiles] * 3)
+    assert len(transport.requests) == 1
+    assert all(isinstance(result, ThreadsPermanentError) for result in results)
+
+
+def test_disabled_coalescing_sends_every_call():
+    transport = FakeTransport(latency=0.1)
+    transport.add('GET', '/me', {'id': '1'})
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+    run_concurrently(client.retrieve_profiles, client.retrieve_profiles)
+    assert len(transport.requests) == 2
+
+
+def test_interrupted_leader_does_not_interrupt_waiters():
+    calls = []
+
+    class InterruptFirst(FakeTransport):
+        def request(self, method, url, **kwargs):
+            calls.append(url)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                raise KeyboardInterrupt
+            return super().request(method, url, **kwargs)
+
+    transport = InterruptFirst()
+    transport.add('GET', '/me', {'id': '1'})
+    client = make_client(transport)
+    leader, *waiters = run_concurrently(*[client.retrieve_profiles] * 3)
+    assert isinstance(leader, KeyboardInterrupt)
+    assert waiters == [{'id': '1'}, {'id': '1'}]
+    assert not client._in_flight
+
+
+def test_caller_with_a_deadline_never_leads():
+    transport = FakeTransport(latency=0.3)
+    transport.add('GET', '/me', {'id': '1'})
+    client = make_client(transport)
+
+    def with_deadline():
+        with deadline_scope(0.1):
+            return client.retrieve_profiles()
+
+    hurried, patient = run_concurrently(with_deadline, client.retrieve_profiles)
+    assert isinstance(hurried, DeadlineExceeded)
+    assert patient == {'id': '1'}
+
+
+def test_async_identical_gets_share_one_request():
+    async def main():
+        transport = AsyncFakeTransport(latency=0.1)
+        transport.add('GET', '/me', {'id': '1'})
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=True)
+        results = await asyncio.gather(*[client.retrieve_profiles() for _ in range(5)])
+        return results, transport
+
+    results, transport = asyncio.run(main())
+    assert results == [{'id': '1'}] * 5
+    assert len(transport.requests) == 1
+
+
+def test_async_cancelled_caller_does_not_cancel_the_shared_call():
+    async def main():
+        transport = AsyncFakeTransport(latency=0.1)
+        transport.add('GET', '/me', {'id': '1'})
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=True)
+        first = asyncio.ensure_future(client.retrieve_profiles())
+        second = asyncio.ensure_future(client.retrieve_profiles())
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled(), transport
+
+    result, cancelled, transport = asyncio.run(main())
+    assert (result, cancelled) == ({'id': '1'}, True)
+    assert len(transport.requests) == 1
+
+
+def test_async_waiters_retry_when_the_shared_call_is_cancelled():
+    async def main():
+        transport = AsyncFakeTransport(latency=0.1)
+        transport.add('GET', '/me', {'id': '1'})
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=True)
+        waiters = [asyncio.ensure_future(client.retrieve_profiles()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        (flight,) = client._in_flight.values()
+        flight.future.cancel()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(main()) == [{'id': '1'}] * 2
+
+
+def test_async_deadline_caller_never_leads():
+    async def main():
+        transport = AsyncFakeTransport(latency=0.3)
+        transport.add('GET', '/me', {'id': '1'})
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=True)
+
+        async def with_deadline():
+            with deadline_scope(0.1):
+                return await client.retrieve_profiles()
+
+        return await asyncio.gather(with_deadline(), client.retrieve_profiles(), return_exceptions=True)
+
+    hurried, patient = asyncio.run(main())
+    assert isinstance(hurried, DeadlineExceeded)
+    assert patient == {'id': '1'}
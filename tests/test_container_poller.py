@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from threads_client import ContainerPoller, ThreadsClient, ThreadsPermanentError
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+def delays(schedule, count):
+    return [schedule.next_delay() for _ in range(count)]
+
+
+def test_first_check_is_immediate_then_grows_exponentially():
+    poller = ContainerPoller(initial_interval=1.0, multiplier=2.0, max_interval=5.0, jitter=0.0)
+    assert delays(poller.start('TEXT'), 6) == [0.0, 1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_jitter_stays_within_its_fraction():
+    poller = ContainerPoller(initial_interval=1.0, jitter=0.2)
+    for _ in range(50):
+        assert 0.8 <= delays(poller.start(), 2)[1] <= 1.2
+
+
+def test_sleeps_never_pass_the_media_type_deadline():
+    poller = ContainerPoller(initial_interval=10.0, jitter=0.0, deadlines={'TEXT': 0.1})
+    schedule = poller.start('TEXT')
+    assert schedule.next_delay() == 0.0
+    assert schedule.next_delay() <= 0.1
+    time.sleep(0.11)
+    assert schedule.next_delay() is None
+
+
+def test_unknown_media_types_use_the_text_deadline():
+    poller = ContainerPoller()
+    assert poller.deadline_for('VIDEO') == 900
+    assert poller.deadline_for('REEL') == ContainerPoller.DEFAULT_DEADLINES['TEXT']
+
+
+def test_expected_time_follows_recorded_samples():
+    poller = ContainerPoller()
+    assert poller.expected('IMAGE') is None
+    for _ in range(20):
+        poller.record('IMAGE', 3.0)
+    assert 3.0 / 2 ** 0.5 <= poller.expected('IMAGE') <= 3.0 * 2 ** 0.5
+    assert poller.expected('TEXT') is None
+
+
+def test_old_samples_decay_so_the_estimate_converges_on_new_behaviour():
+    poller = ContainerPoller(max_samples=20)
+    for _ in range(20):
+        poller.record('VIDEO', 60.0)
+    for _ in range(40):
+        poller.record('VIDEO', 5.0)
+    assert 5.0 / 2 ** 0.5 <= poller.expected('VIDEO') <= 5.0 * 2 ** 0.5
+
+
+def test_first_sleep_targets_the_expected_completion():
+    poller = ContainerPoller(initial_interval=10.0, jitter=0.0)
+    for _ in range(10):
+        poller.record('IMAGE', 2.0)
+    schedule = poller.start('IMAGE')
+    first, second, third = delays(schedule, 3)
+    assert first == 0.0
+    assert second == pytest.approx(poller.expected('IMAGE'), abs=0.01)
+    # Later sleeps fall back to the exponential schedule
+    assert third == 20.0
+
+
+def test_first_sleep_is_never_below_the_minimum():
+    poller = ContainerPoller(jitter=0.0)
+    poller.record('TEXT', 0.001)
+    assert delays(poller.start('TEXT'), 2)[1] == ContainerPoller.MIN_SLEEP_SECONDS
+
+
+def test_finished_records_the_midpoint_of_the_last_interval():
+    poller = ContainerPoller(initial_interval=0.1, jitter=0.0)
+    schedule = poller.start('TEXT')
+    schedule.next_delay()
+    time.sleep(schedule.next_delay())
+    schedule.finished()
+    # Completion lies between the first check (t=0) and now (t=0.1)
+    assert poller.expected('TEXT') <= 0.1
+
+
+def test_post_thread_learns_the_processing_time():
+    api = MockThreadsAPI(processing_delays={'TEXT': 0.2})
+    poller = ContainerPoller(initial_interval=0.01, jitter=0.0)
+    client = ThreadsClient(api.issue_token(user_id='1'), transport=MockTransport(api), user_id='1', poller=poller)
+
+    def status_checks():
+        before = api.request_count
+        client.post_thread('hello')
+        # create + publish, the rest are status checks
+        return api.request_count - before - 2
+
+    cold = status_checks()
+    for _ in range(3):
+        status_checks()
+    warm = status_checks()
+    assert warm < cold
+    assert warm <= 3
+    assert 0.1 <= poller.expected('TEXT') <= 0.3
+    client.close()
+
+
+def test_post_thread_fails_on_an_error_container():
+    api = MockThreadsAPI(processing_delays={'TEXT': 0}, error_rate=1.0)
+    client = ThreadsClient(
+        api.issue_token(user_id='1'), transport=MockTransport(api), user_id='1',
+        poller=ContainerPoller(initial_interval=0.01),
+    )
+    with pytest.raises(ThreadsPermanentError, match='status=ERROR'):
+        client.post_thread('hello')
+    client.close()
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from threads_client import (
+    AsyncFakeTransport,
+    AsyncThreadsClient,
+    ContainerPoller,
+    Deadline,
+    DeadlineExceeded,
+    FakeTransport,
+    ThreadsClient,
+    deadline_scope,
+)
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+class RecordingTransport(FakeTransport):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeouts = []
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None):
+        self.timeouts.append(timeout)
+        return super().request(method, url, params, data, json, headers, timeout)
+
+
+def test_read_timeout_none_means_no_limit():
+    transport = FakeTransport(latency=0.01)
+    transport.add('GET', '/me', {'id': '1'})
+    client = ThreadsClient('token', transport=transport, user_id='1', read_timeout=None)
+    assert client.retrieve_profiles() == {'id': '1'}
+    assert len(transport.requests) == 1
+
+
+def test_read_timeout_none_with_mock_transport():
+    api = MockThreadsAPI()
+    client = ThreadsClient(
+        api.issue_token(user_id='1'), transport=MockTransport(api, latency=0.01), read_timeout=None,
+    )
+    assert client.retrieve_profiles()['id'] == '1'
+
+
+def test_read_timeout_none_with_the_async_client():
+    async def main():
+        transport = AsyncFakeTransport(latency=0.01)
+        transport.add('GET', '/me', {'id': '1'})
+        async with AsyncThreadsClient('token', transport=transport, read_timeout=None) as client:
+            return await client.retrieve_profiles()
+
+    assert asyncio.run(main()) == {'id': '1'}
+
+
+def test_slow_response_times_out_at_the_read_timeout(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+    transport = FakeTransport(latency=0.2)
+    transport.add('GET', '/me', {'id': '1'})
+    client = ThreadsClient('token', transport=transport, user_id='1', read_timeout=0.01)
+    with pytest.raises(Exception, match='read timeout'):
+        client.retrieve_profiles()
+    assert len(transport.requests) == 0  # the fake never got to answer
+
+
+def test_deadline_expiry():
+    deadline = Deadline(0.02)
+    assert not deadline.expired()
+    assert 0 < deadline.remaining() <= 0.02
+    deadline.check()
+    time.sleep(0.03)
+    assert deadline.expired()
+    assert deadline.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+    assert Deadline.coerce(deadline) is deadline
+
+
+def test_nested_scopes_keep_the_earlier_deadline():
+    with deadline_scope(10) as outer:
+        with deadline_scope(60) as inner:
+            assert inner is outer
+        with deadline_scope(1) as inner:
+            assert inner.expires_at < outer.expires_at
+    with deadline_scope(None) as current:
+        assert current is None
+
+
+def test_timeouts_are_capped_to_the_deadline():
+    transport = RecordingTransport()
+    transport.add('GET', '/me', {'id': '1'})
+    client = ThreadsClient('token', transport=transport, user_id='1', connect_timeout=5.0, read_timeout=30.0)
+    client.retrieve_profiles()
+    with deadline_scope(2):
+        client.retrieve_profiles()
+    assert transport.timeouts[0] == (5.0, 30.0)
+    connect, read = transport.timeouts[1]
+    assert connect <= 2 and read <= 2
+
+
+def test_backoff_that_would_pass_the_deadline_raises():
+    transport = FakeTransport()
+    transport.add('GET', '/me', status=500)
+    client = ThreadsClient('token', transport=transport, user_id='1')
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with deadline_scope(1):
+            client.retrieve_profiles()
+    assert time.monotonic() - started < 1
+    assert len(transport.requests) == 1
+
+
+def test_post_thread_deadline_bounds_status_polling():
+    api = MockThreadsAPI(processing_delays={'IMAGE': 10.0})
+    client = ThreadsClient(
+        api.issue_token(user_id='1'), transport=MockTransport(api), user_id='1',
+        poller=ContainerPoller(initial_interval=0.05),
+    )
+    with pytest.raises(DeadlineExceeded):
+        client.post_thread('hello', image_url='https://example.invalid/a.jpg', deadline=0.3)
+    assert not api.media
@@ -0,0 +1,150 @@
+import email.utils
+import time
+
+import pytest
+
+from threads_client import (
+    PUBLISH_LIMIT_SUBCODE,
+    FakeTransport,
+    ThreadsAuthError,
+    ThreadsClient,
+    ThreadsPermanentError,
+    ThreadsRateLimitError,
+    ThreadsTokenExpiredError,
+    ThreadsTransientError,
+    _graph_error,
+    _parse_retry_after,
+    _parse_usage_headers,
+)
+
+
+def graph_body(code=None, subcode=None, message='', is_transient=None):
+    error = {'message': message, 'type': 'OAuthException', 'fbtrace_id': 'A1b2C3'}
+    if code is not None:
+        error['code'] = code
+    if subcode is not None:
+        error['error_subcode'] = subcode
+    if is_transient is not None:
+        error['is_transient'] = is_transient
+    return {'error': error}
+
+
+@pytest.mark.parametrize('status, body, error_class', [
+    (401, graph_body(190), ThreadsTokenExpiredError),
+    (400, graph_body(190, subcode=463), ThreadsTokenExpiredError),
+    (400, graph_body(190, message='Session has expired'), ThreadsTokenExpiredError),
+    (400, graph_body(190, subcode=460), ThreadsAuthError),
+    (429, {}, ThreadsRateLimitError),
+    (400, graph_body(4), ThreadsRateLimitError),
+    (400, graph_body(17), ThreadsRateLimitError),
+    (400, graph_body(32), ThreadsRateLimitError),
+    (400, graph_body(613), ThreadsRateLimitError),
+    (400, graph_body(80001), ThreadsRateLimitError),
+    (500, {}, ThreadsTransientError),
+    (503, 'Service Unavailable', ThreadsTransientError),
+    (400, graph_body(2), ThreadsTransientError),
+    (400, graph_body(9999, is_transient=True), ThreadsTransientError),
+    (400, graph_body(100), ThreadsPermanentError),
+    (404, graph_body(803), ThreadsPermanentError),
+])
+def test_graph_errors_are_classified(status, body, error_class):
+    error = _graph_error(status, body, url='https://graph.threads.net/v1.0/me')
+    assert type(error) is error_class
+    assert error.status_code == status
+    assert error.retryable == error_class.retryable
+
+
+def test_graph_error_fields_are_parsed():
+    error = _graph_error(400, graph_body(100, subcode=33, message='Invalid parameter'), url='https://x/1')
+    assert (error.code, error.error_subcode, error.error_type, error.fbtrace_id) == (100, 33, 'OAuthException', 'A1b2C3')
+    assert error.url == 'https://x/1'
+    assert not error.retryable
+
+
+def test_publish_limit_is_not_retryable():
+    error = _graph_error(400, graph_body(4, subcode=PUBLISH_LIMIT_SUBCODE))
+    assert isinstance(error, ThreadsRateLimitError)
+    assert not error.retryable
+
+
+def test_retry_after_seconds_and_http_date():
+    assert _parse_retry_after('7') == 7.0
+    assert _parse_retry_after('-3') == 0.0
+    assert _parse_retry_after(None) is None
+    assert _parse_retry_after('soon') is None
+    later = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= _parse_retry_after(later) <= 60
+
+
+def test_usage_headers():
+    assert _parse_usage_headers({}) == {}
+    usage = _parse_usage_headers({
+        'x-app-usage': '{"call_count": 28, "total_time": 25, "total_cputime": 25}',
+        'x-business-use-case-usage': '{"1234": [{"type": "threads", "call_count": 95, '
+                                     '"total_cputime": 10, "total_time": 10, "estimated_time_to_regain_access": 5}]}',
+    })
+    assert usage['max_percent'] == 95
+    assert usage['regain_access_seconds'] == 300
+    assert usage['business_use_case'][0]['type'] == 'threads'
+
+
+def test_rate_limit_waits_for_the_longer_of_retry_after_and_regain_access():
+    headers = {
+        'retry-after': '30',
+        'x-business-use-case-usage': '{"1": [{"call_count": 100, "estimated_time_to_regain_access": 2}]}',
+    }
+    error = _graph_error(429, graph_body(4), headers=headers)
+    assert error.retry_after == 120
+    assert error.usage['max_percent'] == 100
+
+
+@pytest.fixture
+def client_and_transport(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+    transport = FakeTransport()
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+    yield client, transport
+    client.close()
+
+
+def test_permanent_error_fails_without_retrying(client_and_transport):
+    client, transport = client_and_transport
+    transport.add('GET', '/me', graph_body(100, message='Invalid parameter'), status=400)
+    with pytest.raises(ThreadsPermanentError):
+        client.retrieve_profiles()
+    assert len(transport.requests) == 1
+
+
+def test_transient_error_is_retried_then_raised(client_and_transport):
+    client, transport = client_and_transport
+    transport.add('GET', '/me', graph_body(2), status=500)
+    with pytest.raises(ThreadsTransientError, match='failed after 3 retries'):
+        client.retrieve_profiles()
+    assert len(transport.requests) == ThreadsClient.MAX_RETRIES
+
+
+def test_transient_error_recovers(client_and_transport):
+    client, transport = client_and_transport
+    transport.add('GET', '/me', status=503)
+    transport.add('GET', '/me', {'id': '1'})
+    assert client.retrieve_profiles() == {'id': '1'}
+    assert len(transport.requests) == 2
+
+
+def test_expired_token_is_refreshed_once_and_retried(client_and_transport):
+    client, transport = client_and_transport
+    transport.add('GET', '/me', graph_body(190, subcode=463), status=401)
+    transport.add('GET', '/me', {'id': '1'})
+    transport.add('GET', '/refresh_access_token', {'access_token': 'new-token', 'expires_in': 5184000})
+    assert client.retrieve_profiles() == {'id': '1'}
+    assert client.auth_token == 'new-token'
+    assert transport.requests[-1]['params']['access_token'] == 'new-token'
+
+
+def test_auth_error_is_not_refreshed(client_and_transport):
+    client, transport = client_and_transport
+    transport.add('GET', '/me', graph_body(190, subcode=460, message='Password changed'), status=400)
+    with pytest.raises(ThreadsAuthError) as excinfo:
+        client.retrieve_profiles()
+    assert not isinstance(excinfo.value, ThreadsTokenExpiredError)
+    assert len(transport.requests) == 1
@@ -0,0 +1,209 @@
+import asyncio
+import time
+
+import pytest
+
+from threads_client import (
+    AsyncThreadsClient,
+    ContainerPoller,
+    IdempotencyConflict,
+    IdempotencyLedger,
+    ThreadsClient,
+)
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+    monkeypatch.setattr(AsyncThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+
+
+class LossyTransport(MockTransport):
+    """MockTransport whose server handles a request but whose response is lost on the way back."""
+
+    def __init__(self, api):
+        super().__init__(api)
+        self.drop = set()
+        self.calls = []
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None):
+        self.calls.append((method, url))
+        response = super().request(method, url, params, data, json, headers, timeout)
+        for path in list(self.drop):
+            if url.endswith(path):
+                self.drop.discard(path)
+                raise ConnectionError('connection reset after the request was sent')
+        return response
+
+
+class AsyncLossyTransport:
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def request(self, *args, **kwargs):
+        return self.transport.request(*args, **kwargs)
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def api():
+    return MockThreadsAPI()
+
+
+@pytest.fixture
+def transport(api):
+    return LossyTransport(api)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = IdempotencyLedger(str(tmp_path / 'idempotency.db'))
+    yield ledger
+    ledger.close()
+
+
+def make_client(api, transport, ledger):
+    return ThreadsClient(
+        api.issue_token(user_id='1'), transport=transport, user_id='1',
+        idempotency_ledger=ledger, poller=ContainerPoller(initial_interval=0.01),
+    )
+
+
+def test_ledger_state_machine(ledger):
+    fingerprint = IdempotencyLedger.fingerprint('hello')
+    record = ledger.begin('k', fingerprint)
+    assert record['state'] == 'created'
+    assert ledger.usable_container(record) is None
+
+    ledger.set_container('k', 'c1')
+    record = ledger.begin('k', fingerprint)
+    assert (record['state'], ledger.usable_container(record)) == ('container', 'c1')
+
+    ledger.set_publishing('k')
+    assert ledger.get('k')['state'] == 'publishing'
+    ledger.set_published('k', 'm1')
+    record = ledger.get('k')
+    assert (record['state'], record['media_id'], record['container_id']) == ('published', 'm1', 'c1')
+
+
+def test_ledger_rejects_a_key_reused_for_another_post(ledger):
+    ledger.begin('k', IdempotencyLedger.fingerprint('hello'))
+    with pytest.raises(IdempotencyConflict):
+        ledger.begin('k', IdempotencyLedger.fingerprint('something else'))
+    # Without a fingerprint (publish_thread by container id) the key is just looked up
+    assert ledger.begin('k')['key'] == 'k'
+
+
+def test_expired_container_is_not_reused():
+    ledger = IdempotencyLedger(container_ttl=0.01)
+    ledger.begin('k')
+    ledger.set_container('k', 'c1')
+    time.sleep(0.02)
+    assert ledger.usable_container(ledger.get('k')) is None
+    # Once publishing started the container is kept regardless of age
+    ledger.set_publishing('k')
+    assert ledger.usable_container(ledger.get('k')) == 'c1'
+
+
+def test_purge_drops_old_records(ledger):
+    ledger.begin('old')
+    cutoff = time.time() + 1
+    assert ledger.purge(cutoff) == 1
+    assert ledger.get('old') is None
+
+
+def test_replay_after_an_ambiguous_publish_publishes_once(api, transport, ledger):
+    client = make_client(api, transport, ledger)
+    transport.drop = {'/threads_publish'}
+    client.post_thread('hello', idempotency_key='k')
+    assert len(api.media) == 1
+    assert ledger.get('k')['state'] == 'published'
+
+    transport.calls.clear()
+    client.post_thread('hello', idempotency_key='k')
+    assert transport.calls == []
+    assert len(api.media) == 1
+
+
+def test_replay_by_another_client_after_the_publish_response_was_lost(api, transport, ledger, tmp_path):
+    client = make_client(api, transport, ledger)
+    container_id = client.create_thread('hello', idempotency_key='k')['id']
+    # The publish lands but the worker dies before it hears back
+    ledger.set_publishing('k')
+    client.publish_thread(container_id)
+
+    restarted = make_client(
+        api, MockTransport(api), IdempotencyLedger(str(tmp_path / 'idempotency.db')),
+    )
+    result = restarted.post_thread('hello', idempotency_key='k')
+    assert result == {'id': None}
+    assert len(api.containers) == 1
+    assert len(api.media) == 1
+    assert restarted.idempotency_ledger.get('k')['state'] == 'published'
+
+
+def test_resume_reuses_a_confirmed_container(api, transport, ledger, tmp_path):
+    client = make_client(api, transport, ledger)
+    client.create_thread('hello', idempotency_key='k')
+    restarted = make_client(api, MockTransport(api), IdempotencyLedger(str(tmp_path / 'idempotency.db')))
+    result = restarted.post_thread('hello', idempotency_key='k')
+    assert result['id'] is not None
+    assert len(api.containers) == 1
+    assert len(api.media) == 1
+
+
+def test_lost_create_response_still_publishes_once(api, transport, ledger):
+    client = make_client(api, transport, ledger)
+    transport.drop = {'/threads'}
+    client.post_thread('hello', idempotency_key='k')
+    # The retried create made a second container, but only one post went out
+    assert len(api.containers) == 2
+    assert len(api.media) == 1
+
+
+def test_publish_thread_rejects_a_key_bound_to_another_container(api, transport, ledger):
+    client = make_client(api, transport, ledger)
+    client.create_thread('hello', idempotency_key='k')
+    other = client.create_thread('other')['id']
+    with pytest.raises(IdempotencyConflict):
+        client.publish_thread(other, idempotency_key='k')
+
+
+def test_async_replay_after_an_ambiguous_publish(api, transport, ledger):
+    async def main():
+        client = AsyncThreadsClient(
+            api.issue_token(user_id='1'), transport=AsyncLossyTransport(transport), user_id='1',
+            idempotency_ledger=ledger, poller=ContainerPoller(initial_interval=0.01),
+        )
+        transport.drop = {'/threads_publish'}
+        await client.post_thread('hello', idempotency_key='k')
+        transport.calls.clear()
+        await client.post_thread('hello', idempotency_key='k')
+        return transport.calls
+
+    assert asyncio.run(main()) == []
+    assert len(api.media) == 1
+    assert ledger.get('k')['state'] == 'published'
+
+
+def test_ledger_is_created_lazily():
+    client = ThreadsClient('token', transport=MockTransport(), user_id='1')
+    assert client._idempotency_ledger is None
+    assert client.idempotency_ledger is client.idempotency_ledger
+
+
+def test_in_memory_default_warns_once(api, caplog):
+    client = make_client(api, MockTransport(api), None)
+    client.post_thread('hello', idempotency_key='k')
+    client.post_thread('hello', idempotency_key='k')
+    warnings = [r for r in caplog.records if 'in-memory IdempotencyLedger' in r.getMessage()]
+    assert len(warnings) == 1
+    assert len(api.media) == 1
+
+
+def test_durable_ledger_does_not_warn(api, ledger, caplog):
+    make_client(api, MockTransport(api), ledger).post_thread('hello', idempotency_key='k')
+    assert not [r for r in caplog.records if 'in-memory IdempotencyLedger' in r.getMessage()]
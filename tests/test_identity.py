@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from threads_client import AsyncFakeTransport, AsyncThreadsClient, FakeTransport, ThreadsClient, ThreadsTokenExpiredError
+
+EXPIRED = {'error': {'message': 'Error validating access token: Session has expired', 'type': 'OAuthException', 'code': 190}}
+
+
+def paths(transport):
+    return [request['url'].rsplit('/', 1)[-1] for request in transport.requests]
+
+
+def test_lazy_client_makes_no_request_until_user_id_is_needed():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1', 'username': 'me'})
+    client = ThreadsClient('token', transport=transport, lazy=True)
+    assert transport.requests == []
+    assert client.user_id == '1'
+    assert client.user_id == '1'
+    assert paths(transport) == ['me']
+
+
+def test_exported_identity_restores_without_a_request():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1', 'username': 'me'})
+    identity = ThreadsClient('token', transport=transport).export_identity()
+    assert identity == {'user_id': '1', 'username': 'me', 'token_expires_at': None}
+
+    restored = ThreadsClient('token', transport=FakeTransport(), identity=identity)
+    assert (restored.user_id, restored.username) == ('1', 'me')
+    assert restored.transport.requests == []
+
+
+def test_expired_token_is_refreshed_before_resolving_the_identity():
+    transport = FakeTransport()
+    transport.add('GET', '/me', EXPIRED, status=401)
+    transport.add('GET', '/me', {'id': '1'})
+    transport.add('GET', '/refresh_access_token', {'access_token': 'new', 'expires_in': 5184000})
+    client = ThreadsClient('old', transport=transport)
+    assert (client.user_id, client.auth_token) == ('1', 'new')
+    assert paths(transport) == ['me', 'refresh_access_token', 'me']
+
+
+def test_without_auto_refresh_the_user_is_told_to_refresh():
+    transport = FakeTransport()
+    transport.add('GET', '/me', EXPIRED, status=401)
+    with pytest.raises(ThreadsTokenExpiredError, match='Please refresh manually'):
+        ThreadsClient('old', transport=transport, auto_refresh=False)
+    assert paths(transport) == ['me']
+
+
+def test_failed_refresh_is_not_repeated():
+    transport = FakeTransport()
+    transport.add('GET', '/me', EXPIRED, status=401)
+    transport.add('GET', '/refresh_access_token', EXPIRED, status=400)
+    with pytest.raises(ThreadsTokenExpiredError, match='Please refresh manually'):
+        ThreadsClient('old', transport=transport)
+    assert paths(transport) == ['me', 'refresh_access_token']
+
+
+def test_async_identity_refreshes_an_expired_token():
+    async def main():
+        transport = AsyncFakeTransport()
+        transport.add('GET', '/me', EXPIRED, status=401)
+        transport.add('GET', '/me', {'id': '1', 'username': 'me'})
+        transport.add('GET', '/refresh_access_token', {'access_token': 'new', 'expires_in': 5184000})
+        client = await AsyncThreadsClient.create('old', transport=transport)
+        return client, transport
+
+    client, transport = asyncio.run(main())
+    assert (client.user_id, client.auth_token) == ('1', 'new')
+    assert paths(transport) == ['me', 'refresh_access_token', 'me']
+
+
+def test_async_without_auto_refresh():
+    async def main():
+        transport = AsyncFakeTransport()
+        transport.add('GET', '/me', EXPIRED, status=401)
+        client = AsyncThreadsClient('old', transport=transport, auto_refresh=False)
+        assert client.user_id is None
+        await client.get_user_id()
+
+    with pytest.raises(ThreadsTokenExpiredError, match='Please refresh manually'):
+        asyncio.run(main())
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from threads_client import AsyncFakeTransport, AsyncThreadsClient, FakeTransport, ThreadsClient
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+def seed_posts(api, user_id, count, start=1000):
+    """Put `count` posts on the user's timeline, created one second apart."""
+    for i in range(count):
+        media_id = f'{user_id}{i:04d}'
+        api.media[media_id] = {
+            'id': media_id, 'text': f'post {i}', 'created_at': start + i, 'owner': user_id,
+            'likes_count': 0, 'replies_count': 0, 'retweets_count': 0,
+        }
+        api.timelines[user_id].append(media_id)
+
+
+@pytest.fixture
+def api():
+    api = MockThreadsAPI()
+    api.add_user(user_id='1')
+    return api
+
+
+def make_client(api):
+    return ThreadsClient(api.issue_token(user_id='1'), transport=MockTransport(api), user_id='1')
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_iter_threads_follows_cursors_newest_first(api, prefetch):
+    seed_posts(api, '1', 60)
+    client = make_client(api)
+    posts = list(client.iter_threads(page_size=25, prefetch=prefetch))
+    assert [post['text'] for post in posts] == [f'post {i}' for i in range(59, -1, -1)]
+    assert api.request_count == 3
+    client.close()
+
+
+def test_iter_threads_limit_shrinks_the_last_page(api):
+    seed_posts(api, '1', 60)
+    transport = MockTransport(api)
+    client = ThreadsClient(api.issue_token(user_id='1'), transport=transport, user_id='1')
+    sizes = []
+    original = transport.request
+
+    def request(method, url, params=None, **kwargs):
+        sizes.append(params.get('limit'))
+        return original(method, url, params=params, **kwargs)
+
+    transport.request = request
+    posts = list(client.iter_threads(limit=30, page_size=25))
+    assert len(posts) == 30
+    assert [int(size) for size in sizes] == [25, 5]
+    client.close()
+
+
+def test_iter_threads_since_and_until(api):
+    seed_posts(api, '1', 10)
+    client = make_client(api)
+    posts = list(client.iter_threads(since=1003, until=1006, page_size=2))
+    assert [post['text'] for post in posts] == ['post 6', 'post 5', 'post 4', 'post 3']
+    client.close()
+
+
+def test_iter_threads_empty_timeline_and_zero_limit(api):
+    client = make_client(api)
+    assert list(client.iter_threads()) == []
+    assert api.request_count == 1
+    assert list(client.iter_threads(limit=0)) == []
+    assert api.request_count == 1
+    client.close()
+
+
+def pages(transport, count, per_page=2):
+    for page in range(count):
+        body = {
+            'data': [{'id': f'{page}-{i}'} for i in range(per_page)],
+            'paging': {'cursors': {'after': str(page + 1)}},
+        }
+        if page < count - 1:
+            body['paging']['next'] = f'/v1.0/me/threads?after={page + 1}'
+        transport.add('GET', '/threads', body)
+
+
+class GatedTransport(FakeTransport):
+    """Holds requests for later pages until `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def request(self, method, url, params=None, **kwargs):
+        if (params or {}).get('after'):
+            self.release.wait(5)
+        return super().request(method, url, params=params, **kwargs)
+
+
+def test_breaking_out_with_prefetch_does_not_wait_for_the_next_page():
+    transport = GatedTransport()
+    pages(transport, 2)
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+    posts = client.iter_threads(prefetch=True)
+    assert next(posts)['id'] == '0-0'
+    started = time.monotonic()
+    posts.close()
+    assert time.monotonic() - started < 1
+    transport.release.set()
+    client.close()
+
+
+def test_async_iter_threads_prefetch():
+    async def main():
+        transport = AsyncFakeTransport()
+        pages(transport, 3)
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+        ids = [post['id'] async for post in client.iter_threads(prefetch=True)]
+        await client.aclose()
+        return ids, len(transport.requests)
+
+    ids, requests = asyncio.run(main())
+    assert ids == ['0-0', '0-1', '1-0', '1-1', '2-0', '2-1']
+    assert requests == 3
+
+
+def test_async_prefetch_is_cancelled_when_the_caller_stops():
+    async def main():
+        transport = AsyncFakeTransport()
+        pages(transport, 2)
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False)
+        posts = client.iter_threads(prefetch=True)
+        first = await posts.__anext__()
+        transport.latency = 0.05
+        # The first page's prefetch is now waiting on the slow transport
+        await asyncio.sleep(0)
+        await posts.aclose()
+        await asyncio.sleep(0.1)
+        await client.aclose()
+        return first, len(transport.requests)
+
+    first, requests = asyncio.run(main())
+    assert first['id'] == '0-0'
+    assert requests == 1
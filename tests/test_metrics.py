@@ -0,0 +1,102 @@
+import asyncio
+import urllib.request
+
+import pytest
+
+from threads_client import AsyncFakeTransport, AsyncThreadsClient, ClientMetrics, FakeTransport, ThreadsClient
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+    monkeypatch.setattr(AsyncThreadsClient, 'INITIAL_BACKOFF_SECONDS', 0.001)
+
+
+def test_client_records_every_attempt(fast_backoff):
+    metrics = ClientMetrics()
+    events = []
+    metrics.add_listener(events.append)
+    transport = FakeTransport()
+    transport.add('GET', '/me', ConnectionError('reset'))
+    transport.add('GET', '/me', status=500)
+    transport.add('GET', '/me', {'id': '1'})
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False, metrics=metrics)
+    client.retrieve_profiles()
+
+    stats = metrics.snapshot()['me']
+    assert stats['requests'] == 3
+    assert stats['retries'] == 2
+    assert stats['statuses'] == {'error': 1, 500: 1, 200: 1}
+    assert stats['bytes_in'] == len(b'{"id": "1"}') + len(b'{}')
+    assert stats['bytes_out'] > 0
+    assert sum(stats['latency_buckets']) == 3
+    assert [event['status'] for event in events] == ['error', 500, 200]
+    assert [event['retry'] for event in events] == [False, True, True]
+    client.close()
+
+
+def test_async_client_records_attempts():
+    async def main():
+        metrics = ClientMetrics()
+        transport = AsyncFakeTransport()
+        transport.add('GET', '/me', {'id': '1'})
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', metrics=metrics)
+        await client.retrieve_profiles()
+        await client.aclose()
+        return metrics.snapshot()
+
+    assert asyncio.run(main())['me']['statuses'] == {200: 1}
+
+
+def test_failing_listener_does_not_break_requests():
+    metrics = ClientMetrics()
+
+    def broken(event):
+        raise RuntimeError('listener bug')
+
+    metrics.add_listener(broken)
+    metrics.record_request('me', 'GET', 200, 0.01)
+    metrics.remove_listener(broken)
+    assert metrics.snapshot()['me']['requests'] == 1
+
+
+def test_prometheus_exposition():
+    metrics = ClientMetrics(buckets=(0.1, 1.0))
+    metrics.record_request('threads_publish', 'POST', 200, 0.05, 64, 27)
+    metrics.record_request('threads_publish', 'POST', 500, 0.5, 64, 2, retry=True)
+    metrics.record_request('me', 'GET', 'error', 2.0, 40)
+    text = metrics.to_prometheus()
+    lines = text.splitlines()
+
+    assert '# TYPE threads_client_requests_total counter' in lines
+    assert 'threads_client_requests_total{endpoint="threads_publish",status="200"} 1' in lines
+    assert 'threads_client_requests_total{endpoint="threads_publish",status="500"} 1' in lines
+    assert 'threads_client_requests_total{endpoint="me",status="error"} 1' in lines
+    assert 'threads_client_retries_total{endpoint="threads_publish"} 1' in lines
+    assert 'threads_client_sent_bytes_total{endpoint="threads_publish"} 128' in lines
+    assert 'threads_client_received_bytes_total{endpoint="threads_publish"} 29' in lines
+    assert 'threads_client_request_duration_seconds_bucket{endpoint="threads_publish",le="0.1"} 1' in lines
+    assert 'threads_client_request_duration_seconds_bucket{endpoint="threads_publish",le="1.0"} 2' in lines
+    assert 'threads_client_request_duration_seconds_bucket{endpoint="me",le="1.0"} 0' in lines
+    assert 'threads_client_request_duration_seconds_bucket{endpoint="me",le="+Inf"} 1' in lines
+    assert 'threads_client_request_duration_seconds_count{endpoint="threads_publish"} 2' in lines
+    assert text.endswith('\n')
+
+    metrics.reset()
+    assert 'endpoint=' not in metrics.to_prometheus()
+
+
+def test_serve_exposes_metrics_on_localhost():
+    metrics = ClientMetrics(namespace='test')
+    metrics.record_request('me', 'GET', 200, 0.01)
+    server = metrics.serve(port=0)
+    try:
+        host, port = server.server_address[:2]
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            body = response.read().decode()
+        assert 'test_requests_total{endpoint="me",status="200"} 1' in body
+    finally:
+        server.shutdown()
+        server.server_close()
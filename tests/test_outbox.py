@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+from threads_client import (
+    ContainerPoller,
+    IdempotencyLedger,
+    OutboxWorkerPool,
+    PublishOutbox,
+    ThreadsClient,
+)
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+class CrashAfterPublish(MockTransport):
+    """The publish reaches the server, then the worker process dies before reading the response."""
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None):
+        response = super().request(method, url, params, data, json, headers, timeout)
+        if url.endswith('/threads_publish'):
+            raise KeyboardInterrupt
+        return response
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'outbox.db')
+
+
+@pytest.fixture
+def api():
+    return MockThreadsAPI()
+
+
+def make_client(api, transport=None):
+    return ThreadsClient(
+        api.issue_token(user_id='1'), transport=transport or MockTransport(api), user_id='1',
+        poller=ContainerPoller(initial_interval=0.01),
+    )
+
+
+def test_enqueue_is_idempotent_per_key():
+    outbox = PublishOutbox()
+    first = outbox.enqueue('hello', idempotency_key='k')
+    again = outbox.enqueue('hello', idempotency_key='k')
+    assert first['id'] == again['id']
+    assert outbox.counts()['pending'] == 1
+
+
+def test_lease_order_and_exclusivity():
+    outbox = PublishOutbox()
+    now = time.time()
+    low = outbox.enqueue('low', publish_at=now - 10)
+    high = outbox.enqueue('high', publish_at=now - 5, priority=1)
+    outbox.enqueue('later', publish_at=now + 3600, priority=9)
+    assert outbox.lease('a')['id'] == high['id']
+    assert outbox.lease('b')['id'] == low['id']
+    assert outbox.lease('c') is None
+    assert outbox.counts() == {'pending': 1, 'leased': 2, 'published': 0, 'failed': 0}
+
+
+def test_expired_lease_moves_to_another_worker():
+    outbox = PublishOutbox(lease_seconds=0.05)
+    entry = outbox.enqueue('hello')
+    assert outbox.lease('a')['attempts'] == 1
+    assert outbox.lease('b') is None
+    assert outbox.next_due_at() > time.time()
+
+    time.sleep(0.06)
+    leased = outbox.lease('b')
+    assert (leased['id'], leased['lease_owner'], leased['attempts']) == (entry['id'], 'b', 2)
+    # The first worker lost the post and can no longer finish it
+    assert not outbox.complete(entry['id'], 'a', 'm1')
+    assert outbox.complete(entry['id'], 'b', 'm1')
+    assert outbox.get(entry['id'])['state'] == 'published'
+
+
+def test_release_without_counting_the_attempt():
+    outbox = PublishOutbox()
+    entry = outbox.enqueue('hello')
+    outbox.lease('a')
+    retry_at = time.time() + 60
+    assert outbox.release(entry['id'], 'a', retry_at, error='quota', count_attempt=False)
+    released = outbox.get(entry['id'])
+    assert (released['state'], released['attempts'], released['error']) == ('pending', 0, 'quota')
+    assert outbox.next_due_at() == retry_at
+
+
+def test_purge_keeps_unfinished_entries():
+    outbox = PublishOutbox()
+    done = outbox.enqueue('done')
+    outbox.enqueue('waiting')
+    outbox.lease('a')
+    outbox.complete(done['id'], 'a', 'm1')
+    assert outbox.purge(time.time() + 1) == 1
+    assert outbox.counts()['pending'] == 1
+
+
+def test_pool_uses_the_outbox_file_as_idempotency_ledger(api, path):
+    client = make_client(api)
+    OutboxWorkerPool(client, PublishOutbox(path))
+    assert client.idempotency_ledger.path == path
+
+
+def test_worker_crash_after_publish_is_resumed_once_the_lease_expires(api, path):
+    outbox = PublishOutbox(path, lease_seconds=0.5)
+    entry = outbox.enqueue('hello')
+    crashed = OutboxWorkerPool(make_client(api, CrashAfterPublish(api)), outbox, workers=1)
+    with pytest.raises(KeyboardInterrupt):
+        crashed.process_one()
+    assert outbox.get(entry['id'])['state'] == 'leased'
+    assert len(api.media) == 1
+
+    # A new process with fresh objects over the same file
+    outbox = PublishOutbox(path, lease_seconds=0.5)
+    pool = OutboxWorkerPool(make_client(api), outbox, workers=1)
+    assert pool.process_one() is None  # still leased by the dead worker
+    time.sleep(0.55)
+    resumed = pool.process_one()
+    assert (resumed['state'], resumed['attempts']) == ('published', 2)
+    assert len(api.containers) == 1
+    assert len(api.media) == 1
+
+
+def test_drain_stops_at_the_publish_limit(path):
+    api = MockThreadsAPI(publish_limit=3)
+    outbox = PublishOutbox(path)
+    for i in range(5):
+        outbox.enqueue(f'post {i}')
+    pool = OutboxWorkerPool(make_client(api), outbox, workers=2)
+    pool.drain()
+    assert outbox.counts() == {'pending': 2, 'leased': 0, 'published': 3, 'failed': 0}
+    assert len(api.media) == 3
+    assert pool.process_one() is None
+
+
+def test_permanent_errors_fail_and_transient_errors_retry(api, path):
+    outbox = PublishOutbox(path)
+    pool = OutboxWorkerPool(make_client(api), outbox, workers=1, max_attempts=2)
+    IdempotencyLedger(path).begin('taken', IdempotencyLedger.fingerprint('original'))
+    conflict = outbox.enqueue('different text', idempotency_key='taken')
+    assert pool.process_one()['state'] == 'failed'
+
+    flaky = outbox.enqueue('hello')
+
+    def post_thread(*args, **kwargs):
+        raise ConnectionError('connection reset')
+
+    pool.client.post_thread = post_thread
+    retried = pool.process_one()
+    assert (retried['id'], retried['state'], retried['attempts']) == (flaky['id'], 'pending', 1)
+    assert retried['publish_at'] > time.time()
+    assert outbox.get(conflict['id'])['error']
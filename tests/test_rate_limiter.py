@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from threads_client import (
+    AsyncFakeTransport,
+    AsyncThreadsClient,
+    FakeTransport,
+    RateLimiter,
+    RateLimitExceeded,
+    ThreadsClient,
+)
+
+
+def test_capacity_follows_the_impressions_formula():
+    assert RateLimiter().capacity == 4800 * 10
+    assert RateLimiter(impressions=3).capacity == 4800 * 10
+    assert RateLimiter(impressions=250).capacity == 4800 * 250
+    assert RateLimiter(capacity=7).capacity == 7
+    assert RateLimiter(capacity=86400).rate == 1.0
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter(policy='drop')
+
+
+def test_set_impressions_keeps_calls_already_spent():
+    limiter = RateLimiter(capacity=48000, policy='fail')
+    for _ in range(10):
+        limiter.acquire()
+    assert limiter.remaining == 47990
+    limiter.set_impressions(20)
+    assert limiter.capacity == 96000
+    assert limiter.remaining == 95990
+
+
+def test_fail_policy_raises_with_the_wait():
+    limiter = RateLimiter(capacity=1, policy='fail')
+    limiter.acquire()
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.retry_after > 0
+
+
+def test_every_request_spends_the_budget():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1'})
+    limiter = RateLimiter(capacity=2, policy='fail')
+    client = ThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False, rate_limiter=limiter)
+    client.retrieve_profiles()
+    client.retrieve_profiles()
+    assert limiter.remaining == 0
+    with pytest.raises(RateLimitExceeded):
+        client.retrieve_profiles()
+    assert len(transport.requests) == 2
+    client.close()
+
+
+def test_limiter_is_sized_from_insights():
+    transport = FakeTransport()
+    transport.add('GET', '/threads_insights', {'data': [
+        {'name': 'views', 'values': [{'value': 120}, {'value': 30}]},
+    ]})
+    transport.add('GET', '/threads_insights', {'data': [{'name': 'views', 'total_value': {'value': 5}}]})
+    client = ThreadsClient('token', transport=transport, user_id='1')
+    assert client.update_rate_limit_from_insights() == 150
+    assert client.rate_limiter.capacity == 4800 * 150
+    assert client.update_rate_limit_from_insights() == 5
+    assert client.rate_limiter.capacity == 4800 * 10
+    client.close()
+
+
+def test_async_client_waits_for_the_budget():
+    async def main():
+        transport = AsyncFakeTransport()
+        transport.add('GET', '/me', {'id': '1'})
+        # 20 calls per second, one banked: the second call waits ~50ms
+        limiter = RateLimiter(capacity=20 * 86400, max_wait=1, key='1')
+        limiter.reserve(limiter.capacity - 1)
+        client = AsyncThreadsClient('token', transport=transport, user_id='1', coalesce_gets=False, rate_limiter=limiter)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await client.retrieve_profiles()
+        await client.retrieve_profiles()
+        elapsed = loop.time() - started
+        await client.aclose()
+        return elapsed
+
+    assert asyncio.run(main()) >= 0.04
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from threads_client import (
+    AsyncFakeTransport,
+    AsyncThreadsClient,
+    MemoryResponseCache,
+    SQLiteResponseCache,
+    ThreadsClient,
+)
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryResponseCache(max_entries=3)
+    else:
+        cache = SQLiteResponseCache(str(tmp_path / 'cache.db'), max_entries=3)
+        yield cache
+        cache.close()
+
+
+def test_entries_expire_after_their_ttl(cache):
+    cache.set('a', {'id': '1'}, ttl=0.05)
+    assert cache.get('a') == {'id': '1'}
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in 'abc':
+        cache.set(key, {'key': key}, ttl=60)
+        time.sleep(0.001)
+    assert cache.get('a') == {'key': 'a'}
+    time.sleep(0.001)
+    cache.set('d', {'key': 'd'}, ttl=60)
+    assert len(cache) == 3
+    assert cache.get('b') is None
+    assert [cache.get(key) is not None for key in 'acd'] == [True, True, True]
+
+
+def test_invalidate_by_tag(cache):
+    cache.set('a', {}, ttl=60, tag='me_threads')
+    cache.set('b', {}, ttl=60, tag='ids')
+    cache.set('c', {}, ttl=60, tag='me')
+    assert cache.invalidate(['me_threads', 'ids']) == 2
+    assert cache.get('c') == {}
+    assert cache.invalidate([]) == 0
+    assert cache.invalidate() == 1
+    assert len(cache) == 0
+
+
+def test_cached_bodies_cannot_be_mutated_by_callers(cache):
+    body = {'data': [1]}
+    cache.set('a', body, ttl=60)
+    body['data'].append(2)
+    cache.get('a')['data'].append(3)
+    assert cache.get('a') == {'data': [1]}
+
+
+def test_sqlite_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = SQLiteResponseCache(path)
+    cache.set('a', {'id': '1'}, ttl=60, tag='me')
+    cache.close()
+    cache = SQLiteResponseCache(path)
+    assert cache.get('a') == {'id': '1'}
+    cache.close()
+
+
+@pytest.fixture
+def api():
+    return MockThreadsAPI(processing_delays={'TEXT': 0})
+
+
+def make_client(api, cache, **kwargs):
+    return ThreadsClient(
+        api.issue_token(user_id='1'), transport=MockTransport(api), user_id='1', response_cache=cache, **kwargs,
+    )
+
+
+def test_client_serves_repeated_gets_from_the_cache(api, cache):
+    client = make_client(api, cache)
+    assert client.retrieve_profiles()['id'] == '1'
+    assert client.retrieve_profiles()['id'] == '1'
+    assert api.request_count == 1
+    client.close()
+
+
+def test_cache_ttl_zero_disables_caching_for_a_circuit(api, cache):
+    client = make_client(api, cache, cache_ttls={'me': 0})
+    client.retrieve_profiles()
+    client.retrieve_profiles()
+    assert api.request_count == 2
+    client.close()
+
+
+def test_cache_is_keyed_by_token(api, cache):
+    client = make_client(api, cache)
+    client.retrieve_profiles()
+    client.auth_token = api.issue_token(user_id='1')
+    client.retrieve_profiles()
+    assert api.request_count == 2
+    client.close()
+
+
+def test_publish_invalidates_the_timeline_and_quota(api, cache):
+    client = make_client(api, cache)
+    assert client.retrieve_thread()['data'] == []
+    assert client.check_publishing_quota()['quota_usage'] == 0
+    assert client.retrieve_thread()['data'] == []
+    calls = api.request_count
+
+    container = client.create_thread('hello')
+    published = client.publish_thread(container['id'])
+    assert [post['id'] for post in client.retrieve_thread()['data']] == [published['id']]
+    assert client.check_publishing_quota()['quota_usage'] == 1
+    assert api.request_count == calls + 4
+    client.close()
+
+
+def test_delete_invalidates_timeline_and_id_lookups(api, cache):
+    client = make_client(api, cache)
+    media_id = client.publish_thread(client.create_thread('hello')['id'])['id']
+    assert client.retrieve_threads([media_id])[media_id]['error'] is None
+    assert len(client.retrieve_thread()['data']) == 1
+    client.delete_thread(media_id)
+    assert client.retrieve_threads([media_id])[media_id]['error'] is not None
+    assert client.retrieve_thread()['data'] == []
+    client.close()
+
+
+def test_async_client_uses_the_cache(api):
+    cache = MemoryResponseCache()
+
+    async def main():
+        transport = AsyncFakeTransport(handler=MockTransport(api)._serve)
+        client = AsyncThreadsClient(
+            api.issue_token(user_id='1'), transport=transport, user_id='1', response_cache=cache,
+        )
+        await client.retrieve_profiles()
+        await client.retrieve_profiles()
+        dropped = client.invalidate_cache('me')
+        await client.retrieve_profiles()
+        await client.aclose()
+        return dropped, len(transport.requests)
+
+    assert asyncio.run(main()) == (1, 2)
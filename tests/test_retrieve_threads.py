@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from threads_client import AsyncFakeTransport, AsyncThreadsClient, FakeTransport, ThreadsClient, ThreadsPermanentError
+from threads_mock_server import MockThreadsAPI, MockTransport
+
+
+def seed_posts(api, count):
+    ids = []
+    for i in range(count):
+        media_id = f'9{i:05d}'
+        api.media[media_id] = {'id': media_id, 'text': f'post {i}', 'created_at': i, 'owner': '1'}
+        ids.append(media_id)
+    return ids
+
+
+@pytest.fixture
+def api():
+    api = MockThreadsAPI()
+    api.add_user(user_id='1')
+    return api
+
+
+def make_client(api):
+    return ThreadsClient(api.issue_token(user_id='1'), transport=MockTransport(api), user_id='1')
+
+
+def test_ids_are_looked_up_in_chunks_of_fifty(api):
+    ids = seed_posts(api, 120)
+    client = make_client(api)
+    results = client.retrieve_threads(ids + ids[:10])
+    assert list(results) == ids
+    assert all(results[media_id]['result']['text'] == f'post {i}' for i, media_id in enumerate(ids))
+    assert api.request_count == 3
+    client.close()
+
+
+def test_chunk_size_is_capped_at_the_api_maximum(api):
+    ids = seed_posts(api, 60)
+    client = make_client(api)
+    client.retrieve_threads(ids, chunk_size=500)
+    assert api.request_count == 2
+    client.retrieve_threads(ids, chunk_size=20)
+    assert api.request_count == 5
+    client.close()
+
+
+def test_unknown_ids_are_isolated_by_bisection(api):
+    ids = seed_posts(api, 50)
+    client = make_client(api)
+    lookup = ids[:20] + ['404404'] + ids[20:40] + ['505505'] + ids[40:]
+    results = client.retrieve_threads(lookup)
+    assert list(results) == lookup
+    for media_id in ('404404', '505505'):
+        assert results[media_id]['result'] is None
+        assert isinstance(results[media_id]['error'], ThreadsPermanentError)
+        assert results[media_id]['error'].code == 100
+    assert all(results[media_id]['error'] is None for media_id in ids)
+    # Far fewer calls than one per ID
+    assert api.request_count < 30
+    client.close()
+
+
+def test_other_errors_fail_the_whole_chunk_without_splitting():
+    transport = FakeTransport()
+    transport.add('GET', '/', {'error': {'code': 10, 'message': 'Permission denied'}}, status=403)
+    client = ThreadsClient('token', transport=transport, user_id='1')
+    results = client.retrieve_threads(['1', '2', '3'])
+    assert len(transport.requests) == 1
+    assert all(isinstance(result['error'], ThreadsPermanentError) for result in results.values())
+    client.close()
+
+
+def test_ids_missing_from_the_response_are_reported():
+    transport = FakeTransport()
+    transport.add('GET', '/', {'1': {'id': '1'}})
+    client = ThreadsClient('token', transport=transport, user_id='1')
+    results = client.retrieve_threads(['1', '2'])
+    assert results['1'] == {'result': {'id': '1'}, 'error': None}
+    assert isinstance(results['2']['error'], ThreadsPermanentError)
+    client.close()
+
+
+def test_async_lookup_chunks_and_bisects(api):
+    ids = seed_posts(api, 60)
+    lookup = ids[:30] + ['404404'] + ids[30:]
+
+    async def main():
+        token = api.issue_token(user_id='1')
+        # Unscripted requests fall through to the mock API
+        transport = AsyncFakeTransport(handler=MockTransport(api)._serve)
+        client = AsyncThreadsClient(token, transport=transport, user_id='1')
+        results = await client.retrieve_threads(lookup, max_concurrency=2)
+        await client.aclose()
+        return results
+
+    results = asyncio.run(main())
+    assert list(results) == lookup
+    assert isinstance(results['404404']['error'], ThreadsPermanentError)
+    assert all(results[media_id]['result']['text'] == f'post {i}' for i, media_id in enumerate(ids))
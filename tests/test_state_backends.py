@@ -0,0 +1,217 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from threads_client import (
+    FakeTransport,
+    MemoryStateBackend,
+    PublishLedger,
+    PublishQuotaExceeded,
+    RateLimiter,
+    RateLimitExceeded,
+    RedisStateBackend,
+    SQLiteStateBackend,
+    ThreadsClient,
+)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStateBackend()
+    if request.param == 'sqlite':
+        return SQLiteStateBackend(str(tmp_path / 'state.db'))
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # fakeredis needs it to run the Lua scripts
+    return RedisStateBackend(fakeredis.FakeStrictRedis())
+
+
+def _reserve_all(ledger, attempts):
+    granted, refused = [], []
+    barrier = threading.Barrier(attempts)
+
+    def worker():
+        barrier.wait()
+        try:
+            granted.append(ledger.reserve())
+        except PublishQuotaExceeded as e:
+            refused.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return granted, refused
+
+
+def test_reserve_under_contention_never_oversells(backend):
+    ledger = PublishLedger(backend=backend, key='user', limit=10)
+    granted, refused = _reserve_all(ledger, 40)
+    assert len(granted) == 10
+    assert len(refused) == 30
+    assert all(e.retry_at > time.time() for e in refused)
+    assert ledger.usage() == 10
+
+
+def test_ledgers_sharing_a_backend_and_key_share_one_window(backend):
+    first = PublishLedger(backend=backend, key='user', limit=2)
+    second = PublishLedger(backend=backend, key='user', limit=2)
+    other = PublishLedger(backend=backend, key='other', limit=2)
+    first.reserve()
+    second.reserve()
+    with pytest.raises(PublishQuotaExceeded):
+        first.reserve()
+    other.reserve()
+    assert other.usage() == 1
+
+
+def test_release_frees_the_slot(backend):
+    ledger = PublishLedger(backend=backend, limit=1)
+    reservation = ledger.reserve()
+    assert not ledger.can_publish()
+    ledger.release(reservation)
+    assert ledger.can_publish()
+    assert ledger.next_slot_at() <= time.time()
+
+
+def test_next_slot_at_is_when_the_oldest_blocking_entry_expires(backend):
+    ledger = PublishLedger(backend=backend, limit=2, window=100)
+    now = time.time()
+    ledger.record(now - 60)
+    ledger.record(now - 30)
+    ledger.record(now - 90)  # out of order on purpose
+    assert ledger.usage() == 3
+    assert ledger.next_slot_at() == pytest.approx(now - 60 + 100, abs=0.001)
+
+
+def test_entries_leave_the_window(backend):
+    ledger = PublishLedger(backend=backend, limit=1, window=100)
+    ledger.record(time.time() - 101)
+    assert ledger.usage() == 0
+    assert ledger.can_publish()
+
+
+def test_reconcile_trims_oldest_first(backend):
+    ledger = PublishLedger(backend=backend, limit=3, window=100)
+    now = time.time()
+    for age in (80, 50, 10):
+        ledger.record(now - age)
+    ledger.reconcile(1)
+    assert ledger.usage() == 1
+    # Only the newest entry is left, so it alone decides the next slot
+    assert ledger.next_slot_at() <= time.time()
+    ledger.limit = 1
+    assert ledger.next_slot_at() == pytest.approx(now - 10 + 100, abs=0.001)
+
+
+def test_reconcile_pads_with_the_current_time_and_updates_the_limit(backend):
+    ledger = PublishLedger(backend=backend, limit=250, window=100)
+    ledger.record(time.time() - 50)
+    before = time.time()
+    ledger.reconcile(4, quota_total=4)
+    assert ledger.limit == 4
+    assert ledger.usage() == 4
+    # The three padded entries are stamped now, so they hold their slots the longest
+    ledger.limit = 3
+    # Redis returns timestamps through Lua's tostring (14 significant digits)
+    assert ledger.next_slot_at() >= before + 100 - 0.001
+    assert not ledger.needs_reconcile()
+
+
+def test_reconcile_to_zero_empties_the_window(backend):
+    ledger = PublishLedger(backend=backend, limit=5)
+    for _ in range(3):
+        ledger.reserve()
+    ledger.reconcile(0)
+    assert ledger.usage() == 0
+
+
+def test_rate_limiter_bucket(backend):
+    limiter = RateLimiter(capacity=5, policy='fail', backend=backend, key='user')
+    for _ in range(5):
+        assert limiter.reserve() == 0
+    assert limiter.remaining == 0
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.reserve()
+    assert excinfo.value.retry_after == pytest.approx(limiter.WINDOW_SECONDS / 5, rel=0.01)
+    # A refused reserve takes nothing
+    limiter.set_capacity(7)
+    assert limiter.remaining == 2
+
+
+def test_rate_limiter_block_policy_returns_the_wait(backend):
+    limiter = RateLimiter(capacity=86400, backend=backend)
+    limiter.reserve(86400)
+    assert limiter.reserve() == pytest.approx(1.0, abs=0.05)
+    blocking = RateLimiter(capacity=86400, max_wait=0.5, backend=backend, key='strict')
+    blocking.reserve(86400)
+    with pytest.raises(RateLimitExceeded):
+        blocking.reserve()
+
+
+def _reserve_in_process(path, attempts, results):
+    ledger = PublishLedger(path=path, key='user', limit=25)
+    granted = 0
+    for _ in range(attempts):
+        try:
+            ledger.reserve()
+            granted += 1
+        except PublishQuotaExceeded:
+            pass
+    results.put(granted)
+
+
+def test_sqlite_reserve_across_processes(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    SQLiteStateBackend(path)  # create the schema before the workers race for it
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=_reserve_in_process, args=(path, 20, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    granted = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+    assert sum(granted) == 25
+    assert PublishLedger(path=path, key='user', limit=25).usage() == 25
+
+
+def test_clients_key_shared_state_by_user_id(backend):
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1'})
+    clients = [
+        ThreadsClient(
+            'token', transport=transport, user_id=user_id,
+            rate_limiter=RateLimiter(capacity=2, policy='fail', backend=backend),
+            publish_ledger=PublishLedger(backend=backend, limit=1),
+        )
+        for user_id in ('111', '222')
+    ]
+    for client in clients:
+        assert client.rate_limiter.key == client.publish_ledger.key == client.user_id
+        client.retrieve_profiles()
+        client.retrieve_profiles()
+        client.publish_ledger.reserve()
+    # Each account spent its own budget; neither could have done so with a shared key
+    with pytest.raises(RateLimitExceeded):
+        clients[0].retrieve_profiles()
+
+
+def test_explicit_key_is_kept(backend):
+    limiter = RateLimiter(backend=backend, key='team')
+    ledger = PublishLedger(backend=backend, key='team')
+    ThreadsClient('token', transport=FakeTransport(), user_id='1', rate_limiter=limiter, publish_ledger=ledger)
+    assert limiter.key == ledger.key == 'team'
+
+
+def test_lazy_client_keys_state_once_the_user_id_is_known(backend):
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '42'})
+    ledger = PublishLedger(backend=backend)
+    client = ThreadsClient('token', transport=transport, lazy=True, publish_ledger=ledger)
+    assert ledger.key == 'default'
+    assert client.user_id == '42'
+    assert ledger.key == '42'
@@ -0,0 +1,141 @@
+import asyncio
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from threads_client import (
+    AsyncFakeTransport,
+    AsyncThreadsClient,
+    CircuitBreaker,
+    DeadlineExceeded,
+    FakeTransport,
+    ThreadsClient,
+)
+
+REFRESHED = {'access_token': 'new', 'token_type': 'bearer', 'expires_in': 5184000}
+
+
+def token_of(request):
+    return (request['params'] or {}).get('access_token')
+
+
+def expiring_transport(cls=FakeTransport, latency=0.05):
+    """Answers 401 to the old token, refreshes it, and serves /me to the new one."""
+    def handler(method, url, params, data, json_body, headers):
+        if url.endswith('/refresh_access_token'):
+            return 200, REFRESHED, None
+        if params.get('access_token') == 'old':
+            return 401, {'error': {'message': 'Session has expired', 'code': 190}}, None
+        return 200, {'id': '1'}, None
+
+    return cls(handler=handler, latency=latency)
+
+
+def refreshes(transport):
+    return [r for r in transport.requests if r['url'].endswith('/refresh_access_token')]
+
+
+def test_concurrent_expired_calls_share_one_refresh():
+    transport = expiring_transport()
+    client = ThreadsClient('old', transport=transport, user_id='1', coalesce_gets=False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.retrieve_profiles())) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [{'id': '1'}] * 6
+    assert len(refreshes(transport)) == 1
+    assert client.auth_token == 'new'
+    assert client.token_expires_at > time.time() + 5000000
+
+
+def test_refresh_of_an_already_replaced_token_is_skipped():
+    transport = expiring_transport()
+    client = ThreadsClient('old', transport=transport, user_id='1')
+    client._refresh_token('old')
+    client._refresh_token('old')
+    assert len(refreshes(transport)) == 1
+
+
+def test_token_is_refreshed_in_the_background_before_it_expires():
+    transport = expiring_transport(latency=0)
+    client = ThreadsClient(
+        'old', transport=transport, identity={'user_id': '1', 'token_expires_at': time.time() + 0.6},
+        refresh_ahead=0.4,
+    )
+    assert client._refresh_at == pytest.approx(time.time() + 0.3, abs=0.05)  # half-life beats 0.2s
+    deadline = time.monotonic() + 3
+    while client.auth_token == 'old' and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert client.auth_token == 'new'
+    assert len(refreshes(transport)) == 1
+    # Re-armed for the new token
+    assert client._refresh_at > time.time() + 5000000 - 1
+
+
+def test_closed_client_is_not_refreshed_and_can_be_collected():
+    transport = expiring_transport(latency=0)
+    client = ThreadsClient(
+        'old', transport=transport, identity={'user_id': '1', 'token_expires_at': time.time() + 0.2},
+        refresh_ahead=0.2,
+    )
+    client.close()
+    time.sleep(0.3)
+    assert refreshes(transport) == []
+
+    ref = weakref.ref(ThreadsClient(
+        'old', transport=transport, identity={'user_id': '1', 'token_expires_at': time.time() + 3600},
+        refresh_ahead=60,
+    ))
+    gc.collect()
+    assert ref() is None
+
+
+def test_refresh_hitting_the_deadline_gives_back_the_probe_slot():
+    def handler(*args):
+        raise DeadlineExceeded('refresh exceeded its deadline')
+
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.01, probes=1)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    client = ThreadsClient(
+        'old', transport=FakeTransport(handler=handler), user_id='1',
+        circuit_breakers={'refresh_access_token': breaker},
+    )
+    with pytest.raises(DeadlineExceeded):
+        client.refresh_access_token()
+    assert breaker.allow()
+
+
+def test_async_refresh_is_single_flight():
+    async def main():
+        transport = expiring_transport(AsyncFakeTransport)
+        client = AsyncThreadsClient('old', transport=transport, user_id='1', coalesce_gets=False)
+        results = await asyncio.gather(*[client.retrieve_profiles() for _ in range(6)])
+        return results, transport, client
+
+    results, transport, client = asyncio.run(main())
+    assert results == [{'id': '1'}] * 6
+    assert len(refreshes(transport)) == 1
+    assert client.auth_token == 'new'
+
+
+def test_async_refresh_hitting_the_deadline_gives_back_the_probe_slot():
+    class Failing(AsyncFakeTransport):
+        async def request(self, *args, **kwargs):
+            raise DeadlineExceeded('refresh exceeded its deadline')
+
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.01, probes=1)
+    breaker.record_failure()
+    time.sleep(0.02)
+    client = AsyncThreadsClient(
+        'old', transport=Failing(), user_id='1', circuit_breakers={'refresh_access_token': breaker},
+    )
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(client.refresh_access_token())
+    assert breaker.allow()
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+import pytest
+
+from threads_client import (
+    AsyncFakeTransport,
+    AsyncThreadsClient,
+    CallbackTokenStore,
+    FakeTransport,
+    FileTokenStore,
+    SQLiteStateBackend,
+    SQLiteTokenStore,
+    ThreadsClient,
+)
+
+RECORD = {'access_token': 'stored', 'expires_at': time.time() + 86400, 'updated_at': time.time()}
+
+
+@pytest.fixture(params=['file', 'sqlite', 'callback'])
+def store(request, tmp_path):
+    if request.param == 'file':
+        return FileTokenStore(str(tmp_path / 'token.json'))
+    if request.param == 'sqlite':
+        return SQLiteTokenStore(str(tmp_path / 'token.db'))
+    box = {}
+    return CallbackTokenStore(lambda: box.get('record'), lambda record: box.update(record=record))
+
+
+def refresh_transport(cls=FakeTransport, latency=0.05):
+    transport = cls(latency=latency)
+    transport.add('GET', '/refresh_access_token', {'access_token': 'new', 'expires_in': 5184000})
+    transport.add('GET', '/me', {'id': '1'})
+    return transport
+
+
+def refreshes(transport):
+    return [r for r in transport.requests if r['url'].endswith('/refresh_access_token')]
+
+
+def test_round_trip(store):
+    assert store.load() is None
+    store.save(RECORD)
+    assert store.load() == RECORD
+
+
+def test_lock_is_exclusive_between_threads(store):
+    inside = []
+    overlaps = []
+
+    def worker():
+        with store.lock():
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(1)
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+
+def test_file_store_is_private(tmp_path):
+    store = FileTokenStore(str(tmp_path / 'token.json'))
+    store.save(RECORD)
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+    assert [name for name in os.listdir(tmp_path) if name.startswith('.token-')] == []
+
+
+def test_client_adopts_a_newer_token_from_the_store(store):
+    store.save(RECORD)
+    client = ThreadsClient('old', transport=refresh_transport(), user_id='1', token_store=store)
+    assert client.auth_token == 'stored'
+
+
+def test_client_seeds_an_empty_store(store):
+    ThreadsClient('mine', transport=refresh_transport(), user_id='1', token_store=store)
+    assert store.load()['access_token'] == 'mine'
+
+
+def test_clients_sharing_a_store_refresh_once(store):
+    transport = refresh_transport()
+    clients = [ThreadsClient('old', transport=transport, user_id='1', token_store=store) for _ in range(4)]
+    threads = [threading.Thread(target=client._refresh_token, args=('old',)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(refreshes(transport)) == 1
+    assert [client.auth_token for client in clients] == ['new'] * 4
+    assert store.load()['access_token'] == 'new'
+
+
+def test_sqlite_refresh_does_not_block_state_writes_on_the_same_file(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    store = SQLiteTokenStore(path)
+    backend = SQLiteStateBackend(path, busy_timeout=0.2)
+    with store.lock():
+        # A refresh request would be in flight here
+        backend.window_add('user', time.time())
+        store.save(RECORD)
+    assert backend.window_count('user', 0) == 1
+    assert store.load() == RECORD
+
+
+def test_sqlite_lease_excludes_other_processes_and_expires(tmp_path):
+    path = str(tmp_path / 'token.db')
+    crashed = SQLiteTokenStore(path, lease_seconds=0.2)
+    assert crashed._claim_lease('dead-process')  # never released
+    waiting = SQLiteTokenStore(path, busy_timeout=0.05)
+    with pytest.raises(TimeoutError):
+        with waiting.lock():
+            pass
+
+    patient = SQLiteTokenStore(path, busy_timeout=2)
+    started = time.monotonic()
+    with patient.lock():
+        assert 0.1 < time.monotonic() - started < 1
+    rows = sqlite3.connect(path).execute('SELECT COUNT(*) FROM token_leases').fetchone()[0]
+    assert rows == 0
+
+
+def test_failed_refresh_releases_the_lease(tmp_path):
+    store = SQLiteTokenStore(str(tmp_path / 'token.db'), busy_timeout=0.1)
+    transport = FakeTransport()
+    transport.add('GET', '/refresh_access_token', {'error': {'message': 'bad', 'code': 100}}, status=400)
+    client = ThreadsClient('old', transport=transport, user_id='1', token_store=store)
+    with pytest.raises(Exception):
+        client._refresh_token('old')
+    with store.lock():
+        pass
+    assert store.load()['access_token'] == 'old'
+
+
+def test_async_clients_sharing_a_store_refresh_once(tmp_path):
+    store = SQLiteTokenStore(str(tmp_path / 'token.db'))
+
+    async def main():
+        transport = refresh_transport(AsyncFakeTransport)
+        clients = [AsyncThreadsClient('old', transport=transport, user_id='1', token_store=store) for _ in range(3)]
+        await asyncio.gather(*[client._refresh_token('old') for client in clients])
+        return transport, clients
+
+    transport, clients = asyncio.run(main())
+    assert len(refreshes(transport)) == 1
+    assert [client.auth_token for client in clients] == ['new'] * 3
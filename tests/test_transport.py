@@ -0,0 +1,42 @@
+import pytest
+
+from threads_client import FakeTransport, ThreadsClient, Transport, TransportResponse
+
+
+def test_transport_without_request_cannot_be_created():
+    class Incomplete(Transport):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_fake_transport_replays_scripted_responses_in_order():
+    transport = FakeTransport()
+    transport.add('GET', '/me', status=500)
+    transport.add('GET', '/me', {'id': '1'})
+    assert transport.request('GET', 'https://graph.threads.net/v1.0/me').status_code == 500
+    assert transport.request('GET', 'https://graph.threads.net/v1.0/me').json() == {'id': '1'}
+    # The last response repeats
+    assert transport.request('GET', 'https://graph.threads.net/v1.0/me').json() == {'id': '1'}
+    assert transport.request('GET', 'https://graph.threads.net/v1.0/other').status_code == 404
+    assert len(transport.requests) == 4
+
+
+def test_fake_transport_handler_and_connection_errors():
+    transport = FakeTransport(handler=lambda *args: TransportResponse(204, {'X-Test': 'yes'}))
+    transport.add('POST', '/threads', ConnectionError('reset'))
+    with pytest.raises(ConnectionError):
+        transport.request('POST', 'https://graph.threads.net/v1.0/1/threads')
+    response = transport.request('GET', 'https://graph.threads.net/v1.0/1/threads')
+    assert (response.status_code, response.headers) == (204, {'x-test': 'yes'})
+
+
+def test_client_sends_through_the_transport():
+    transport = FakeTransport()
+    transport.add('GET', '/me', {'id': '1', 'username': 'me'})
+    client = ThreadsClient('token', transport=transport)
+    assert client.user_id == '1'
+    sent = transport.requests[0]
+    assert sent['headers']['Authorization'] == 'Bearer token'
+    client.close()
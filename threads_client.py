@@ -1,8 +1,2403 @@
-import pprint
+import abc
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import copy
+import email.utils
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import queue
+import random
+import re
+import sqlite3
+import tempfile
 import time
+import threading
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import requests
+from requests.adapters import HTTPAdapter
 import os
 
+try:
+    import httpx
+except ImportError:  # optional: only needed by AsyncThreadsClient
+    httpx = None
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; only needed by FileTokenStore
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Fields whose values never reach the logs
+_SECRET_FIELDS = frozenset({'access_token', 'authorization', 'client_secret'})
+# User content; logged as a length unless log_payloads is enabled
+_PAYLOAD_FIELDS = frozenset({'text', 'image_url', 'video_url', 'alt_text', 'link_attachment'})
+_TOKEN_IN_TEXT = re.compile(r'(access_token=|Bearer\s+)[^&\s\'",]+')
+
+
+def _redact_text(text) -> str:
+    """Mask tokens embedded in URLs, headers or exception messages."""
+    return _TOKEN_IN_TEXT.sub(r'\1***', str(text))
+
+
+class _Redacted:
+    """Log argument that is masked and formatted only if the record is actually emitted."""
+    __slots__ = ('value', 'payloads')
+
+    def __init__(self, value, payloads=False):
+        self.value = value
+        self.payloads = payloads
+
+    def _mask(self, value):
+        if isinstance(value, dict):
+            masked = {}
+            for key, item in value.items():
+                name = str(key).lower()
+                if name in _SECRET_FIELDS:
+                    masked[key] = '***'
+                elif name in _PAYLOAD_FIELDS and not self.payloads and isinstance(item, str):
+                    masked[key] = f'<{len(item)} chars>'
+                else:
+                    masked[key] = self._mask(item)
+            return masked
+        if isinstance(value, (list, tuple)):
+            return [self._mask(item) for item in value]
+        return value
+
+    def __str__(self):
+        return _redact_text(self._mask(self.value))
+
+
+class ThreadsError(Exception):
+    """Base class for every error raised by this client."""
+
+
+class ThreadsAPIError(ThreadsError):
+    """An error response from the Threads Graph API.
+
+    The Graph error body is parsed into attributes:
+
+        {'error': {'message': '...', 'type': 'OAuthException', 'code': 190,
+                   'error_subcode': 463, 'fbtrace_id': 'A1b2C3', 'is_transient': False}}
+
+    `retryable` tells _request whether backing off and trying again can help;
+    `retry_after` is how long the server asked us to wait, if it said so.
+    """
+    retryable = False
+
+    def __init__(
+        self,
+        message,
+        status_code=None,
+        code=None,
+        error_subcode=None,
+        error_type=None,
+        fbtrace_id=None,
+        is_transient=None,
+        body=None,
+        url=None,
+        retry_after=None,
+        usage=None,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.error_subcode = error_subcode
+        self.error_type = error_type
+        self.fbtrace_id = fbtrace_id
+        self.is_transient = is_transient
+        self.body = body
+        self.url = url
+        # Seconds the server asked us to wait (Retry-After / usage headers), if any
+        self.retry_after = retry_after
+        self.usage = usage or {}
+
+    def _with_message(self, message) -> 'ThreadsAPIError':
+        error = copy.copy(self)
+        error.args = (message,)
+        return error
+
+
+class ThreadsConnectionError(ThreadsAPIError):
+    """The request never got an HTTP response (DNS, TCP, TLS, timeout)."""
+    retryable = True
+
+
+class ThreadsTransientError(ThreadsAPIError):
+    """Server-side failure that is expected to clear up (5xx, is_transient, codes 1/2)."""
+    retryable = True
+
+
+class ThreadsRateLimitError(ThreadsAPIError):
+    """Application, user or business-use-case call rate limit reached."""
+    retryable = True
+
+
+class ThreadsAuthError(ThreadsAPIError):
+    """The access token was rejected."""
+
+
+class ThreadsTokenExpiredError(ThreadsAuthError):
+    """The access token has expired; refreshing it may help."""
+
+
+class ThreadsPermanentError(ThreadsAPIError):
+    """Invalid request, missing permission or unknown object; retrying will not help."""
+
+
+# Graph API error codes (https://developers.facebook.com/docs/graph-api/guides/error-handling)
+RATE_LIMIT_ERROR_CODES = frozenset({4, 17, 32, 613} | set(range(80001, 80015)))
+TRANSIENT_ERROR_CODES = frozenset({1, 2})
+AUTH_ERROR_CODES = frozenset({102, 190})
+TOKEN_EXPIRED_SUBCODES = frozenset({463, 467})
+# "You reached maximum number of posts" — a 24h window, so backing off within a call is pointless
+PUBLISH_LIMIT_SUBCODE = 2207042
+# Invalid parameter; also what an unknown object ID in an ?ids= lookup fails with
+INVALID_PARAMETER_CODE = 100
+
+
+def _graph_error(status_code, body, url=None, prefix=None, headers=None) -> ThreadsAPIError:
+    """Classify an HTTP error response into the ThreadsAPIError hierarchy."""
+    error = body.get('error') if isinstance(body, dict) else None
+    if not isinstance(error, dict):
+        error = {}
+    code = error.get('code')
+    subcode = error.get('error_subcode')
+    message = error.get('message') or ''
+
+    if status_code >= 500 or error.get('is_transient') or code in TRANSIENT_ERROR_CODES:
+        error_class = ThreadsTransientError
+    elif code in RATE_LIMIT_ERROR_CODES or status_code == 429:
+        error_class = ThreadsRateLimitError
+    elif code in AUTH_ERROR_CODES or status_code == 401:
+        expired = status_code == 401 or subcode in TOKEN_EXPIRED_SUBCODES or 'expired' in message.lower()
+        error_class = ThreadsTokenExpiredError if expired else ThreadsAuthError
+    else:
+        error_class = ThreadsPermanentError
+
+    headers = headers or {}
+    retry_after = _parse_retry_after(headers.get('retry-after'))
+    usage = _parse_usage_headers(headers)
+    if error_class is ThreadsRateLimitError and usage.get('regain_access_seconds'):
+        retry_after = max(retry_after or 0, usage['regain_access_seconds'])
+
+    prefix = prefix or f"HTTPError {status_code} for {url}"
+    result = error_class(
+        f"{prefix}: {body}",
+        status_code=status_code,
+        code=code,
+        error_subcode=subcode,
+        error_type=error.get('type'),
+        fbtrace_id=error.get('fbtrace_id'),
+        is_transient=error.get('is_transient'),
+        body=body,
+        url=url,
+        retry_after=retry_after,
+        usage=usage,
+    )
+    if subcode == PUBLISH_LIMIT_SUBCODE:
+        result.retryable = False
+    return result
+
+
+def _response_error(response, url=None, prefix=None) -> ThreadsAPIError:
+    try:
+        body = response.json()
+    except Exception:
+        body = response.text
+    return _graph_error(response.status_code, body, url, prefix, response.headers)
+
+
+def _parse_retry_after(value):
+    """Retry-After as seconds from now; it is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_usage_headers(headers) -> dict:
+    """Parse the Graph usage headers into a summary; empty when none are present.
+
+    example headers:
+        X-App-Usage: {"call_count": 28, "total_time": 25, "total_cputime": 25}
+        X-Business-Use-Case-Usage: {"1234": [{"type": "threads", "call_count": 100,
+            "total_cputime": 10, "total_time": 10, "estimated_time_to_regain_access": 5}]}
+
+    example result:
+        {'app': {...}, 'business_use_case': [{...}], 'max_percent': 100,
+         'regain_access_seconds': 300}
+    """
+    app_usage = headers.get('x-app-usage')
+    business_usage = headers.get('x-business-use-case-usage')
+    if not app_usage and not business_usage:
+        return {}
+    usage = {'app': {}, 'business_use_case': [], 'max_percent': 0, 'regain_access_seconds': 0}
+    try:
+        if app_usage:
+            usage['app'] = json.loads(app_usage)
+        if business_usage:
+            for entries in json.loads(business_usage).values():
+                usage['business_use_case'].extend(entries)
+    except (ValueError, AttributeError):
+        return usage
+    for entry in [usage['app'], *usage['business_use_case']]:
+        for name in ('call_count', 'total_cputime', 'total_time'):
+            usage['max_percent'] = max(usage['max_percent'], entry.get(name) or 0)
+        # estimated_time_to_regain_access is in minutes
+        regain = (entry.get('estimated_time_to_regain_access') or 0) * 60
+        usage['regain_access_seconds'] = max(usage['regain_access_seconds'], regain)
+    return usage
+
+
+class RetryBudget:
+    """Caps retries at a fraction of a client's total request traffic.
+
+    Every first attempt deposits `ratio` tokens and every retry withdraws one,
+    so retries can add at most `ratio` extra load on top of normal traffic.
+    `min_per_second` tokens trickle in regardless, so a quiet client can still
+    retry, and the balance never exceeds `burst`. When the budget is empty
+    _request gives up instead of retrying, which stops synchronized retry
+    storms from many workers sharing a client.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=0.5, burst=10.0):
+        """
+        Args:
+            ratio: retries allowed per first attempt (0.1 -> at most 10% extra calls)
+            min_per_second: retries always allowed per second, regardless of traffic
+            burst: maximum retries that can be banked
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.burst = burst
+        self._balance = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.burst, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    @property
+    def balance(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._balance
+
+    def deposit(self):
+        """Record a first attempt."""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.burst, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one retry from the budget; False when none is left."""
+        with self._lock:
+            self._refill()
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class CircuitOpenError(ThreadsError):
+    """Raised without calling the API while the circuit for an endpoint is open."""
+
+    def __init__(self, message, circuit=None, retry_after=None):
+        super().__init__(message)
+        self.circuit = circuit
+        # Seconds until the breaker lets a probe request through
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one API endpoint.
+
+    closed: calls flow; outcomes over the last `window` seconds are tracked and
+        the breaker opens once at least `min_calls` were seen and the share of
+        failures reaches `failure_rate`.
+    open: calls fail fast with CircuitOpenError for `open_seconds`.
+    half_open: up to `probes` calls are let through; if they all succeed the
+        breaker closes, any failure re-opens it.
+
+    Only server-side trouble (connection errors, timeouts, 5xx / transient
+    errors) counts as a failure; a 4xx answer means the endpoint is healthy.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=60.0, open_seconds=30.0, probes=1):
+        """
+        Args:
+            failure_rate: share of failed calls in the window that opens the breaker
+            min_calls: calls needed in the window before the rate is trusted
+            window: seconds of history the failure rate is computed over
+            open_seconds: how long to fail fast before probing again
+            probes: concurrent trial calls allowed (and successes needed) when half-open
+        """
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self._state = self.CLOSED
+        # (timestamp, failed) for calls in the window
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        cutoff = now - self.window
+        while self._outcomes and self._outcomes[0][0] <= cutoff:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now >= self._opened_at + self.open_seconds:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def retry_after(self) -> float:
+        """Seconds until a probe may be attempted (0 unless open)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._current_state(now) != self.OPEN:
+                return 0.0
+            return self._opened_at + self.open_seconds - now
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; a True in half-open state claims a probe slot."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def release(self):
+        """Give back a probe slot claimed by allow() for a call that was abandoned (e.g. cancelled)."""
+        with self._lock:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                self._probe_successes += 1
+                if self._probe_successes >= self.probes:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                return
+            if state == self.CLOSED:
+                self._prune(now)
+                self._outcomes.append((now, False))
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                self._open(now)
+                return
+            if state == self.CLOSED:
+                self._prune(now)
+                self._outcomes.append((now, True))
+                self._failures += 1
+                calls = len(self._outcomes)
+                if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+                    self._open(now)
+
+    def snapshot(self) -> dict:
+        """
+        example:
+            {'state': 'open', 'calls': 12, 'failures': 9, 'failure_rate': 0.75, 'retry_after': 21.4}
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._outcomes)
+            return {
+                'state': state,
+                'calls': calls,
+                'failures': self._failures,
+                'failure_rate': self._failures / calls if calls else 0.0,
+                'retry_after': self._opened_at + self.open_seconds - now if state == self.OPEN else 0.0,
+            }
+
+
+class ClientMetrics:
+    """Per-endpoint request metrics for ThreadsClient / AsyncThreadsClient.
+
+    Pass one as ``metrics=`` to the client; every HTTP attempt is recorded by
+    endpoint (the circuit key: 'me', 'threads', 'threads_publish',
+    'container_status', 'threads_publishing_limit', 'refresh_access_token', ...):
+    request count, status-code counts, retries, bytes out/in and a latency
+    histogram. Read them with snapshot() or to_prometheus(), or subscribe with
+    add_listener(fn) to receive every event as a dict:
+
+        {'endpoint': 'threads_publish', 'method': 'POST', 'status': 200,
+         'seconds': 0.231, 'bytes_out': 64, 'bytes_in': 27, 'retry': False}
+
+    `status` is 'error' when no HTTP response was received. Recording is a few
+    dict updates under a lock, cheap enough to leave on in production.
+    """
+    # Latency histogram upper bounds in seconds (Prometheus' default buckets)
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS, namespace='threads_client'):
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+        self._endpoints = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, fn):
+        """Call fn(event) for every recorded request (see the class docstring)."""
+        self._listeners.append(fn)
+        return fn
+
+    def remove_listener(self, fn):
+        self._listeners.remove(fn)
+
+    def _new_endpoint(self) -> dict:
+        return {
+            'requests': 0,
+            'retries': 0,
+            'statuses': {},
+            'bytes_out': 0,
+            'bytes_in': 0,
+            'latency_sum': 0.0,
+            'latency_buckets': [0] * (len(self.buckets) + 1),
+        }
+
+    def record_request(self, endpoint, method, status, seconds, bytes_out=0, bytes_in=0, retry=False):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = self._new_endpoint()
+            stats['requests'] += 1
+            stats['retries'] += retry
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            stats['bytes_out'] += bytes_out
+            stats['bytes_in'] += bytes_in
+            stats['latency_sum'] += seconds
+            stats['latency_buckets'][bucket] += 1
+        if not self._listeners:
+            return
+        for listener in self._listeners:
+            try:
+                listener({
+                    'endpoint': endpoint,
+                    'method': method,
+                    'status': status,
+                    'seconds': seconds,
+                    'bytes_out': bytes_out,
+                    'bytes_in': bytes_in,
+                    'retry': retry,
+                })
+            except Exception:
+                logger.exception('Metrics listener %r failed', listener)
+
+    def snapshot(self) -> dict:
+        """
+        example response:
+            {
+                'threads_publish': {
+                    'requests': 12, 'retries': 1, 'statuses': {200: 11, 500: 1},
+                    'bytes_out': 768, 'bytes_in': 324, 'latency_sum': 2.91,
+                    'latency_buckets': [0, 0, 0, 0, 0, 9, 3, 0, 0, 0, 0, 0]  # per BUCKETS, then +Inf
+                }
+            }
+        """
+        with self._lock:
+            return copy.deepcopy(self._endpoints)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        ns = self.namespace
+        endpoints = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {ns}_{name} {help_text}')
+            lines.append(f'# TYPE {ns}_{name} {kind}')
+
+        family('requests_total', 'counter', 'Threads API HTTP attempts by endpoint and status.')
+        for endpoint, stats in sorted(endpoints.items()):
+            for status, count in sorted(stats['statuses'].items(), key=lambda item: str(item[0])):
+                lines.append(f'{ns}_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        family('retries_total', 'counter', 'Threads API attempts that were retries.')
+        for endpoint, stats in sorted(endpoints.items()):
+            lines.append(f'{ns}_retries_total{{endpoint="{endpoint}"}} {stats["retries"]}')
+        family('sent_bytes_total', 'counter', 'Request bytes sent (URL, query and body).')
+        for endpoint, stats in sorted(endpoints.items()):
+            lines.append(f'{ns}_sent_bytes_total{{endpoint="{endpoint}"}} {stats["bytes_out"]}')
+        family('received_bytes_total', 'counter', 'Response body bytes received.')
+        for endpoint, stats in sorted(endpoints.items()):
+            lines.append(f'{ns}_received_bytes_total{{endpoint="{endpoint}"}} {stats["bytes_in"]}')
+        family('request_duration_seconds', 'histogram', 'Threads API attempt latency.')
+        for endpoint, stats in sorted(endpoints.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), stats['latency_buckets']):
+                cumulative += count
+                lines.append(f'{ns}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'{ns}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["latency_sum"]}')
+            lines.append(f'{ns}_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9464, host='127.0.0.1'):
+        """Serve to_prometheus() at http://host:port/metrics from a daemon thread; returns the server.
+
+        Listens on localhost only by default; pass host='0.0.0.0' to let a
+        remote Prometheus scrape it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _request_size(url, params, data, json_body) -> int:
+    """Approximate bytes sent: URL, query string and body (headers excluded, no percent-encoding)."""
+    size = len(url)
+    for fields in (params, data):
+        if fields:
+            size += sum(len(str(key)) + len(str(value)) + 2 for key, value in fields.items())
+    if not data and json_body is not None:
+        size += len(json.dumps(json_body))
+    return size
+
+
+class TransportResponse:
+    """Minimal HTTP response shared by every transport backend.
+
+    `headers` is a dict with lower-cased header names.
+    """
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code, headers=None, content=b''):
+        self.status_code = status_code
+        self.headers = {name.lower(): value for name, value in (headers or {}).items()}
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class Transport(abc.ABC):
+    """Interface ThreadsClient uses for all HTTP traffic.
+
+    request() sends one HTTP request and returns a TransportResponse; it
+    raises only for connection-level failures and timeouts (HTTP error
+    statuses are returned, not raised). `timeout` is a (connect, read) pair
+    of seconds, or None for no limit. AsyncThreadsClient uses transports
+    whose request() is a coroutine with the same signature. A subclass
+    without request() cannot be instantiated.
+    """
+
+    @abc.abstractmethod
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        """Send one request; see the class docstring."""
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """requests-based transport with a pooled keep-alive session (the default)."""
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, session=None):
+        """
+        Args:
+            pool_connections: number of per-host connection pools to cache
+            pool_maxsize: max keep-alive connections kept per host
+            pool_block: block when a host's pool is exhausted instead of
+                opening a throwaway connection
+            session: optional pre-configured requests.Session to share
+                between clients (pool options are ignored in that case)
+        """
+        self._owns_session = session is None
+        self.session = session or self._build_session(pool_connections, pool_maxsize, pool_block)
+
+    @staticmethod
+    def _build_session(pool_connections, pool_maxsize, pool_block) -> requests.Session:
+        """Create a keep-alive session so TCP+TLS connections are reused across calls."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        response = self.session.request(
+            method=method,
+            url=url,
+            params=params,
+            data=data,
+            json=json,
+            headers=headers,
+            timeout=timeout,
+        )
+        return TransportResponse(response.status_code, response.headers, response.content)
+
+    def close(self):
+        if self._owns_session:
+            self.session.close()
+
+
+def _httpx_timeout(timeout):
+    if timeout is None:
+        return httpx.Timeout(None)
+    connect, read = timeout
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+
+class HttpxTransport(Transport):
+    """httpx-based transport; http2=True negotiates HTTP/2 (requires the h2 package)."""
+
+    def __init__(self, http2=False, max_connections=100, max_keepalive_connections=20, client=None):
+        if httpx is None and client is None:
+            raise ImportError("HttpxTransport requires httpx (pip install httpx)")
+        self._owns_client = client is None
+        self.client = client or httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            timeout=None,
+        )
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        response = self.client.request(
+            method,
+            url,
+            params=params,
+            data=data,
+            json=json,
+            headers=headers,
+            timeout=_httpx_timeout(timeout),
+        )
+        return TransportResponse(response.status_code, response.headers, response.content)
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
+
+
+class AsyncHttpxTransport(Transport):
+    """Async httpx transport used by AsyncThreadsClient."""
+
+    def __init__(self, http2=False, max_connections=100, max_keepalive_connections=20, client=None):
+        if httpx is None and client is None:
+            raise ImportError("AsyncHttpxTransport requires httpx (pip install httpx)")
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            timeout=None,
+        )
+
+    async def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        response = await self.client.request(
+            method,
+            url,
+            params=params,
+            data=data,
+            json=json,
+            headers=headers,
+            timeout=_httpx_timeout(timeout),
+        )
+        return TransportResponse(response.status_code, response.headers, response.content)
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+
+class FakeTransport(Transport):
+    """Zero-network transport returning scripted responses.
+
+    Responses are scripted per route with add(); a route matches when the
+    method is equal and the URL path ends with the route's path. Responses
+    for a route are returned in order and the last one repeats. Unmatched
+    requests go to `handler(method, url, params, data, json, headers)` if
+    given, or get a Graph-style 404. Every request is appended to
+    `self.requests`.
+
+    Example:
+        transport = FakeTransport(latency=0.05)
+        transport.add('GET', '/me', {'id': '1', 'username': 'me'})
+        transport.add('POST', '/threads', status=500)
+        transport.add('POST', '/threads', {'id': 'container'})
+        client = ThreadsClient('token', transport=transport)
+    """
+
+    def __init__(self, handler=None, latency=0.0):
+        """
+        Args:
+            handler: fallback callable returning a response for unmatched requests
+            latency: seconds added to every request, or a (min, max) range
+        """
+        self.handler = handler
+        self.latency = latency
+        self.routes = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def add(self, method, path, body=None, status=200, headers=None):
+        """Script a response; `body` may be an exception instance to simulate a connection error."""
+        with self._lock:
+            for route in self.routes:
+                if route[0] == method and route[1] == path:
+                    route[2].append((status, body, headers))
+                    return self
+            self.routes.append((method, path, deque([(status, body, headers)])))
+        return self
+
+    def _delay(self) -> float:
+        if isinstance(self.latency, (tuple, list)):
+            return random.uniform(*self.latency)
+        return self.latency
+
+    def _respond(self, method, url, params, data, json_body, headers) -> TransportResponse:
+        path = urlsplit(url).path
+        with self._lock:
+            self.requests.append({
+                'method': method, 'url': url, 'params': params, 'data': data, 'json': json_body, 'headers': headers,
+            })
+            scripted = None
+            for route_method, route_path, responses in self.routes:
+                if route_method == method and path.endswith(route_path):
+                    scripted = responses.popleft() if len(responses) > 1 else responses[0]
+                    break
+        if scripted is None and self.handler is not None:
+            scripted = self.handler(method, url, params, data, json_body, headers)
+        if scripted is None:
+            scripted = (404, {'error': {'message': f'No fake response for {method} {path}', 'code': 803}}, None)
+        if isinstance(scripted, TransportResponse):
+            return scripted
+
+        status, body, response_headers = scripted
+        if isinstance(body, BaseException):
+            raise body
+        if isinstance(body, (bytes, str)):
+            content = body.encode() if isinstance(body, str) else body
+        else:
+            content = json.dumps(body if body is not None else {}).encode()
+        return TransportResponse(status, {'Content-Type': 'application/json', **(response_headers or {})}, content)
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        delay = self._delay()
+        if timeout is not None and timeout[1] is not None and delay > timeout[1]:
+            time.sleep(timeout[1])
+            raise TimeoutError(f'Simulated read timeout after {timeout[1]}s')
+        if delay:
+            time.sleep(delay)
+        return self._respond(method, url, params, data, json, headers)
+
+
+class AsyncFakeTransport(FakeTransport):
+    """FakeTransport for AsyncThreadsClient; latency is simulated with asyncio.sleep."""
+
+    async def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        delay = self._delay()
+        if timeout is not None and timeout[1] is not None and delay > timeout[1]:
+            await asyncio.sleep(timeout[1])
+            raise TimeoutError(f'Simulated read timeout after {timeout[1]}s')
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(method, url, params, data, json, headers)
+
+    async def aclose(self):
+        pass
+
+
+class DeadlineExceeded(ThreadsError, TimeoutError):
+    """Raised when an operation's end-to-end deadline expires; remaining work is abandoned."""
+
+
+class Deadline:
+    """Absolute point in time (monotonic clock) by which an operation must finish."""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def coerce(cls, value) -> 'Deadline':
+        return value if isinstance(value, Deadline) else cls(value)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what='Threads API operation'):
+        if self.expired():
+            raise DeadlineExceeded(f"{what} exceeded its deadline")
+
+
+_current_deadline = contextvars.ContextVar('threads_client_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """Apply a deadline (seconds or Deadline) to every API call made inside the block.
+
+    Nested scopes keep whichever deadline is earlier. The deadline travels in
+    a context variable, so it reaches every nested _request (and asyncio tasks
+    started inside the block).
+
+        with deadline_scope(30):
+            client.check_publishing_quota()
+            client.post_thread('hello')
+    """
+    current = _current_deadline.get()
+    if deadline is None:
+        yield current
+        return
+    deadline = Deadline.coerce(deadline)
+    if current is not None and current.expires_at < deadline.expires_at:
+        deadline = current
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def _cap_timeout(connect_timeout, read_timeout):
+    """(connect, read) timeouts shortened to the current deadline, if any."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return (connect_timeout, read_timeout)
+    deadline.check()
+    remaining = deadline.remaining()
+    return (
+        remaining if connect_timeout is None else min(connect_timeout, remaining),
+        remaining if read_timeout is None else min(read_timeout, remaining),
+    )
+
+
+def _deadline_sleep_check(seconds, what):
+    """Raise DeadlineExceeded instead of sleeping past the current deadline."""
+    deadline = _current_deadline.get()
+    if deadline is not None and seconds >= deadline.remaining():
+        raise DeadlineExceeded(f"{what} would exceed the deadline ({seconds:.1f}s wait, {deadline.remaining():.1f}s left)")
+
+
+def _sleep(seconds, what='Retry backoff'):
+    _deadline_sleep_check(seconds, what)
+    time.sleep(seconds)
+
+
+async def _async_sleep(seconds, what='Retry backoff'):
+    _deadline_sleep_check(seconds, what)
+    await asyncio.sleep(seconds)
+
+
+class _Flight:
+    """A GET on the wire that identical concurrent calls wait on instead of sending their own."""
+    __slots__ = ('future', 'waiters')
+
+    def __init__(self, future):
+        self.future = future
+        self.waiters = 0
+
+
+def _wait_flight(future):
+    """Result of another thread's in-flight request, waiting no longer than the current deadline."""
+    deadline = _current_deadline.get()
+    try:
+        return future.result(timeout=None if deadline is None else deadline.remaining())
+    except FutureTimeoutError:
+        if future.done():
+            raise
+        raise DeadlineExceeded("Threads API request exceeded its deadline waiting for an identical in-flight request")
+
+
+async def _wait_flight_async(task):
+    """See _wait_flight; the shared task is shielded from this caller's cancellation."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), deadline.remaining())
+    except asyncio.TimeoutError:
+        if task.done():
+            raise
+        raise DeadlineExceeded("Threads API request exceeded its deadline waiting for an identical in-flight request")
+
+
+class _Call:
+    """One transport call: what the shared breaker and metrics bookkeeping records about it."""
+    __slots__ = ('circuit', 'method', 'url', 'params', 'data', 'breaker', 'retry', 'started')
+
+    def __init__(self, circuit, method, url, params, data, breaker, retry=False):
+        self.circuit = circuit
+        self.method = method
+        self.url = url
+        self.params = params
+        self.data = data
+        self.breaker = breaker
+        self.retry = retry
+        self.started = time.perf_counter()
+
+
+class ContainerPoller:
+    """Adaptive polling schedule for media container status checks.
+
+    The first check is immediate. If the container is still IN_PROGRESS, the
+    first sleep targets the typical processing time learned for that media
+    type, and later sleeps grow exponentially (with jitter) until the
+    per-media-type deadline. Observed completion times are kept in a
+    log-bucketed histogram per media type; old samples decay so the estimate
+    follows changes in server behavior.
+    """
+    DEFAULT_DEADLINES = {
+        'TEXT': 60,
+        'IMAGE': 120,
+        'CAROUSEL': 300,
+        'VIDEO': 900,
+    }
+    # Histogram bucket upper bounds in seconds (10ms .. ~44min, factor sqrt(2))
+    BUCKET_BOUNDS = tuple(0.01 * 2 ** (i / 2) for i in range(37))
+    MIN_SLEEP_SECONDS = 0.05
+
+    def __init__(
+        self,
+        initial_interval=1.0,
+        multiplier=2.0,
+        max_interval=30.0,
+        jitter=0.2,
+        deadlines=None,
+        quantile=0.5,
+        max_samples=500,
+    ):
+        """
+        Args:
+            initial_interval: first backoff sleep when nothing has been learned yet
+            multiplier: growth factor between consecutive sleeps
+            max_interval: cap on a single sleep
+            jitter: +/- fraction of randomization applied to each sleep
+            deadlines: {media_type: seconds} overrides for DEFAULT_DEADLINES
+            quantile: histogram quantile used as the expected processing time
+            max_samples: sample count per media type after which counts decay
+        """
+        self.initial_interval = initial_interval
+        self.multiplier = multiplier
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.deadlines = {**self.DEFAULT_DEADLINES, **(deadlines or {})}
+        self.quantile = quantile
+        self.max_samples = max_samples
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def deadline_for(self, media_type) -> float:
+        return self.deadlines.get(media_type, self.DEFAULT_DEADLINES['TEXT'])
+
+    def record(self, media_type, elapsed):
+        """Add an observed IN_PROGRESS -> FINISHED duration to the histogram."""
+        index = len(self.BUCKET_BOUNDS) - 1
+        for i, bound in enumerate(self.BUCKET_BOUNDS):
+            if elapsed <= bound:
+                index = i
+                break
+        with self._lock:
+            counts = self._histograms.setdefault(media_type, [0.0] * len(self.BUCKET_BOUNDS))
+            counts[index] += 1
+            if sum(counts) > self.max_samples:
+                self._histograms[media_type] = [count / 2 for count in counts]
+
+    def expected(self, media_type):
+        """Expected processing time for `media_type` in seconds, or None if unknown."""
+        with self._lock:
+            counts = list(self._histograms.get(media_type, ()))
+        total = sum(counts)
+        if not total:
+            return None
+        cumulative = 0.0
+        for bound, count in zip(self.BUCKET_BOUNDS, counts):
+            cumulative += count
+            if cumulative >= total * self.quantile:
+                # Geometric midpoint of the bucket
+                return bound / 2 ** 0.25
+        return self.BUCKET_BOUNDS[-1]
+
+    def start(self, media_type='TEXT') -> '_PollSchedule':
+        """Begin polling one container; returns its schedule."""
+        return _PollSchedule(self, media_type)
+
+
+class _PollSchedule:
+    def __init__(self, poller, media_type):
+        self.poller = poller
+        self.media_type = media_type
+        self.started_at = time.monotonic()
+        self.deadline_at = self.started_at + poller.deadline_for(media_type)
+        self.attempt = 0
+        # Planned times of the last two status checks; completion happened between them
+        self._previous_check_at = self.started_at
+        self._next_check_at = self.started_at
+
+    def next_delay(self):
+        """Seconds to sleep before the next status check, or None once the deadline has passed."""
+        poller = self.poller
+        now = time.monotonic()
+        remaining = self.deadline_at - now
+        if remaining <= 0:
+            return None
+
+        attempt = self.attempt
+        self.attempt += 1
+        if attempt == 0:
+            delay = 0.0
+        else:
+            delay = poller.initial_interval * poller.multiplier ** (attempt - 1)
+            if attempt == 1:
+                expected = poller.expected(self.media_type)
+                if expected is not None:
+                    delay = expected - (now - self.started_at)
+            delay = min(delay, poller.max_interval)
+            delay *= 1 + random.uniform(-poller.jitter, poller.jitter)
+            delay = min(max(delay, poller.MIN_SLEEP_SECONDS), remaining)
+        self._previous_check_at = self._next_check_at
+        self._next_check_at = now + delay
+        return delay
+
+    def finished(self):
+        """Record the container as FINISHED so the poller learns its processing time.
+
+        Completion is only known to lie between the last IN_PROGRESS check and
+        this one, so the midpoint is recorded; recording the observation time
+        would bias the estimate (and so the next first sleep) upwards.
+        """
+        completed_at = (self._previous_check_at + time.monotonic()) / 2
+        self.poller.record(self.media_type, completed_at - self.started_at)
+
+
+class MemoryStateBackend:
+    """In-process state for RateLimiter and PublishLedger (the default).
+
+    Every state backend implements the same small set of atomic operations on
+    two kinds of keyed state: token buckets and sliding windows of
+    timestamps. Limiters and ledgers that share a backend and a key (e.g. the
+    Threads user id) share one budget.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    # --- token buckets ---------------------------------------------------
+
+    def _refilled(self, key, capacity, rate, now):
+        tokens, updated_at = self._buckets.get(key, (float(capacity), now))
+        return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+    def bucket_reserve(self, key, tokens, capacity, rate, now, max_wait=None):
+        """Take `tokens` unless the wait would exceed max_wait; returns (granted, wait_seconds)."""
+        with self._lock:
+            available = self._refilled(key, capacity, rate, now)
+            wait_seconds = max(0.0, (tokens - available) / rate)
+            granted = not (wait_seconds and max_wait is not None and wait_seconds > max_wait)
+            if granted:
+                available -= tokens
+            self._buckets[key] = (available, now)
+            return granted, wait_seconds
+
+    def bucket_adjust(self, key, delta, capacity, rate, now):
+        """Add `delta` tokens (may be negative), clamped to `capacity`."""
+        with self._lock:
+            available = min(capacity, self._refilled(key, capacity, rate, now) + delta)
+            self._buckets[key] = (available, now)
+
+    def bucket_peek(self, key, capacity, rate, now) -> float:
+        with self._lock:
+            return self._refilled(key, capacity, rate, now)
+
+    # --- sliding windows -------------------------------------------------
+
+    def _pruned(self, key, since):
+        timestamps = self._windows.setdefault(key, deque())
+        while timestamps and timestamps[0] <= since:
+            timestamps.popleft()
+        return timestamps
+
+    def window_count(self, key, since) -> int:
+        with self._lock:
+            return len(self._pruned(key, since))
+
+    def window_next_slot(self, key, now, window, limit) -> float:
+        with self._lock:
+            timestamps = self._pruned(key, now - window)
+            if len(timestamps) < limit:
+                return now
+            # The slot frees up when the entry that keeps us at the limit leaves the window
+            return timestamps[len(timestamps) - limit] + window
+
+    def window_add(self, key, timestamp):
+        with self._lock:
+            timestamps = self._windows.setdefault(key, deque())
+            if timestamps and timestamp < timestamps[-1]:
+                timestamps.append(timestamp)
+                self._windows[key] = deque(sorted(timestamps))
+            else:
+                timestamps.append(timestamp)
+
+    def window_reserve(self, key, now, window, limit):
+        """Atomically add `now` if under `limit`; returns (reservation or None, next_slot_at)."""
+        with self._lock:
+            timestamps = self._pruned(key, now - window)
+            if len(timestamps) >= limit:
+                return None, timestamps[len(timestamps) - limit] + window
+            timestamps.append(now)
+            return now, now
+
+    def window_release(self, key, reservation):
+        with self._lock:
+            try:
+                self._windows.get(key, deque()).remove(reservation)
+            except ValueError:
+                pass
+
+    def window_reconcile(self, key, now, window, count):
+        """Pad (with `now`) or trim (oldest first) the window to exactly `count` entries."""
+        with self._lock:
+            timestamps = self._pruned(key, now - window)
+            while len(timestamps) < count:
+                timestamps.append(now)
+            while len(timestamps) > max(count, 0):
+                timestamps.popleft()
+
+
+class SQLiteStateBackend:
+    """State shared by every process on a host through one SQLite file in WAL mode.
+
+    Each operation runs in its own BEGIN IMMEDIATE transaction, so concurrent
+    processes coordinate atomically without a separate service.
+    """
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS publish_ledger ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, published_at REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS publish_ledger_key_time ON publish_ledger (key, published_at)'
+        )
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    @staticmethod
+    def _refilled(db, key, capacity, rate, now):
+        row = db.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return float(capacity)
+        return min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+
+    @staticmethod
+    def _store_bucket(db, key, tokens, now):
+        db.execute(
+            'INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+            (key, tokens, now),
+        )
+
+    def bucket_reserve(self, key, tokens, capacity, rate, now, max_wait=None):
+        def op(db):
+            available = self._refilled(db, key, capacity, rate, now)
+            wait_seconds = max(0.0, (tokens - available) / rate)
+            granted = not (wait_seconds and max_wait is not None and wait_seconds > max_wait)
+            if granted:
+                available -= tokens
+            self._store_bucket(db, key, available, now)
+            return granted, wait_seconds
+        return self._transaction(op)
+
+    def bucket_adjust(self, key, delta, capacity, rate, now):
+        def op(db):
+            available = min(capacity, self._refilled(db, key, capacity, rate, now) + delta)
+            self._store_bucket(db, key, available, now)
+        self._transaction(op)
+
+    def bucket_peek(self, key, capacity, rate, now) -> float:
+        return self._transaction(lambda db: self._refilled(db, key, capacity, rate, now))
+
+    @staticmethod
+    def _prune(db, key, since):
+        db.execute('DELETE FROM publish_ledger WHERE key = ? AND published_at <= ?', (key, since))
+
+    @staticmethod
+    def _count(db, key):
+        return db.execute('SELECT COUNT(*) FROM publish_ledger WHERE key = ?', (key,)).fetchone()[0]
+
+    @staticmethod
+    def _slot_at(db, key, count, window, limit):
+        row = db.execute(
+            'SELECT published_at FROM publish_ledger WHERE key = ? ORDER BY published_at LIMIT 1 OFFSET ?',
+            (key, count - limit),
+        ).fetchone()
+        return row[0] + window
+
+    def window_count(self, key, since) -> int:
+        return self._transaction(lambda db: (self._prune(db, key, since), self._count(db, key))[1])
+
+    def window_next_slot(self, key, now, window, limit) -> float:
+        def op(db):
+            self._prune(db, key, now - window)
+            count = self._count(db, key)
+            return now if count < limit else self._slot_at(db, key, count, window, limit)
+        return self._transaction(op)
+
+    def window_add(self, key, timestamp):
+        self._transaction(lambda db: db.execute(
+            'INSERT INTO publish_ledger (key, published_at) VALUES (?, ?)', (key, timestamp)
+        ))
+
+    def window_reserve(self, key, now, window, limit):
+        def op(db):
+            self._prune(db, key, now - window)
+            count = self._count(db, key)
+            if count >= limit:
+                return None, self._slot_at(db, key, count, window, limit)
+            cursor = db.execute('INSERT INTO publish_ledger (key, published_at) VALUES (?, ?)', (key, now))
+            return cursor.lastrowid, now
+        return self._transaction(op)
+
+    def window_release(self, key, reservation):
+        self._transaction(lambda db: db.execute(
+            'DELETE FROM publish_ledger WHERE key = ? AND id = ?', (key, reservation)
+        ))
+
+    def window_reconcile(self, key, now, window, count):
+        def op(db):
+            self._prune(db, key, now - window)
+            current = self._count(db, key)
+            if current < count:
+                db.executemany(
+                    'INSERT INTO publish_ledger (key, published_at) VALUES (?, ?)',
+                    [(key, now)] * (count - current),
+                )
+            elif current > count:
+                db.execute(
+                    'DELETE FROM publish_ledger WHERE id IN ('
+                    'SELECT id FROM publish_ledger WHERE key = ? ORDER BY published_at LIMIT ?)',
+                    (key, current - max(count, 0)),
+                )
+        self._transaction(op)
+
+
+class RedisStateBackend:
+    """State shared across hosts through Redis.
+
+    Takes an existing redis-py client (``redis.Redis(...)``); every operation
+    is a single Lua script, so it is atomic on the server. Buckets are hashes
+    and publish windows are sorted sets scored by timestamp.
+    """
+    KEY_TTL_SECONDS = 2 * 86400
+
+    _BUCKET_RESERVE = """
+        local tokens = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local rate = tonumber(ARGV[3])
+        local now = tonumber(ARGV[4])
+        local max_wait = tonumber(ARGV[5])
+        local delta = tonumber(ARGV[6])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local available = tonumber(state[1]) or capacity
+        local updated_at = tonumber(state[2]) or now
+        available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+        local wait = 0
+        local granted = 1
+        if tokens > 0 then
+            wait = math.max(0, (tokens - available) / rate)
+            if wait > 0 and max_wait >= 0 and wait > max_wait then
+                granted = 0
+            else
+                available = available - tokens
+            end
+        end
+        available = math.min(capacity, available + delta)
+        redis.call('HSET', KEYS[1], 'tokens', tostring(available), 'updated_at', tostring(now))
+        redis.call('EXPIRE', KEYS[1], ARGV[7])
+        return {granted, tostring(wait), tostring(available)}
+    """
+
+    _WINDOW_RESERVE = """
+        local now = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local limit = tonumber(ARGV[3])
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+        local count = redis.call('ZCARD', KEYS[1])
+        if count >= limit then
+            local entry = redis.call('ZRANGE', KEYS[1], count - limit, count - limit, 'WITHSCORES')
+            return {0, tostring(tonumber(entry[2]) + window)}
+        end
+        if ARGV[4] ~= '' then
+            redis.call('ZADD', KEYS[1], now, ARGV[4])
+            redis.call('EXPIRE', KEYS[1], ARGV[5])
+        end
+        return {1, tostring(now)}
+    """
+
+    _WINDOW_RECONCILE = """
+        local now = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local target = tonumber(ARGV[3])
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+        local count = redis.call('ZCARD', KEYS[1])
+        for i = count + 1, target do
+            redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. i)
+        end
+        if count > target then
+            redis.call('ZREMRANGEBYRANK', KEYS[1], 0, count - math.max(target, 0) - 1)
+        end
+        redis.call('EXPIRE', KEYS[1], ARGV[5])
+        return count
+    """
+
+    def __init__(self, redis_client, prefix='threads_client:'):
+        self.redis = redis_client
+        self.prefix = prefix
+        self._bucket_script = redis_client.register_script(self._BUCKET_RESERVE)
+        self._window_reserve_script = redis_client.register_script(self._WINDOW_RESERVE)
+        self._window_reconcile_script = redis_client.register_script(self._WINDOW_RECONCILE)
+
+    def _bucket(self, key, tokens, capacity, rate, now, max_wait, delta):
+        granted, wait_seconds, available = self._bucket_script(
+            keys=[f'{self.prefix}bucket:{key}'],
+            args=[tokens, capacity, rate, now, -1 if max_wait is None else max_wait, delta, self.KEY_TTL_SECONDS],
+        )
+        return bool(int(granted)), float(wait_seconds), float(available)
+
+    def bucket_reserve(self, key, tokens, capacity, rate, now, max_wait=None):
+        granted, wait_seconds, _ = self._bucket(key, tokens, capacity, rate, now, max_wait, 0)
+        return granted, wait_seconds
+
+    def bucket_adjust(self, key, delta, capacity, rate, now):
+        self._bucket(key, 0, capacity, rate, now, None, delta)
+
+    def bucket_peek(self, key, capacity, rate, now) -> float:
+        return self._bucket(key, 0, capacity, rate, now, None, 0)[2]
+
+    def _window_key(self, key):
+        return f'{self.prefix}window:{key}'
+
+    def window_count(self, key, since) -> int:
+        name = self._window_key(key)
+        self.redis.zremrangebyscore(name, '-inf', since)
+        return self.redis.zcard(name)
+
+    def window_next_slot(self, key, now, window, limit) -> float:
+        granted, slot_at = self._window_reserve_script(
+            keys=[self._window_key(key)], args=[now, window, limit, '', self.KEY_TTL_SECONDS],
+        )
+        return float(slot_at)
+
+    def window_add(self, key, timestamp):
+        name = self._window_key(key)
+        self.redis.zadd(name, {f'{timestamp}:{uuid.uuid4().hex}': timestamp})
+        self.redis.expire(name, self.KEY_TTL_SECONDS)
+
+    def window_reserve(self, key, now, window, limit):
+        member = f'{now}:{uuid.uuid4().hex}'
+        granted, slot_at = self._window_reserve_script(
+            keys=[self._window_key(key)], args=[now, window, limit, member, self.KEY_TTL_SECONDS],
+        )
+        return (member if int(granted) else None), float(slot_at)
+
+    def window_release(self, key, reservation):
+        self.redis.zrem(self._window_key(key), reservation)
+
+    def window_reconcile(self, key, now, window, count):
+        self._window_reconcile_script(
+            keys=[self._window_key(key)],
+            args=[now, window, count, f'{now}:{uuid.uuid4().hex}', self.KEY_TTL_SECONDS],
+        )
+
+
+class PublishQuotaExceeded(ThreadsError):
+    """Raised before any API call when the local publish ledger has no free slot."""
+
+    def __init__(self, message, retry_at=None):
+        super().__init__(message)
+        # Unix timestamp at which the next slot opens
+        self.retry_at = retry_at
+
+
+class PublishLedger:
+    """Local sliding-window record of publish timestamps.
+
+    Answers "can I publish now?" and "when does the next slot open?" without a
+    network call by mirroring the Threads limit of 250 posts per 24h moving
+    window. State lives in a state backend: in process by default (O(1) deque),
+    a SQLite file with `path`, or any shared backend such as
+    SQLiteStateBackend / RedisStateBackend so every worker publishing for the
+    same account (same `key`, e.g. the user id) draws from one window. A
+    ThreadsClient keys a ledger created without `key` by its user id.
+    Call reconcile() with the server's view from /threads_publishing_limit to
+    correct drift (e.g. posts made elsewhere).
+    """
+    DEFAULT_LIMIT = 250
+    DEFAULT_WINDOW_SECONDS = 86400
+
+    def __init__(
+        self,
+        path=None,
+        key=None,
+        limit=DEFAULT_LIMIT,
+        window=DEFAULT_WINDOW_SECONDS,
+        reconcile_interval=900,
+        backend=None,
+    ):
+        """
+        Args:
+            path: SQLite database file for persistence (shorthand for
+                backend=SQLiteStateBackend(path)); None keeps the ledger in memory
+            key: ledger name inside the backend (e.g. the Threads user id);
+                None: the user id of the client using it ('default' on its own)
+            limit: posts allowed per window (updated by reconcile())
+            window: window length in seconds
+            reconcile_interval: seconds after which needs_reconcile() becomes True
+            backend: state backend shared with other processes or hosts
+        """
+        if backend is None:
+            backend = SQLiteStateBackend(path) if path is not None else MemoryStateBackend()
+        self.backend = backend
+        self.key = key or 'default'
+        self._key_unbound = key is None
+        self.limit = limit
+        self.window = window
+        self.reconcile_interval = reconcile_interval
+        self.last_reconciled_at = None
+        self._next_reconcile_at = 0.0
+
+    def bind_key(self, key):
+        """Use `key` (a client's user id) unless a key was given explicitly."""
+        if self._key_unbound:
+            self.key = key
+            self._key_unbound = False
+
+    def usage(self) -> int:
+        """Number of publishes inside the current window."""
+        return self.backend.window_count(self.key, time.time() - self.window)
+
+    def can_publish(self) -> bool:
+        return self.usage() < self.limit
+
+    def next_slot_at(self) -> float:
+        """Unix timestamp at which a publish is allowed (now, if a slot is free)."""
+        return self.backend.window_next_slot(self.key, time.time(), self.window, self.limit)
+
+    def record(self, published_at=None):
+        """Record a successful publish."""
+        self.backend.window_add(self.key, time.time() if published_at is None else published_at)
+
+    def reserve(self):
+        """Atomically claim a slot for a publish that is about to be made.
+
+        Returns a reservation to pass to release() if the publish fails.
+        Raises PublishQuotaExceeded when the window is full.
+        """
+        reservation, slot_at = self.backend.window_reserve(self.key, time.time(), self.window, self.limit)
+        if reservation is None:
+            raise PublishQuotaExceeded(
+                f"Threads publishing quota exhausted ({self.limit}/24h); next slot in {slot_at - time.time():.0f}s",
+                retry_at=slot_at,
+            )
+        return reservation
+
+    def release(self, reservation):
+        """Give back a slot claimed by reserve() whose publish did not happen."""
+        self.backend.window_release(self.key, reservation)
+
+    def needs_reconcile(self) -> bool:
+        return time.time() >= self._next_reconcile_at
+
+    def defer_reconcile(self):
+        """Push the next reconcile back one interval (e.g. after a failed quota check)."""
+        self._next_reconcile_at = time.time() + self.reconcile_interval
+
+    def reconcile(self, quota_usage, quota_total=None):
+        """Align the ledger with the server-reported usage.
+
+        Missing publishes are added with the current time (the conservative
+        choice, since they then hold their slot the longest); surplus local
+        entries are dropped oldest first.
+        """
+        now = time.time()
+        if quota_total is not None:
+            self.limit = quota_total
+        self.backend.window_reconcile(self.key, now, self.window, quota_usage)
+        self.last_reconciled_at = now
+        self._next_reconcile_at = now + self.reconcile_interval
+
+
+class IdempotencyConflict(ThreadsError):
+    """An idempotency key was reused for a different post or container."""
+
+
+class IdempotencyLedger:
+    """Durable record of idempotent publishes: key -> container_id -> media_id.
+
+    Each step is written as soon as the API confirms it, so a retried or
+    replayed call with the same key resumes from the last confirmed step
+    instead of creating another container or publishing twice:
+
+        created     key claimed, no container confirmed yet
+        container   container_id known (reused while younger than container_ttl)
+        publishing  publish was sent but its outcome is unknown; the container
+                    status is checked before publishing again
+        published   done; replays return media_id without any API call
+
+    Records live in a SQLite file shared by every process on the host (or an
+    in-memory database when `path` is None).
+    """
+    CONTAINER_TTL_SECONDS = 86400
+
+    def __init__(self, path=None, container_ttl=CONTAINER_TTL_SECONDS, busy_timeout=5.0):
+        """
+        Args:
+            path: SQLite database file; None keeps the ledger in memory
+            container_ttl: seconds an unpublished container stays usable
+                (Threads expires containers after 24h)
+            busy_timeout: seconds to wait for another process's lock
+        """
+        self.path = path
+        self.container_ttl = container_ttl
+        self._db = sqlite3.connect(
+            path or ':memory:', timeout=busy_timeout, check_same_thread=False, isolation_level=None,
+        )
+        self._lock = threading.Lock()
+        if path is not None:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS idempotency_keys ('
+            'key TEXT PRIMARY KEY, fingerprint TEXT, state TEXT NOT NULL, '
+            'container_id TEXT, container_created_at REAL, media_id TEXT, updated_at REAL NOT NULL)'
+        )
+
+    _COLUMNS = ('key', 'fingerprint', 'state', 'container_id', 'container_created_at', 'media_id', 'updated_at')
+
+    @staticmethod
+    def fingerprint(text, image_url=None) -> str:
+        return hashlib.sha256(json.dumps([text, image_url]).encode('utf-8')).hexdigest()
+
+    def _get(self, key):
+        row = self._db.execute(
+            f'SELECT {", ".join(self._COLUMNS)} FROM idempotency_keys WHERE key = ?', (key,),
+        ).fetchone()
+        return dict(zip(self._COLUMNS, row)) if row else None
+
+    def get(self, key):
+        """The record for `key` (a dict with the columns above), or None."""
+        with self._lock:
+            return self._get(key)
+
+    def begin(self, key, fingerprint=None) -> dict:
+        """Claim `key` (or return its existing record).
+
+        Raises IdempotencyConflict when the key was first used for a post
+        with a different fingerprint.
+        """
+        with self._lock:
+            self._db.execute(
+                'INSERT OR IGNORE INTO idempotency_keys (key, fingerprint, state, updated_at) VALUES (?, ?, ?, ?)',
+                (key, fingerprint, 'created', time.time()),
+            )
+            record = self._get(key)
+        if fingerprint is not None and record['fingerprint'] not in (None, fingerprint):
+            raise IdempotencyConflict(f"Idempotency key {key!r} was already used for a different post")
+        return record
+
+    def usable_container(self, record):
+        """The record's container_id if it can still be published, else None."""
+        if record['container_id'] is None:
+            return None
+        if record['state'] == 'container' and time.time() - record['container_created_at'] >= self.container_ttl:
+            return None
+        return record['container_id']
+
+    def _update(self, key, **values):
+        values['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in values)
+        with self._lock:
+            self._db.execute(
+                f'UPDATE idempotency_keys SET {assignments} WHERE key = ?', (*values.values(), key),
+            )
+
+    def set_container(self, key, container_id):
+        self._update(key, state='container', container_id=container_id, container_created_at=time.time())
+
+    def set_publishing(self, key):
+        self._update(key, state='publishing')
+
+    def set_published(self, key, media_id):
+        """Record a confirmed publish; media_id is None when only the container status confirmed it."""
+        self._update(key, state='published', media_id=media_id)
+
+    def purge(self, older_than) -> int:
+        """Delete records last updated before the Unix timestamp `older_than`; returns the count."""
+        with self._lock:
+            return self._db.execute('DELETE FROM idempotency_keys WHERE updated_at < ?', (older_than,)).rowcount
+
+    def close(self):
+        self._db.close()
+
+
+class PublishOutbox:
+    """Durable queue of posts waiting to be published, drained by OutboxWorkerPool.
+
+    Posts are enqueued with a target time and a priority. A worker leases one
+    post at a time; if it dies, the lease expires and another worker picks
+    the post up again. Each post carries an idempotency key, so the retry
+    resumes it through the IdempotencyLedger instead of publishing it twice:
+
+        pending     waiting for publish_at (or a retry) and a free worker
+        leased      a worker is creating / polling / publishing it
+        published   done; media_id is set (None if only the container status confirmed it)
+        failed      gave up (permanent error or too many attempts); error is set
+
+    Entries live in a SQLite file shared by every process on the host (or an
+    in-memory database when `path` is None).
+    """
+    LEASE_SECONDS = 600
+
+    _COLUMNS = (
+        'id', 'idempotency_key', 'text', 'image_url', 'priority', 'publish_at', 'state', 'attempts',
+        'lease_owner', 'lease_expires_at', 'media_id', 'error', 'created_at', 'updated_at',
+    )
+
+    def __init__(self, path=None, lease_seconds=LEASE_SECONDS, busy_timeout=30.0):
+        """
+        Args:
+            path: SQLite database file (may be shared with IdempotencyLedger);
+                None keeps the queue in memory
+            lease_seconds: how long a worker may hold a post before it is
+                handed to another worker (OutboxWorkerPool keeps each publish
+                inside this)
+            busy_timeout: seconds to wait for another process's lock
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._db = sqlite3.connect(
+            path or ':memory:', timeout=busy_timeout, check_same_thread=False, isolation_level=None,
+        )
+        self._lock = threading.Lock()
+        if path is not None:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, '
+            'text TEXT, image_url TEXT, priority INTEGER NOT NULL, publish_at REAL NOT NULL, '
+            'state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, lease_owner TEXT, '
+            'lease_expires_at REAL, media_id TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, priority, publish_at)')
+
+    def _row(self, where, args):
+        row = self._db.execute(f'SELECT {", ".join(self._COLUMNS)} FROM outbox WHERE {where}', args).fetchone()
+        return dict(zip(self._COLUMNS, row)) if row else None
+
+    def get(self, entry_id):
+        """The entry with `entry_id` (a dict with the columns above), or None."""
+        with self._lock:
+            return self._row('id = ?', (entry_id,))
+
+    def enqueue(self, text, image_url=None, publish_at=None, priority=0, idempotency_key=None) -> dict:
+        """Queue a post for publishing at `publish_at` (Unix time; default now).
+
+        Higher `priority` goes first among posts that are due. Enqueueing an
+        `idempotency_key` that is already queued returns the existing entry.
+        """
+        key = idempotency_key or f'outbox-{uuid.uuid4().hex}'
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, text, image_url, priority, publish_at, state, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, text, image_url, priority, now if publish_at is None else publish_at, 'pending', now, now),
+            )
+            return self._row('idempotency_key = ?', (key,))
+
+    def lease(self, owner) -> dict:
+        """Atomically claim the next due post for `owner`; None if nothing is due.
+
+        Due posts are pending ones whose publish_at has passed and leased ones
+        whose lease expired (their worker is presumed dead).
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                entry = self._row(
+                    "(state = 'pending' AND publish_at <= ?) OR (state = 'leased' AND lease_expires_at <= ?) "
+                    'ORDER BY priority DESC, publish_at, id LIMIT 1',
+                    (now, now),
+                )
+                if entry is not None:
+                    self._db.execute(
+                        "UPDATE outbox SET state = 'leased', lease_owner = ?, lease_expires_at = ?, "
+                        'attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                        (owner, now + self.lease_seconds, now, entry['id']),
+                    )
+                    entry = self._row('id = ?', (entry['id'],))
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+        return entry
+
+    def _finish(self, entry_id, owner, **values) -> bool:
+        """Update a leased entry if `owner` still holds it; False if the lease was lost."""
+        values['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in values)
+        with self._lock:
+            return self._db.execute(
+                f"UPDATE outbox SET {assignments} WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (*values.values(), entry_id, owner),
+            ).rowcount > 0
+
+    def complete(self, entry_id, owner, media_id) -> bool:
+        return self._finish(entry_id, owner, state='published', media_id=media_id, error=None, lease_owner=None)
+
+    def fail(self, entry_id, owner, error) -> bool:
+        return self._finish(entry_id, owner, state='failed', error=str(error), lease_owner=None)
+
+    def release(self, entry_id, owner, publish_at, error=None, count_attempt=True) -> bool:
+        """Hand a leased post back to the queue, due again at `publish_at`.
+
+        With count_attempt=False (e.g. it only waited for quota) the lease
+        does not count towards the attempt limit.
+        """
+        values = {'state': 'pending', 'publish_at': publish_at, 'error': error and str(error), 'lease_owner': None}
+        if not count_attempt:
+            values['attempts'] = self.get(entry_id)['attempts'] - 1
+        return self._finish(entry_id, owner, **values)
+
+    def next_due_at(self):
+        """Unix time at which the next post becomes due (may be in the past), or None if none is queued."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(CASE state WHEN 'pending' THEN publish_at ELSE lease_expires_at END) "
+                "FROM outbox WHERE state IN ('pending', 'leased')"
+            ).fetchone()[0]
+
+    def counts(self) -> dict:
+        """
+        example response:
+            {'pending': 12, 'leased': 2, 'published': 340, 'failed': 1}
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT state, COUNT(*) FROM outbox GROUP BY state').fetchall()
+        return {'pending': 0, 'leased': 0, 'published': 0, 'failed': 0, **dict(rows)}
+
+    def purge(self, older_than) -> int:
+        """Delete published and failed entries last updated before `older_than`; returns the count."""
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM outbox WHERE state IN ('published', 'failed') AND updated_at < ?", (older_than,),
+            ).rowcount
+
+    def close(self):
+        self._db.close()
+
+
+# Guards lazy creation of per-client in-memory idempotency ledgers
+_ledger_lock = threading.Lock()
+
+
+class FileTokenStore:
+    """Token record kept in a JSON file shared by every process on the host.
+
+    Writes go to a temporary file that is renamed over the original, so
+    readers never see a partial record. lock() takes an exclusive flock on a
+    sidecar `<path>.lock` file, so only one process refreshes at a time.
+
+    Record format (for every token store):
+        {'access_token': '...', 'expires_at': 1767225600.0, 'updated_at': 1762041600.0}
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise ImportError("FileTokenStore requires fcntl (POSIX); use SQLiteTokenStore instead")
+        self.path = path
+        self._lock_path = f'{path}.lock'
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, record):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.token-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+    @contextlib.contextmanager
+    def lock(self):
+        with open(self._lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SQLiteTokenStore:
+    """Token record in a SQLite file (WAL), shared by every process on the host.
+
+    lock() claims a lease row (owner + expiry) in its own short transaction,
+    so only one process refreshes at a time but the database is never
+    write-locked across the refresh request; the file may therefore be
+    shared with SQLiteStateBackend. A lease left behind by a crashed process
+    expires after `lease_seconds`.
+    """
+    LEASE_SECONDS = 60.0
+    LEASE_POLL_SECONDS = 0.05
+
+    def __init__(self, path, key='default', busy_timeout=30.0, lease_seconds=LEASE_SECONDS):
+        """
+        Args:
+            path: SQLite database file (may be shared with SQLiteStateBackend)
+            key: record name, e.g. the Threads user id
+            busy_timeout: seconds to wait for another process's refresh
+            lease_seconds: how long a refresh may hold the lease before
+                another process may take it over (keep it above read_timeout)
+        """
+        self.path = path
+        self.key = key
+        self.busy_timeout = busy_timeout
+        self.lease_seconds = lease_seconds
+        self._db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        # Serializes refreshes between threads of this process; the lease row does it between processes
+        self._lease_lock = threading.Lock()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS tokens ('
+            'key TEXT PRIMARY KEY, access_token TEXT NOT NULL, expires_at REAL, updated_at REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS token_leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+
+    def load(self):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT access_token, expires_at, updated_at FROM tokens WHERE key = ?', (self.key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {'access_token': row[0], 'expires_at': row[1], 'updated_at': row[2]}
+
+    def save(self, record):
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO tokens (key, access_token, expires_at, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET access_token = excluded.access_token, '
+                'expires_at = excluded.expires_at, updated_at = excluded.updated_at',
+                (self.key, record['access_token'], record.get('expires_at'), record.get('updated_at', time.time())),
+            )
+
+    def _claim_lease(self, owner) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._db.execute(
+                'INSERT INTO token_leases (key, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                'WHERE token_leases.expires_at <= ?',
+                (self.key, owner, now + self.lease_seconds, now),
+            ).rowcount > 0
+
+    @contextlib.contextmanager
+    def lock(self):
+        with self._lease_lock:
+            owner = f'{os.getpid()}-{uuid.uuid4().hex}'
+            give_up_at = time.monotonic() + self.busy_timeout
+            while not self._claim_lease(owner):
+                if time.monotonic() >= give_up_at:
+                    raise TimeoutError(
+                        f"Timed out after {self.busy_timeout:.0f}s waiting for another process's token refresh"
+                    )
+                time.sleep(self.LEASE_POLL_SECONDS)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._db.execute('DELETE FROM token_leases WHERE key = ? AND owner = ?', (self.key, owner))
+
+    def close(self):
+        self._db.close()
+
+
+class CallbackTokenStore:
+    """Token store backed by your own functions (a secrets manager, Redis, ...).
+
+    `load()` returns the record dict or None and `save(record)` persists it;
+    `lock` is an optional context manager factory for a cross-process lock
+    (defaults to a process-local lock).
+    """
+
+    def __init__(self, load, save, lock=None):
+        self._load = load
+        self._save = save
+        self._lock_factory = lock
+        self._local_lock = threading.Lock()
+
+    def load(self):
+        return self._load()
+
+    def save(self, record):
+        self._save(record)
+
+    def lock(self):
+        if self._lock_factory is not None:
+            return self._lock_factory()
+        return self._local_lock
+
+
+class MemoryResponseCache:
+    """In-process TTL + LRU cache for GET responses (see ThreadsClient(response_cache=...)).
+
+    Holds at most `max_entries` responses, evicting the least recently used
+    first; expired entries are dropped when read. Entries are tagged with
+    their circuit so invalidate() can drop e.g. every 'me_threads' page.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        # key -> (expires_at, tag, body), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached body for `key`, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Callers get their own copy so they cannot mutate the cached body
+        return copy.deepcopy(entry[2])
+
+    def set(self, key, body, ttl, tag=None):
+        body = copy.deepcopy(body)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, tag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tags=None) -> int:
+        """Drop entries tagged with any of `tags` (None: everything); returns the count."""
+        with self._lock:
+            if tags is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            stale = [key for key, entry in self._entries.items() if entry[1] in tags]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteResponseCache:
+    """On-disk TTL + LRU response cache in a SQLite file (WAL).
+
+    Survives restarts and can be shared by every process on the host. Same
+    interface as MemoryResponseCache; bodies are stored as JSON and keys are
+    hashes, so no access token is written to disk.
+    """
+
+    def __init__(self, path, max_entries=10000, busy_timeout=30.0):
+        """
+        Args:
+            path: SQLite database file (may be shared with SQLiteStateBackend)
+            max_entries: entries kept before the least recently used are evicted
+            busy_timeout: seconds to wait for another process's write
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            'key TEXT PRIMARY KEY, tag TEXT, body TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS response_cache_used_at ON response_cache (used_at)')
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, expires_at FROM response_cache WHERE key = ?', (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                return None
+            self._db.execute('UPDATE response_cache SET used_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, body, ttl, tag=None):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO response_cache (key, tag, body, expires_at, used_at) VALUES (?, ?, ?, ?, ?)',
+                (key, tag, json.dumps(body), now + ttl, now),
+            )
+            excess = self._db.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    'DELETE FROM response_cache WHERE key IN '
+                    '(SELECT key FROM response_cache ORDER BY used_at LIMIT ?)', (excess,),
+                )
+
+    def invalidate(self, tags=None) -> int:
+        with self._lock:
+            if tags is None:
+                return self._db.execute('DELETE FROM response_cache').rowcount
+            tags = list(tags)
+            if not tags:
+                return 0
+            return self._db.execute(
+                f'DELETE FROM response_cache WHERE tag IN ({", ".join("?" * len(tags))})', tags,
+            ).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class RateLimitExceeded(ThreadsError):
+    """Raised by RateLimiter when a call would exceed the local API call budget."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        # Seconds until enough budget has refilled
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket for the Threads API call budget.
+
+    Per the docs the budget is 4800 * impressions (min 10) calls per 24h, so
+    the bucket holds that many tokens and refills continuously at
+    capacity / 86400 tokens per second. Capacity comes from `capacity`, or
+    from `impressions` (e.g. the user's insights views, see
+    ThreadsClient.update_rate_limit_from_insights).
+
+    policy='block' sleeps until a token is available (raising if that would
+    take longer than `max_wait`); policy='fail' raises RateLimitExceeded at once.
+    Pass a shared `backend` to share one budget between processes; it is
+    kept per `key`, which a ThreadsClient sets to its user id when none is
+    given, so accounts sharing a backend keep separate budgets.
+    """
+    WINDOW_SECONDS = 86400
+    CALLS_PER_IMPRESSION = 4800
+    MIN_IMPRESSIONS = 10
+
+    def __init__(self, impressions=None, capacity=None, policy='block', max_wait=None, backend=None, key=None):
+        if policy not in ('block', 'fail'):
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        self.policy = policy
+        self.max_wait = max_wait
+        self.capacity = capacity or self.capacity_for(impressions or self.MIN_IMPRESSIONS)
+        self.backend = backend or MemoryStateBackend()
+        self.key = key or 'default'
+        self._key_unbound = key is None
+
+    bind_key = PublishLedger.bind_key
+
+    @classmethod
+    def capacity_for(cls, impressions) -> int:
+        return cls.CALLS_PER_IMPRESSION * max(impressions, cls.MIN_IMPRESSIONS)
+
+    @property
+    def rate(self) -> float:
+        """Refill rate in tokens per second."""
+        return self.capacity / self.WINDOW_SECONDS
+
+    def set_impressions(self, impressions):
+        """Rescale the budget for a new impressions count, keeping calls already spent."""
+        self.set_capacity(self.capacity_for(impressions))
+
+    def set_capacity(self, capacity):
+        delta = capacity - self.capacity
+        self.capacity = capacity
+        self.backend.bucket_adjust(self.key, delta, capacity, self.rate, time.time())
+
+    @property
+    def remaining(self) -> int:
+        """Calls that can be made right now without waiting."""
+        return max(int(self.backend.bucket_peek(self.key, self.capacity, self.rate, time.time())), 0)
+
+    def reserve(self, tokens=1) -> float:
+        """Take `tokens` from the bucket and return how long the caller must wait.
+
+        Raises RateLimitExceeded (without taking anything) under the 'fail'
+        policy, or when the wait would exceed max_wait.
+        """
+        max_wait = 0 if self.policy == 'fail' else self.max_wait
+        granted, wait_seconds = self.backend.bucket_reserve(
+            self.key, tokens, self.capacity, self.rate, time.time(), max_wait,
+        )
+        if not granted:
+            raise RateLimitExceeded(
+                f"Threads API call budget exhausted ({self.capacity}/24h); retry in {wait_seconds:.1f}s",
+                retry_after=wait_seconds,
+            )
+        return wait_seconds
+
+    def acquire(self, tokens=1):
+        """Blocking acquire for the sync client."""
+        wait_seconds = self.reserve(tokens)
+        if wait_seconds:
+            _sleep(wait_seconds, 'Rate limiter wait')
+
+    async def acquire_async(self, tokens=1):
+        """Non-blocking acquire for AsyncThreadsClient."""
+        wait_seconds = self.reserve(tokens)
+        if wait_seconds:
+            await _async_sleep(wait_seconds, 'Rate limiter wait')
+
+
+def _token_store_action(record, token):
+    """What to do with a token store record: 'save' ours over it, 'adopt' its token, or None."""
+    if record is None or (record.get('expires_at') is not None and record['expires_at'] <= time.time()):
+        if record is None or record['access_token'] != token:
+            return 'save'
+        return None
+    if record['access_token'] != token:
+        return 'adopt'
+    return None
+
+
+class _StoreAbort(Exception):
+    """Raised inside a token store lock held for an async block that failed, so the lock sees the failure."""
+
+
+@contextlib.asynccontextmanager
+async def _token_store_session(store):
+    """Hold store.lock() in a worker thread for the duration of an async block.
+
+    Yields `run(fn, *args)`, which runs store calls in that same thread:
+    some locks (threading.RLock, a SQLite transaction) belong to the thread
+    that took them. The event loop never blocks on the lock or the store I/O.
+    """
+    loop = asyncio.get_running_loop()
+    calls = queue.SimpleQueue()
+
+    def hold():
+        with store.lock():
+            while True:
+                call = calls.get()
+                if call is None:
+                    return
+                if call is _StoreAbort:
+                    raise _StoreAbort()
+                fn, args, future = call
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    loop.call_soon_threadsafe(_resolve_future, future, None, e)
+                else:
+                    loop.call_soon_threadsafe(_resolve_future, future, result, None)
+
+    holder = asyncio.ensure_future(asyncio.to_thread(hold))
+
+    async def run(fn, *args):
+        future = loop.create_future()
+        calls.put((fn, args, future))
+        await asyncio.wait({future, holder}, return_when=asyncio.FIRST_COMPLETED)
+        if not future.done():
+            # Taking the lock failed (e.g. SQLite busy timeout)
+            holder.result()
+        return future.result()
+
+    try:
+        yield run
+    except BaseException:
+        calls.put(_StoreAbort)
+        with contextlib.suppress(Exception):
+            await holder
+        raise
+    calls.put(None)
+    await holder
+
+
+def _resolve_future(future, result, error):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _RefreshScheduler:
+    """One daemon thread that wakes clients to refresh their tokens ahead of expiry.
+
+    Clients are held by weak reference, so a client that is dropped without
+    close() is still garbage collected; each due refresh runs in its own
+    short-lived thread so a slow one doesn't delay the others.
+    """
+
+    def __init__(self):
+        # (when, seq, weakref to client); re-armed or closed clients are skipped when due
+        self._heap = []
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, client, when):
+        with self._condition:
+            self._seq += 1
+            heapq.heappush(self._heap, (when, self._seq, weakref.ref(client)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='threads-token-refresh', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._condition.wait(self._heap[0][0] - time.time() if self._heap else None)
+                when, _, client_ref = heapq.heappop(self._heap)
+            client = client_ref()
+            if client is not None and client._refresh_at == when:
+                threading.Thread(target=client._background_refresh, daemon=True).start()
+            del client
+
+
+_refresh_scheduler = _RefreshScheduler()
+
+
+def _wake_for_refresh(client_ref):
+    """call_later target that doesn't keep an AsyncThreadsClient alive."""
+    client = client_ref()
+    if client is not None:
+        client._start_background_refresh()
+
 
 class ThreadsClient:
     # Threads API Rate Limits (per official docs):
@@ -10,350 +2405,2343 @@ class ThreadsClient:
     # - API call rate: 4800 * Number of Impressions (min 10) per 24h
     MAX_RETRIES = 3
     INITIAL_BACKOFF_SECONDS = 5
+    MAX_BACKOFF_SECONDS = 60
+    # Server-requested waits longer than this are raised (with retry_after) instead of slept through
+    MAX_RETRY_WAIT_SECONDS = 300
+    # Refresh the token in the background this long before it expires
+    REFRESH_AHEAD_SECONDS = 86400
+    # Wait before retrying a failed background refresh (capped at half the remaining lifetime)
+    REFRESH_RETRY_SECONDS = 300
+    # How often to pick up a token another worker wrote to the token store
+    TOKEN_STORE_POLL_SECONDS = 30
+    # Above this share of the Graph usage quota (X-App-Usage / X-Business-Use-Case-Usage)
+    # calls are spaced out, up to USAGE_MAX_PAUSE_SECONDS apart at 100%
+    USAGE_THROTTLE_PERCENT = 80
+    USAGE_MAX_PAUSE_SECONDS = 10
+    DEFAULT_BASE_URL_V1 = 'https://graph.threads.net/v1.0'
+    DEFAULT_CONNECT_TIMEOUT = 5.0
+    DEFAULT_READ_TIMEOUT = 30.0
+    # Connection pool defaults for the default RequestsTransport
+    DEFAULT_POOL_CONNECTIONS = 10
+    DEFAULT_POOL_MAXSIZE = 10
+    # Fields requested for thread objects by retrieve_thread / iter_threads / retrieve_threads
+    THREAD_FIELDS = 'id,text,likes_count,replies_count,retweets_count,created_at,permalink'
+    # Posts per /me/threads page when iterating (the API caps it at 100)
+    THREADS_PAGE_SIZE = 25
+    # Most object IDs the Graph API accepts in one ?ids= lookup
+    MAX_IDS_PER_REQUEST = 50
+    # Response cache TTLs in seconds per circuit, for GETs only; circuits not
+    # listed (container status, every POST) are never cached
+    CACHE_TTLS = {
+        'me': 3600,
+        'me_threads': 60,
+        'ids': 300,
+        'threads_insights': 300,
+        'threads_publishing_limit': 10,
+    }
+    # Cached circuits made stale by a publish / a delete
+    INVALIDATE_ON_PUBLISH = ('me_threads', 'threads_publishing_limit')
+    INVALIDATE_ON_DELETE = ('me_threads', 'ids')
+
+    def __init__(
+        self,
+        auth_token,
+        auto_refresh=True,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        pool_block=False,
+        session=None,
+        user_id=None,
+        identity=None,
+        lazy=False,
+        poller=None,
+        publish_ledger=None,
+        rate_limiter=None,
+        transport=None,
+        base_url_v1=None,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        retry_budget=None,
+        circuit_breakers=None,
+        circuit_breaker_factory=CircuitBreaker,
+        idempotency_ledger=None,
+        refresh_ahead=REFRESH_AHEAD_SECONDS,
+        token_store=None,
+        log_payloads=False,
+        log_sample_rate=1.0,
+        metrics=None,
+        response_cache=None,
+        cache_ttls=None,
+        coalesce_gets=True,
+    ):
+        """
+        Args:
+            auth_token: long-lived Threads access token
+            auto_refresh: refresh the token automatically when it has expired
+            user_id: known Threads user id; skips the /me call entirely
+            identity: dict previously returned by export_identity(); restores
+                user id, username and token expiry without any network call
+            lazy: defer the /me lookup until user_id is first needed instead
+                of resolving it during construction
+            poller: ContainerPoller controlling container status polling
+            publish_ledger: PublishLedger used to gate publishing locally; it
+                is reconciled via check_publishing_quota() on its own cadence
+            rate_limiter: RateLimiter every API call in _request passes through
+                (a limiter or ledger created without `key` is keyed by user_id)
+            transport: Transport used for all HTTP traffic (RequestsTransport,
+                HttpxTransport, FakeTransport, ...); defaults to a pooled
+                RequestsTransport built from the pool options / session below
+            base_url_v1: Graph API root, e.g. a local mock server; the token
+                refresh endpoint lives next to it
+            connect_timeout: seconds to establish a connection (None: no limit)
+            read_timeout: seconds to wait for a response (None: no limit)
+            retry_budget: RetryBudget limiting retries to a fraction of traffic;
+                pass a shared one to budget several clients together
+            circuit_breakers: {circuit: CircuitBreaker} for specific endpoints
+                ('me', 'threads', 'threads_publish', 'container_status',
+                'me_threads', 'ids', 'delete', 'threads_insights',
+                'threads_publishing_limit', 'refresh_access_token'); share the
+                dict to share state
+            circuit_breaker_factory: builds breakers for the other endpoints
+                on first use; None disables them
+            idempotency_ledger: IdempotencyLedger backing idempotency_key
+                arguments; pass one with a path to survive restarts (None: an
+                in-memory one is opened on first use)
+            refresh_ahead: with auto_refresh, refresh the token in a background
+                thread this many seconds before token_expires_at (None: only
+                refresh after a 401)
+            token_store: FileTokenStore, SQLiteTokenStore or CallbackTokenStore
+                shared by every worker using this account; refreshed tokens
+                are written to it and picked up from it, so one refresh
+                serves all workers
+            log_payloads: include post text / media URLs in DEBUG request logs
+                (otherwise only their length); tokens are always masked
+            log_sample_rate: share of requests logged at DEBUG level
+            metrics: ClientMetrics (or any object with its record_request
+                method) receiving every HTTP attempt; None records nothing
+            response_cache: MemoryResponseCache or SQLiteResponseCache for GET
+                responses; None (the default) caches nothing
+            cache_ttls: {circuit: seconds} overriding CACHE_TTLS; 0 or None
+                disables caching for that circuit
+            coalesce_gets: let concurrent identical GETs (same URL, params and
+                token) share one in-flight request and its result
+            pool_connections: number of per-host connection pools to cache
+            pool_maxsize: max keep-alive connections kept per host
+            pool_block: block when a host's pool is exhausted instead of
+                opening a throwaway connection
+            session: optional pre-configured requests.Session to share
+                between clients (pool options are ignored in that case)
+        """
+        self.auth_token = auth_token
+        self.base_url_v1 = (base_url_v1 or self.DEFAULT_BASE_URL_V1).rstrip('/')
+        self.auto_refresh = auto_refresh
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._owns_transport = transport is None
+        self.transport = transport or RequestsTransport(pool_connections, pool_maxsize, pool_block, session=session)
+        self.poller = poller or ContainerPoller()
+        self.publish_ledger = publish_ledger
+        self.rate_limiter = rate_limiter
+        self.retry_budget = retry_budget or RetryBudget()
+        # Latest Graph usage headers seen (see _parse_usage_headers)
+        self.api_usage = {}
+        # time.monotonic() before which the next call waits because usage is high
+        self._usage_paused_until = 0.0
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else {}
+        self.circuit_breaker_factory = circuit_breaker_factory
+        # Created on first use of an idempotency_key (see the idempotency_ledger property)
+        self._idempotency_ledger = idempotency_ledger
+
+        identity = identity or {}
+        self._user_id = user_id or identity.get('user_id')
+        self.username = identity.get('username')
+        # Unix timestamp at which auth_token expires (known after a refresh or restore)
+        self.token_expires_at = identity.get('token_expires_at')
+        self._identity_lock = threading.Lock()
+        self.refresh_ahead = refresh_ahead
+        # Serializes refreshes; callers that waited on it reuse the result (single flight)
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = None
+        # When the shared refresh scheduler should wake this client (None: not armed)
+        self._refresh_at = None
+        self._closed = False
+        self.token_store = token_store
+        self._token_checked_at = 0.0
+        self.log_payloads = log_payloads
+        self.log_sample_rate = log_sample_rate
+        self.metrics = metrics
+        self.response_cache = response_cache
+        self.cache_ttls = {**self.CACHE_TTLS, **(cache_ttls or {})}
+        self.coalesce_gets = coalesce_gets
+        # request key -> _Flight for GETs currently on the wire
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        if token_store is not None:
+            self._sync_token_store()
+        self._schedule_refresh()
+        self._bind_state_keys()
+
+        # トークンの有効性を確認し、必要に応じて初期化時にリフレッシュを試みる
+        if self._user_id is None and not lazy:
+            self._resolve_identity()
+
+    @property
+    def idempotency_ledger(self) -> 'IdempotencyLedger':
+        """The IdempotencyLedger for idempotency_key arguments (in memory unless one was passed in).
+
+        Opened on first access, so clients that never use idempotency keys
+        don't each hold a SQLite connection. The in-memory default only
+        guards retries within this process, so opening it logs a warning.
+        """
+        if self._idempotency_ledger is None:
+            with _ledger_lock:
+                if self._idempotency_ledger is None:
+                    logger.warning(
+                        '⚠️  idempotency_key used with an in-memory IdempotencyLedger; keys will not survive '
+                        'a crash or restart. Pass idempotency_ledger=IdempotencyLedger(path) to persist them.'
+                    )
+                    self._idempotency_ledger = IdempotencyLedger()
+        return self._idempotency_ledger
+
+    @idempotency_ledger.setter
+    def idempotency_ledger(self, value):
+        self._idempotency_ledger = value
+
+    @property
+    def user_id(self) -> str:
+        """Threads user id, resolved via /me on first access if not supplied."""
+        if self._user_id is None:
+            self._resolve_identity()
+        return self._user_id
+
+    @user_id.setter
+    def user_id(self, value):
+        self._user_id = value
+        self._bind_state_keys()
+
+    def _resolve_identity(self):
+        with self._identity_lock:
+            if self._user_id is not None:
+                return
+            token = self.auth_token
+            try:
+                profile = self.retrieve_profiles()
+            except ThreadsTokenExpiredError as e:
+                if not self._should_refresh_for_identity(e, token):
+                    raise e._with_message(f"Access token expired. Please refresh manually: {e}") from e
+                # auto_refresh: リフレッシュしてから /me をもう一度呼ぶ
+                try:
+                    self._refresh_token(token)
+                    profile = self.retrieve_profiles()
+                except ThreadsAuthError as refresh_error:
+                    raise refresh_error._with_message(
+                        f"Access token expired and could not be refreshed. Please refresh manually: {refresh_error}"
+                    ) from refresh_error
+            self.username = profile.get('username')
+            self._user_id = profile['id']
+            self._bind_state_keys()
+
+    def _should_refresh_for_identity(self, error, token) -> bool:
+        """Whether an expired-token error from /me is worth a refresh here.
+
+        Not when auto_refresh is off, when the token already changed (the
+        retry with a fresh token failed too), or when the error came from the
+        refresh endpoint itself (_request already tried and failed).
+        """
+        return self.auto_refresh and self.auth_token == token and error.url != self.refresh_url
+
+    def _bind_state_keys(self):
+        """Key a rate limiter / publish ledger created without `key` by this account's user id.
+
+        Otherwise two accounts pointed at one shared backend would draw from
+        one call budget and one publish window.
+        """
+        if self._user_id is None:
+            return
+        for state in (self.rate_limiter, self.publish_ledger):
+            if state is not None:
+                state.bind_key(str(self._user_id))
+
+    def export_identity(self) -> dict:
+        """Return a JSON-serializable snapshot of the resolved identity.
+
+        Pass it back as ``ThreadsClient(token, identity=...)`` on a warm start
+        to skip the /me round trip.
+
+        example:
+            {
+                'user_id': 'XXXXX',
+                'username': 'XXXXX',
+                'token_expires_at': 1767225600.0
+            }
+        """
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'token_expires_at': self.token_expires_at,
+        }
+
+    @property
+    def refresh_url(self) -> str:
+        # refresh_access_token is served from the host root, not the versioned path
+        return f"{self.base_url_v1.rsplit('/', 1)[0]}/refresh_access_token"
+
+    def close(self):
+        """Release pooled connections (only if the transport is owned by this client)."""
+        self._closed = True
+        self._refresh_at = None
+        if self._owns_transport:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def circuit_breaker(self, circuit):
+        """The CircuitBreaker guarding `circuit`, created on first use (None if disabled)."""
+        breaker = self.circuit_breakers.get(circuit)
+        if breaker is None and self.circuit_breaker_factory is not None:
+            breaker = self.circuit_breakers.setdefault(circuit, self.circuit_breaker_factory())
+        return breaker
+
+    def circuit_states(self) -> dict:
+        """
+        example response:
+            {
+                'threads_publish': {'state': 'open', 'calls': 12, 'failures': 9,
+                                    'failure_rate': 0.75, 'retry_after': 21.4},
+                'container_status': {'state': 'closed', ...}
+            }
+        """
+        return {circuit: breaker.snapshot() for circuit, breaker in list(self.circuit_breakers.items())}
+
+    def invalidate_cache(self, *circuits) -> int:
+        """Drop cached responses for `circuits` (none given: all of them); returns the count dropped."""
+        if self.response_cache is None:
+            return 0
+        return self.response_cache.invalidate(circuits or None)
+
+    def _cache_key(self, method, url, params, circuit):
+        """Response cache key for a cacheable GET, else None."""
+        if self.response_cache is None or method != 'GET' or not self.cache_ttls.get(circuit):
+            return None
+        return _request_key(method, url, params, self.auth_token)
+
+    def _retry_delay(self, error, previous) -> float:
+        """Seconds to wait before retrying after `error`; raises it when we should give up.
+
+        Decorrelated jitter (uniform between the base and 3x the previous wait,
+        capped at MAX_BACKOFF_SECONDS) keeps workers that failed together from
+        retrying in lockstep. A Retry-After or regain-access time from the
+        server replaces it (plus a little jitter); waits longer than
+        MAX_RETRY_WAIT_SECONDS, or retries beyond the retry budget, raise.
+        """
+        delay = min(self.MAX_BACKOFF_SECONDS, random.uniform(self.INITIAL_BACKOFF_SECONDS, previous * 3))
+        if error.retry_after is not None:
+            if error.retry_after > self.MAX_RETRY_WAIT_SECONDS:
+                raise error._with_message(
+                    f"Threads API asked to wait {error.retry_after:.0f}s before retrying: {error}"
+                ) from error
+            delay = error.retry_after + random.uniform(0, self.INITIAL_BACKOFF_SECONDS)
+        if not self.retry_budget.withdraw():
+            raise error._with_message(f"Threads API retry budget exhausted: {error}") from error
+        return delay
+
+    def _record_usage(self, headers):
+        """Keep the latest usage headers; above USAGE_THROTTLE_PERCENT, pause before the next call.
+
+        The pause grows linearly from 0 at the threshold to
+        USAGE_MAX_PAUSE_SECONDS at 100%, so a busy app slows down before Meta
+        starts rejecting its calls. Each response restarts it.
+        """
+        usage = _parse_usage_headers(headers)
+        if not usage:
+            return
+        self.api_usage = usage
+        over = usage['max_percent'] - self.USAGE_THROTTLE_PERCENT
+        if over > 0:
+            pause = min(1.0, over / (100 - self.USAGE_THROTTLE_PERCENT)) * self.USAGE_MAX_PAUSE_SECONDS
+            self._usage_paused_until = time.monotonic() + pause
+            logger.warning('⚠️  Threads API usage at %s%% of quota; pausing %.1fs before the next call',
+                           usage['max_percent'], pause)
+
+    def _usage_pause(self) -> float:
+        """Seconds the next call still has to wait because API usage is high (0 when it needn't)."""
+        return max(0.0, self._usage_paused_until - time.monotonic())
+
+    def _request(self, method, url, data=None, params=None, use_form_data=False, circuit='default'):
+        """Make an API call; with coalesce_gets, identical concurrent GETs share one in-flight call.
+
+        Only calls without a deadline lead a shared call, so a waiter never
+        inherits another caller's DeadlineExceeded; a call with a deadline may
+        still join one and waits on it no longer than its own deadline. Only
+        API errors are shared: if the leader is interrupted (KeyboardInterrupt,
+        SystemExit) the flight is cancelled and each waiter sends its own call.
+        """
+        if method != 'GET' or not self.coalesce_gets:
+            return self._send(method, url, data, params, use_form_data, circuit)
+
+        key = (url, frozenset((params or {}).items()), self.auth_token)
+        has_deadline = _current_deadline.get() is not None
+        with self._in_flight_lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None and not has_deadline
+            if leader:
+                flight = self._in_flight[key] = _Flight(Future())
+            elif flight is not None:
+                flight.waiters += 1
+        if flight is None:
+            return self._send(method, url, data, params, use_form_data, circuit)
+        if not leader:
+            try:
+                return copy.deepcopy(_wait_flight(flight.future))
+            except CancelledError:
+                return self._send(method, url, data, params, use_form_data, circuit)
+
+        try:
+            result = self._send(method, url, data, params, use_form_data, circuit)
+        except Exception as e:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            flight.future.set_exception(e)
+            raise
+        except BaseException:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            flight.future.cancel()
+            raise
+        with self._in_flight_lock:
+            del self._in_flight[key]
+        flight.future.set_result(result)
+        # Waiters copy the shared body; the caller gets its own copy too so nobody sees another's edits
+        return copy.deepcopy(result) if flight.waiters else result
+
+    def _send(self, method, url, data=None, params=None, use_form_data=False, circuit='default'):
+        cache_key, cached = self._send_prelude(method, url, data, params, use_form_data, circuit)
+        if cached is not None:
+            return cached
+
+        last_error = None
+        refreshed = False
+        attempt = 0
+        backoff = self.INITIAL_BACKOFF_SECONDS
+        breaker = self.circuit_breaker(circuit)
+        sent = 0
+        if self._token_store_due():
+            self._sync_token_store()
+        while attempt < self.MAX_RETRIES:
+            pause = self._usage_pause()
+            if pause > 0:
+                _sleep(pause, 'Usage throttle')
+            # 障害中のエンドポイントにはリトライも含めて送らない (fail fast)
+            self._check_circuit(breaker, circuit, f"Threads API circuit '{circuit}' is open; not calling {url}", last_error)
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                timeout = _cap_timeout(self.connect_timeout, self.read_timeout)
+            except BaseException:
+                # Out of budget or time before sending: hand back a half-open probe slot
+                if breaker is not None:
+                    breaker.release()
+                raise
+            token = self.auth_token
+            request = self._transport_request(method, url, data, params, use_form_data, token, timeout)
+            sent += 1
+            call = _Call(circuit, method, url, request['params'], data, breaker, sent > 1)
+            try:
+                response = self.transport.request(**request)
+            except Exception as e:
+                last_error = self._connection_error(call, e)
+                attempt += 1
+                if attempt < self.MAX_RETRIES:
+                    wait_seconds = backoff = self._retry_wait(last_error, backoff, attempt)
+                    _sleep(wait_seconds)
+                continue
+            except BaseException:
+                # Cancelled mid-request: hand back a half-open probe slot
+                if breaker is not None:
+                    breaker.release()
+                raise
+
+            self._record_usage(response.headers)
+            error = self._call_completed(call, response)
+            if error is None:
+                return self._store_response(cache_key, response.json(), circuit)
+
+            # トークン期限切れの場合、リフレッシュして一度だけ再試行する
+            # (同時に失敗した呼び出しは一つのリフレッシュを共有する)
+            if self._should_refresh_for_request(error, refreshed):
+                self._refresh_token(token)
+                refreshed = True
+                continue
+            # Permanent, auth and quota errors fail fast without burning backoff time
+            if not error.retryable:
+                raise error
+
+            last_error = error
+            attempt += 1
+            if attempt < self.MAX_RETRIES:
+                wait_seconds = backoff = self._retry_wait(error, backoff, attempt)
+                _sleep(wait_seconds)
+
+        # All retries exhausted
+        raise self._exhausted_error(last_error) from last_error
+
+    def _send_prelude(self, method, url, data, params, use_form_data, circuit):
+        """Log the call and look it up in the response cache; returns (cache_key, cached body or None).
+
+        A call that goes to the wire also deposits into the retry budget and binds
+        the shared limiter/ledger keys. Shared by the sync and async `_send`.
+        """
+        if logger.isEnabledFor(logging.DEBUG) and (
+            self.log_sample_rate >= 1.0 or random.random() < self.log_sample_rate
+        ):
+            logger.debug(
+                'Threads API %s %s form=%s data=%s', method, url, use_form_data, _Redacted(data, self.log_payloads),
+            )
+
+        cache_key = self._cache_key(method, url, params, circuit)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cache_key, cached
+        self.retry_budget.deposit()
+        self._bind_state_keys()
+        return cache_key, None
+
+    def _token_store_due(self) -> bool:
+        return self.token_store is not None and time.monotonic() - self._token_checked_at >= self.TOKEN_STORE_POLL_SECONDS
+
+    def _check_circuit(self, breaker, circuit, message, cause=None):
+        """Raise CircuitOpenError unless `breaker` lets a call through.
+
+        Checked before the rate limiter so a rejected call neither spends nor waits for call budget.
+        """
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(message, circuit=circuit, retry_after=breaker.retry_after()) from cause
+
+    def _transport_request(self, method, url, data, params, use_form_data, token, timeout) -> dict:
+        """Keyword arguments for Transport.request carrying `token`."""
+        request_params = _with_token(params, token)
+        if use_form_data:
+            # Threads API requires form data for certain endpoints (e.g., threads_publish)
+            form_data = {**(data or {}), 'access_token': token}
+            return {'method': method, 'url': url, 'data': form_data, 'params': request_params, 'timeout': timeout}
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {token}',
+        }
+        return {
+            'method': method, 'url': url, 'headers': headers, 'json': data,
+            'params': request_params, 'timeout': timeout,
+        }
+
+    def _call_failed(self, call):
+        """Record a call that got no response in its breaker and the metrics."""
+        if call.breaker is not None:
+            call.breaker.record_failure()
+        if self.metrics is not None:
+            self.metrics.record_request(
+                call.circuit, call.method, 'error', time.perf_counter() - call.started,
+                _request_size(call.url, call.params, call.data, None), 0, call.retry,
+            )
+
+    def _connection_error(self, call, error) -> 'ThreadsConnectionError':
+        """Record a transport failure and return it as a retryable ThreadsConnectionError.
+
+        Raises DeadlineExceeded instead once the current deadline has passed.
+        """
+        self._call_failed(call)
+        deadline = _current_deadline.get()
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(
+                f"Threads API request to {call.url} exceeded its deadline: {_redact_text(error)}"
+            ) from error
+        connection_error = ThreadsConnectionError(f"{type(error).__name__}: {_redact_text(error)}", url=call.url)
+        connection_error.__cause__ = error
+        return connection_error
+
+    def _call_completed(self, call, response, prefix=None):
+        """Record a response in the metrics and its breaker; returns its typed error, or None on success."""
+        if self.metrics is not None:
+            self.metrics.record_request(
+                call.circuit, call.method, response.status_code, time.perf_counter() - call.started,
+                _request_size(call.url, call.params, call.data, None), len(response.content), call.retry,
+            )
+        error = _response_error(response, call.url, prefix) if response.status_code >= 400 else None
+        if call.breaker is not None:
+            if isinstance(error, ThreadsTransientError):
+                call.breaker.record_failure()
+            else:
+                call.breaker.record_success()
+        if error is not None:
+            logger.info('Threads API HTTP %s for %s: %s', response.status_code, call.url, _Redacted(error.body))
+        return error
+
+    def _store_response(self, cache_key, body, circuit):
+        if cache_key is not None:
+            self.response_cache.set(cache_key, body, self.cache_ttls[circuit], circuit)
+        return body
+
+    def _should_refresh_for_request(self, error, refreshed) -> bool:
+        if isinstance(error, ThreadsTokenExpiredError) and self.auto_refresh and not refreshed:
+            logger.info('Access token expired. Attempting to refresh...')
+            return True
+        return False
+
+    def _retry_wait(self, error, backoff, attempt) -> float:
+        """Delay before retry number `attempt` after `error`, logged."""
+        wait_seconds = self._retry_delay(error, backoff)
+        if isinstance(error, ThreadsConnectionError):
+            logger.warning(
+                '⚠️  Threads API connection error: %s. Retrying in %.1fs (attempt %d/%d)',
+                error, wait_seconds, attempt, self.MAX_RETRIES,
+            )
+        else:
+            logger.warning(
+                '⚠️  Threads API %s (%s). Retrying in %.1fs (attempt %d/%d)',
+                type(error).__name__, error.status_code, wait_seconds, attempt, self.MAX_RETRIES,
+            )
+        return wait_seconds
+
+    def _exhausted_error(self, last_error):
+        return last_error._with_message(
+            f"Threads API request failed after {self.MAX_RETRIES} retries: {last_error}"
+        )
+
+    def refresh_access_token(self) -> dict:
+        """
+        Refresh the long-lived access token.
+        Returns the new access token information.
+
+        Concurrent callers share one refresh: a caller that had to wait for
+        another thread's refresh gets that result instead of refreshing again.
+
+        Example response:
+            {
+                'access_token': 'new_token_here',
+                'token_type': 'bearer',
+                'expires_in': 5183944  # seconds (approximately 60 days)
+            }
+        """
+        return self._refresh_token(self.auth_token)
+
+    def _refresh_token(self, stale_token) -> dict:
+        """Refresh unless auth_token has already moved on from `stale_token`."""
+        with self._refresh_lock:
+            if self.auth_token != stale_token and self._last_refresh is not None:
+                return self._last_refresh
+            if self.token_store is None:
+                return self._refresh_access_token()
+            # 他のワーカーが既にリフレッシュしていれば、そのトークンを使う
+            with self.token_store.lock():
+                record = self.token_store.load()
+                if record is not None and record['access_token'] != stale_token:
+                    self._adopt_token(record)
+                    return self._last_refresh
+                result = self._refresh_access_token()
+                self.token_store.save(self._token_record())
+                return result
+
+    def _token_record(self) -> dict:
+        return {'access_token': self.auth_token, 'expires_at': self.token_expires_at, 'updated_at': time.time()}
+
+    def _sync_token_store(self):
+        """Adopt the token in the token store, or seed the store with ours if it has none (or an expired one)."""
+        self._token_checked_at = time.monotonic()
+        record = self.token_store.load()
+        action = _token_store_action(record, self.auth_token)
+        if action == 'save':
+            self.token_store.save(self._token_record())
+        elif action == 'adopt':
+            self._adopt_token(record)
+
+    def _adopt_token(self, record):
+        """Switch to a token another worker refreshed (no refresh call of our own)."""
+        self.auth_token = record['access_token']
+        self.token_expires_at = record.get('expires_at')
+        self._last_refresh = {
+            'access_token': self.auth_token,
+            'token_type': 'bearer',
+            'expires_in': None if self.token_expires_at is None else int(self.token_expires_at - time.time()),
+        }
+        logger.info('🔑 Picked up a refreshed Threads access token from the token store')
+        self._token_changed()
+
+    def _token_changed(self):
+        self._schedule_refresh()
+
+    def _schedule_refresh(self, delay=None):
+        """(Re)arm the background refresh of the token ahead of expiry (replacing any earlier one)."""
+        self._refresh_at = None
+        if not self.auto_refresh or self.refresh_ahead is None or self._closed:
+            return
+        if delay is None:
+            if self.token_expires_at is None:
+                return
+            remaining = self.token_expires_at - time.time()
+            # Short-lived tokens: refresh at half-life rather than immediately and forever
+            delay = max(0.0, remaining - self.refresh_ahead, remaining / 2)
+        self._refresh_at = time.time() + delay
+        _refresh_scheduler.schedule(self, self._refresh_at)
+
+    def _background_refresh(self):
+        try:
+            self._refresh_token(self.auth_token)
+        except Exception as e:
+            logger.warning('⚠️  Background token refresh failed: %s', e)
+            remaining = (self.token_expires_at or 0) - time.time()
+            if remaining > 0:
+                self._schedule_refresh(min(self.REFRESH_RETRY_SECONDS, remaining / 2))
+
+    def _refresh_access_token(self) -> dict:
+        call, timeout = self._begin_refresh()
+        settled = False
+        try:
+            response = self.transport.request('GET', call.url, params=call.params, timeout=timeout)
+            settled = True
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            settled = True
+            self._call_failed(call)
+            raise ThreadsConnectionError(f"Failed to refresh token: {_redact_text(e)}", url=call.url) from e
+        finally:
+            # Deadline or cancellation without an outcome: hand back a half-open probe slot
+            if not settled and call.breaker is not None:
+                call.breaker.release()
+        return self._finish_refresh(call, response)
+
+    def _begin_refresh(self):
+        """Check the refresh circuit and describe the refresh call; returns (call, timeout)."""
+        logger.info('Refreshing Threads access token...')
+        url = self.refresh_url
+
+        params = {
+            'grant_type': 'th_refresh_token',
+            'access_token': self.auth_token
+        }
+
+        timeout = _cap_timeout(self.connect_timeout, self.read_timeout)
+        breaker = self.circuit_breaker('refresh_access_token')
+        self._check_circuit(
+            breaker, 'refresh_access_token', "Failed to refresh token: circuit 'refresh_access_token' is open",
+        )
+        return _Call('refresh_access_token', 'GET', url, params, None, breaker), timeout
+
+    def _finish_refresh(self, call, response) -> dict:
+        """Classify the refresh response and adopt the new token from it."""
+        error = self._call_completed(call, response, prefix=f"Failed to refresh token - HTTPError {response.status_code}")
+        if error is not None:
+            raise error
+        result = response.json()
+
+        # 新しいトークンで更新
+        self.auth_token = result['access_token']
+        if result.get('expires_in') is not None:
+            self.token_expires_at = time.time() + result['expires_in']
+        self._last_refresh = result
+        self._token_changed()
+
+        logger.info('✅ Token refreshed successfully! Expires in %s seconds', result.get('expires_in', 'unknown'))
+        if self.token_store is None:
+            logger.warning(
+                '⚠️  The refreshed token only lives in this process; persist client.auth_token '
+                'or configure a token_store so it survives a restart'
+            )
+
+        return result
+
+    def retrieve_profiles(self) -> dict:
+        """_summary_
+        example response:
+            {
+                'id': 'XXXXX',
+                'username': 'XXXXX',
+                'threads_profile_picture_url': 'XXXXX',
+                'threads_biography': 'XXXXX'
+            }
+        """
+        endpoint = '/me'
+        method = 'GET'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        params = {
+            'fields': 'id,username,threads_profile_picture_url,threads_biography',
+            'access_token': self.auth_token
+        }
+
+        return self._request(
+            method=method,
+            url=url,
+            params=params,
+            circuit='me',
+        )
+
+    def post_thread(
+        self,
+        text,
+        image_url = None,
+        deadline = None,
+        idempotency_key = None,
+    ) -> dict:
+        """_summary_
+        example response:
+            {
+                'id': '1010101010101010101'
+            }
+
+        Raises PublishQuotaExceeded before any API call when a publish_ledger
+        is configured and the 24h window is full.
+
+        `deadline` (seconds or a Deadline) bounds the whole call: create, every
+        status poll, retries and publish. When it expires the remaining steps
+        are abandoned and DeadlineExceeded is raised.
+
+        With an `idempotency_key` (any string unique to this post) every
+        confirmed step is recorded in self.idempotency_ledger, and calling
+        again with the same key resumes from the last confirmed step: an
+        already published post is returned without any API call, and a
+        confirmed container is reused instead of creating another one.
+        'id' is None when the publish was only confirmed through the
+        container status after an ambiguous failure.
+        """
+        with deadline_scope(deadline):
+            if idempotency_key is not None:
+                record = self.idempotency_ledger.begin(
+                    idempotency_key, IdempotencyLedger.fingerprint(text, image_url),
+                )
+                if record['state'] == 'published':
+                    return {'id': record['media_id']}
+            self._check_publish_gate()
+            thread = self.create_thread(text, image_url, idempotency_key)
+            container_id = thread['id']
+
+            # Poll container status until it leaves IN_PROGRESS or the media type's deadline passes
+            schedule = self.poller.start(_media_type(image_url))
+            status = 'IN_PROGRESS'
+            while status in ['IN_PROGRESS']:
+                delay = schedule.next_delay()
+                if delay is None:
+                    break
+                if delay:
+                    _sleep(delay, 'Container status polling')
+                status = self.get_container_status(container_id)
+
+            if status == 'FINISHED':
+                schedule.finished()
+            if status in ['ERROR', 'EXPIRED']:
+                raise ThreadsPermanentError(f"Threads container not publishable: status={status}")
+
+            return self.publish_thread(container_id, idempotency_key)
+
+    def publish_many(self, posts, max_workers=8):
+        """Publish a batch of posts, overlapping create, status polling and publish.
+
+        Containers are created concurrently, all pending containers are polled
+        in the same round, and each one is published as soon as it leaves
+        IN_PROGRESS. Results are yielded in completion order, one per post.
+
+        Args:
+            posts: iterable of text strings or dicts with 'text' and optional
+                'image_url' / 'idempotency_key' (see post_thread)
+            max_workers: max concurrent API calls
+
+        Containers are polled on self.poller's schedule and, as in post_thread,
+        published anyway once the media type's deadline passes.
+
+        Yields:
+            {
+                'index': 0,                 # position in `posts`
+                'container_id': '1010...',  # None if creation failed
+                'result': {'id': '2020...'},  # publish_thread response, None on error
+                'error': None               # the exception raised, if any
+            }
+        """
+        posts = [_normalize_post(post) for post in posts]
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {}
+        # index -> (container_id, next_check_at, schedule)
+        waiting = {}
+        try:
+            for index, post in enumerate(posts):
+                future = _submit(
+                    pool, self.create_thread, post['text'], post.get('image_url'), post.get('idempotency_key'),
+                )
+                futures[future] = ('create', index, None)
+
+            while futures or waiting:
+                now = time.monotonic()
+                for index, (container_id, next_check_at, schedule) in list(waiting.items()):
+                    if next_check_at <= now:
+                        future = _submit(pool, self.get_container_status, container_id)
+                        futures[future] = ('status', index, (container_id, schedule))
+                        del waiting[index]
+
+                timeout = None
+                if waiting:
+                    timeout = max(0, min(item[1] for item in waiting.values()) - now)
+                if not futures:
+                    try:
+                        _sleep(timeout, 'Container status polling')
+                    except DeadlineExceeded as e:
+                        for index, (container_id, _, _) in waiting.items():
+                            yield {'index': index, 'container_id': container_id, 'result': None, 'error': e}
+                        waiting.clear()
+                    continue
+
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, index, context = futures.pop(future)
+                    container_id = context[0] if stage == 'status' else context
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        yield {'index': index, 'container_id': container_id, 'result': None, 'error': e}
+                        continue
+
+                    if stage == 'create':
+                        schedule = self.poller.start(_media_type(posts[index].get('image_url')))
+                        waiting[index] = (value['id'], time.monotonic() + schedule.next_delay(), schedule)
+                    elif stage == 'status':
+                        schedule = context[1]
+                        delay = schedule.next_delay() if value in ['IN_PROGRESS'] else None
+                        if delay is not None:
+                            waiting[index] = (container_id, time.monotonic() + delay, schedule)
+                        elif value in ['ERROR', 'EXPIRED']:
+                            error = ThreadsPermanentError(f"Threads container not publishable: status={value}")
+                            yield {'index': index, 'container_id': container_id, 'result': None, 'error': error}
+                        else:
+                            if value == 'FINISHED':
+                                schedule.finished()
+                            future = _submit(
+                                pool, self.publish_thread, container_id, posts[index].get('idempotency_key'),
+                            )
+                            futures[future] = ('publish', index, container_id)
+                    else:
+                        yield {'index': index, 'container_id': container_id, 'result': value, 'error': None}
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def create_thread(
+        self,
+        text,
+        image_url = None,
+        idempotency_key = None,
+    ) -> dict:
+        """_summary_
+        example response:
+            {
+                'id': '1010101010101010101'
+            }
+
+        With an `idempotency_key`, a live container already confirmed for the
+        key is returned instead of creating another one.
+        """
+        if idempotency_key is not None:
+            record = self.idempotency_ledger.begin(idempotency_key, IdempotencyLedger.fingerprint(text, image_url))
+            container_id = self.idempotency_ledger.usable_container(record)
+            if container_id is not None:
+                return {'id': container_id}
+
+        endpoint = f'/{self.user_id}/threads'
+        method = 'POST'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        data = {
+            'text': text,
+            'media_type': 'TEXT'
+        }
+
+        if image_url is not None:
+            data['image_url'] = image_url
+            data['media_type'] = 'IMAGE'
+
+        thread = self._request(
+            method=method,
+            url=url,
+            data=data,
+            use_form_data=True,
+            circuit='threads',
+        )
+        if idempotency_key is not None:
+            self.idempotency_ledger.set_container(idempotency_key, thread['id'])
+        return thread
+
+    def publish_thread(self, thread_id, idempotency_key=None) -> dict:
+        """_summary_
+        example response:
+            {
+                'id': '1010101010101010101'
+            }
+
+        With an `idempotency_key`, a publish already confirmed for the key is
+        returned as is. If an earlier publish ended ambiguously (or this one
+        fails), the container status is checked and a PUBLISHED container is
+        treated as success ('id' None) instead of publishing it again.
+        """
+        if idempotency_key is not None:
+            resumed = self._resume_publish(thread_id, idempotency_key)
+            if resumed is not None:
+                return resumed
+
+        reservation = self._check_publish_gate(reserve=True)
+        endpoint = f'/{self.user_id}/threads_publish'
+        method = 'POST'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        data = {'creation_id': thread_id}
+
+        if idempotency_key is not None:
+            self.idempotency_ledger.set_publishing(idempotency_key)
+        try:
+            result = self._request(
+                method=method,
+                url=url,
+                data=data,
+                use_form_data=True,
+                circuit='threads_publish',
+            )
+        except Exception:
+            # 失敗しても実は公開済みの場合がある (接続エラー後のリトライなど)
+            if idempotency_key is not None and self._confirm_published(thread_id, idempotency_key):
+                return {'id': None}
+            if reservation is not None:
+                self.publish_ledger.release(reservation)
+            raise
+        self._record_published(idempotency_key, result.get('id'))
+        return result
+
+    def _resume_publish(self, thread_id, idempotency_key):
+        """Return the confirmed result for `idempotency_key`, or None if the publish must (still) be made."""
+        ledger = self.idempotency_ledger
+        record = _idempotent_publish_record(ledger, thread_id, idempotency_key)
+        if record['state'] == 'published':
+            return {'id': record['media_id']}
+        if record['state'] == 'publishing' and self._confirm_published(thread_id, idempotency_key):
+            return {'id': None}
+        return None
+
+    def _confirm_published(self, thread_id, idempotency_key) -> bool:
+        """Check whether the container was published after all; records it if so."""
+        try:
+            status = self.get_container_status(thread_id)
+        except Exception as e:
+            logger.warning('⚠️  Could not confirm publish state of container %s: %s', thread_id, e)
+            return False
+        if status != 'PUBLISHED':
+            return False
+        self._record_published(idempotency_key, None)
+        return True
+
+    def _record_published(self, idempotency_key, media_id):
+        """Bookkeeping for a publish that went through: drop stale reads and settle the idempotency key."""
+        self.invalidate_cache(*self.INVALIDATE_ON_PUBLISH)
+        if idempotency_key is not None:
+            self.idempotency_ledger.set_published(idempotency_key, media_id)
+
+    def _check_publish_gate(self, reserve=False):
+        """Raise PublishQuotaExceeded if the local ledger says the window is full.
+
+        With reserve=True the slot is claimed atomically (shared with other
+        processes using the same ledger backend) and the reservation returned.
+        """
+        ledger = self.publish_ledger
+        if ledger is None:
+            return None
+        self._bind_state_keys()
+        if ledger.needs_reconcile():
+            self.check_publishing_quota()
+            if ledger.needs_reconcile():
+                # Quota check failed open; don't retry it on every publish
+                ledger.defer_reconcile()
+        return _publish_gate(ledger, reserve)
+
+    def get_container_status(self, container_id: str) -> str:
+        """Check publishing status for a container ID."""
+        endpoint = f'/{container_id}'
+        method = 'GET'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        resp = self._request(
+            method=method,
+            url=url,
+            params={'fields': 'status', 'access_token': self.auth_token},
+            circuit='container_status',
+        )
+        return resp.get('status', 'UNKNOWN')
+
+    def delete_thread(self, media_id) -> dict:
+        """Delete a published post (cached timeline pages and lookups are invalidated).
+
+        example response:
+            {
+                'success': True,
+                'deleted_id': '1010101010101010101'
+            }
+        """
+        endpoint = f'/{media_id}'
+        method = 'DELETE'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        result = self._request(
+            method=method,
+            url=url,
+            params={'access_token': self.auth_token},
+            circuit='delete',
+        )
+        self.invalidate_cache(*self.INVALIDATE_ON_DELETE)
+        return result
+
+    def retrieve_thread(
+        self,
+        media_id=None,
+        limit=None,
+        since=None,
+        until=None,
+        after=None,
+    ) -> dict:
+        """Fetch one page of the user's threads (newest first).
+
+        `media_id` is accepted for backwards compatibility and ignored:
+        /me/threads has no id filter. Use iter_threads to walk every page and
+        retrieve_threads to look posts up by ID.
+
+        example response:
+            {
+                'data': [
+                    {
+                        'id': '1010101010101010101',
+                        'text': 'Hello World!',
+                        'likes_count': 0,
+                        'replies_count': 0,
+                        'retweets_count': 0,
+                        'created_at': '2023-05-25T00:00:00Z'
+                    },
+                    {
+                        'id': '2020202020202020202',
+                        'text': 'Hello Threads!',
+                        'likes_count': 0,
+                        'replies_count': 0,
+                        'retweets_count': 0,
+                        'created_at': '2023-05-25T00:00:00Z'
+                    }
+                ],
+                'paging': {'cursors': {'before': 'XXXX', 'after': 'YYYY'}, 'next': 'https://...'}
+            }
+        """
+        endpoint = f'/me/threads'
+        method = 'GET'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        return self._request(
+            method=method,
+            url=url,
+            params=_threads_page_params(self.THREAD_FIELDS, limit, since, until, after, self.auth_token),
+            circuit='me_threads',
+        )
+
+    def iter_threads(self, since=None, until=None, limit=None, page_size=None, prefetch=False):
+        """Yield the user's threads one at a time, following paging cursors.
+
+        Only one page is held in memory at a time (two with prefetch), so this
+        is safe for whole-archive walks. Stop early by breaking out of the loop
+        or with `limit`.
+
+        Args:
+            since, until: unix timestamps bounding created_at
+            limit: stop after this many posts (None = all)
+            page_size: posts per request (default THREADS_PAGE_SIZE, max 100)
+            prefetch: fetch the next page in a background thread while the
+                caller processes the current one
+
+        Yields:
+            thread dicts with THREAD_FIELDS, newest first
+        """
+        if limit is not None and limit <= 0:
+            return
+        page_size = min(page_size or self.THREADS_PAGE_SIZE, 100)
+        pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+        def fetch(after, remaining):
+            size = page_size if remaining is None else min(page_size, remaining)
+            return self.retrieve_thread(limit=size, since=since, until=until, after=after)
+
+        try:
+            remaining = limit
+            page = fetch(None, remaining)
+            while True:
+                posts = page.get('data', [])
+                after = _next_cursor(page)
+                if remaining is not None:
+                    posts = posts[:remaining]
+                    remaining -= len(posts)
+                next_page = None
+                if after is not None and remaining != 0 and pool is not None:
+                    next_page = _submit(pool, fetch, after, remaining)
+                for post in posts:
+                    yield post
+                if after is None or remaining == 0:
+                    return
+                page = next_page.result() if next_page is not None else fetch(after, remaining)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def retrieve_threads(self, media_ids, chunk_size=None, max_workers=4) -> dict:
+        """Fetch many posts by ID with the multi-ID form (GET /?ids=a,b,c).
+
+        IDs are looked up MAX_IDS_PER_REQUEST at a time with the chunks sent
+        concurrently. The Graph API fails a whole lookup if any one ID is
+        unknown, so a chunk rejected that way is split in half until the bad
+        IDs are isolated; the rest still resolve.
+
+        Args:
+            media_ids: iterable of media IDs (duplicates are looked up once)
+            chunk_size: IDs per request (default and max MAX_IDS_PER_REQUEST)
+            max_workers: max concurrent API calls
+
+        Returns:
+            {
+                '1010101010101010101': {'result': {'id': '1010...', 'text': ...}, 'error': None},
+                '2020202020202020202': {'result': None, 'error': ThreadsPermanentError(...)},
+            }
+            in the order of `media_ids`, with THREAD_FIELDS for each post
+        """
+        media_ids = list(dict.fromkeys(str(media_id) for media_id in media_ids))
+        chunk_size = min(chunk_size or self.MAX_IDS_PER_REQUEST, self.MAX_IDS_PER_REQUEST)
+        results = {}
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {}
+        try:
+            for start in range(0, len(media_ids), chunk_size):
+                chunk = media_ids[start:start + chunk_size]
+                futures[_submit(pool, self._retrieve_ids, chunk)] = chunk
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = futures.pop(future)
+                    try:
+                        found = future.result()
+                    except Exception as e:
+                        if _should_split_lookup(e, chunk):
+                            middle = len(chunk) // 2
+                            for half in (chunk[:middle], chunk[middle:]):
+                                futures[_submit(pool, self._retrieve_ids, half)] = half
+                        else:
+                            _record_lookup(results, chunk, error=e)
+                        continue
+                    _record_lookup(results, chunk, found=found)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return {media_id: results[media_id] for media_id in media_ids}
+
+    def _retrieve_ids(self, media_ids) -> dict:
+        endpoint = '/'
+        method = 'GET'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        return self._request(
+            method=method,
+            url=url,
+            params={
+                'ids': ','.join(media_ids),
+                'fields': self.THREAD_FIELDS,
+                'access_token': self.auth_token
+            },
+            circuit='ids',
+        )
+
+    def retrieve_user_insights(self, metric='views', since=None, until=None) -> dict:
+        """Fetch user-level insights.
+
+        example response:
+            {
+                'data': [{
+                    'name': 'views',
+                    'period': 'day',
+                    'values': [{'value': 1234, 'end_time': '2024-07-01T07:00:00+0000'}],
+                    'id': 'XXXXX/insights/views/day'
+                }]
+            }
+        """
+        endpoint = f'/{self.user_id}/threads_insights'
+        method = 'GET'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        params = {'metric': metric, 'access_token': self.auth_token}
+        if since is not None:
+            params['since'] = int(since)
+        if until is not None:
+            params['until'] = int(until)
+
+        return self._request(method=method, url=url, params=params, circuit='threads_insights')
+
+    def update_rate_limit_from_insights(self) -> int:
+        """Size the rate limiter from the last 24h of views and return the impressions used."""
+        now = time.time()
+        resp = self.retrieve_user_insights(metric='views', since=now - RateLimiter.WINDOW_SECONDS, until=now)
+        impressions = _sum_insight_values(resp)
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter(impressions=impressions)
+        else:
+            self.rate_limiter.set_impressions(impressions)
+        return impressions
+
+    def check_publishing_quota(self) -> dict:
+        """Check current Threads API publishing quota usage.
+
+        Per official docs (https://developers.facebook.com/docs/threads/overview#rate-limiting):
+        - Threads profiles are limited to 250 API-published posts within a 24-hour moving period.
+
+        Returns:
+            dict with keys:
+                quota_usage (int): current number of posts in 24h window
+                quota_total (int): max allowed posts (250)
+                quota_remaining (int): posts remaining
+                can_publish (bool): whether a new post can be published
+
+        Example API response:
+            {
+              "data": [{
+                "quota_usage": 4,
+                "config": {"quota_total": 250, "quota_duration": 86400}
+              }]
+            }
+        """
+        endpoint = f'/{self.user_id}/threads_publishing_limit'
+        method = 'GET'
+        url = f'{self.base_url_v1}{endpoint}'
+
+        try:
+            resp = self._request(
+                method=method,
+                url=url,
+                params={
+                    'fields': 'quota_usage,config',
+                    'access_token': self.auth_token
+                },
+                circuit='threads_publishing_limit',
+            )
+
+            return self._publishing_quota(resp)
+        except Exception as e:
+            # クォータチェックが失敗しても投稿自体はブロックしない（フェイルオープン）
+            return _unknown_publishing_quota(e)
+
+    def _publishing_quota(self, resp) -> dict:
+        """check_publishing_quota's result for a threads_publishing_limit response; reconciles the ledger with it."""
+        data = resp.get('data', [{}])[0]
+        quota_usage = data.get('quota_usage', 0)
+        config = data.get('config', {})
+        quota_total = config.get('quota_total', 250)
+
+        result = {
+            'quota_usage': quota_usage,
+            'quota_total': quota_total,
+            'quota_remaining': quota_total - quota_usage,
+            'can_publish': quota_usage < quota_total,
+        }
+        if self.publish_ledger is not None:
+            self.publish_ledger.reconcile(quota_usage, quota_total)
+        logger.info(
+            '📊 Threads publishing quota: %s/%s used, %s remaining',
+            quota_usage, quota_total, result['quota_remaining'],
+        )
+        return result
+
+
+def _unknown_publishing_quota(error) -> dict:
+    logger.warning('⚠️  Failed to check Threads publishing quota: %s', error)
+    return {
+        'quota_usage': -1,
+        'quota_total': 250,
+        'quota_remaining': -1,
+        'can_publish': True,  # チェック失敗時は投稿を許可（API側で制限される）
+    }
+
+def _publish_gate(ledger, reserve):
+    if reserve:
+        return ledger.reserve()
+    if not ledger.can_publish():
+        retry_at = ledger.next_slot_at()
+        raise PublishQuotaExceeded(
+            f"Threads publishing quota exhausted ({ledger.limit}/24h); next slot in {retry_at - time.time():.0f}s",
+            retry_at=retry_at,
+        )
+    return None
+
+
+def _sum_insight_values(resp) -> int:
+    total = 0
+    for metric in resp.get('data', []):
+        if 'total_value' in metric:
+            total += metric['total_value'].get('value', 0)
+        for value in metric.get('values', []):
+            total += value.get('value', 0)
+    return total
+
+
+def _request_key(method, url, params, token) -> str:
+    """Stable digest of a request, per token (the token itself is not recoverable from it)."""
+    params = {name: value for name, value in (params or {}).items() if name != 'access_token'}
+    return hashlib.sha256(json.dumps([method, url, params, token], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _with_token(params, token):
+    """Use the current token in query params (it may have been refreshed since the call began)."""
+    if params and 'access_token' in params and params['access_token'] != token:
+        return {**params, 'access_token': token}
+    return params
+
+
+def _should_split_lookup(error, chunk) -> bool:
+    """Whether a failed ?ids= lookup may be down to individual bad IDs."""
+    return len(chunk) > 1 and isinstance(error, ThreadsPermanentError) and error.code == INVALID_PARAMETER_CODE
+
+
+def _record_lookup(results, chunk, found=None, error=None):
+    for media_id in chunk:
+        if error is None and media_id not in found:
+            results[media_id] = {'result': None, 'error': ThreadsPermanentError(f"No object returned for ID {media_id}")}
+        elif error is None:
+            results[media_id] = {'result': found[media_id], 'error': None}
+        else:
+            results[media_id] = {'result': None, 'error': error}
+
+
+def _threads_page_params(fields, limit, since, until, after, token) -> dict:
+    params = {'fields': fields, 'access_token': token}
+    if limit is not None:
+        params['limit'] = int(limit)
+    if since is not None:
+        params['since'] = int(since)
+    if until is not None:
+        params['until'] = int(until)
+    if after is not None:
+        params['after'] = after
+    return params
+
+
+def _next_cursor(page):
+    """The `after` cursor of a Graph API page, or None on the last page."""
+    if not page.get('data') or 'next' not in page.get('paging', {}):
+        return None
+    return page['paging'].get('cursors', {}).get('after')
+
+
+def _submit(pool, fn, *args):
+    """Submit to a thread pool carrying over context variables (e.g. the current deadline)."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _media_type(image_url) -> str:
+    return 'TEXT' if image_url is None else 'IMAGE'
+
+
+def _idempotent_publish_record(ledger, thread_id, idempotency_key) -> dict:
+    """Ledger record for publishing `thread_id` under `idempotency_key`, claiming the key if new."""
+    record = ledger.begin(idempotency_key)
+    if record['container_id'] is None:
+        ledger.set_container(idempotency_key, thread_id)
+        return ledger.get(idempotency_key)
+    if record['container_id'] != thread_id:
+        raise IdempotencyConflict(
+            f"Idempotency key {idempotency_key!r} belongs to container {record['container_id']}, not {thread_id}"
+        )
+    return record
+
 
-    def __init__(self, auth_token, auto_refresh=True):
+def _normalize_post(post) -> dict:
+    """Accept a bare text string or a {'text', 'image_url'} dict for bulk publishing."""
+    if isinstance(post, str):
+        return {'text': post}
+    return post
+
+
+class AsyncThreadsClient:
+    """asyncio counterpart of ThreadsClient built on httpx.AsyncClient.
+
+    Construction does no I/O; the user id is resolved on first use (or can be
+    passed in). Use ``await AsyncThreadsClient.create(token)`` to resolve it
+    eagerly, and ``async with`` / ``await client.aclose()`` to release the pool.
+    """
+    MAX_RETRIES = ThreadsClient.MAX_RETRIES
+    INITIAL_BACKOFF_SECONDS = ThreadsClient.INITIAL_BACKOFF_SECONDS
+    MAX_BACKOFF_SECONDS = ThreadsClient.MAX_BACKOFF_SECONDS
+    MAX_RETRY_WAIT_SECONDS = ThreadsClient.MAX_RETRY_WAIT_SECONDS
+    REFRESH_AHEAD_SECONDS = ThreadsClient.REFRESH_AHEAD_SECONDS
+    REFRESH_RETRY_SECONDS = ThreadsClient.REFRESH_RETRY_SECONDS
+    TOKEN_STORE_POLL_SECONDS = ThreadsClient.TOKEN_STORE_POLL_SECONDS
+    USAGE_THROTTLE_PERCENT = ThreadsClient.USAGE_THROTTLE_PERCENT
+    USAGE_MAX_PAUSE_SECONDS = ThreadsClient.USAGE_MAX_PAUSE_SECONDS
+    CACHE_TTLS = ThreadsClient.CACHE_TTLS
+    INVALIDATE_ON_PUBLISH = ThreadsClient.INVALIDATE_ON_PUBLISH
+    INVALIDATE_ON_DELETE = ThreadsClient.INVALIDATE_ON_DELETE
+    DEFAULT_MAX_CONNECTIONS = 100
+    DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+
+    def __init__(
+        self,
+        auth_token,
+        auto_refresh=True,
+        user_id=None,
+        identity=None,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        http_client=None,
+        poller=None,
+        publish_ledger=None,
+        rate_limiter=None,
+        transport=None,
+        base_url_v1=None,
+        connect_timeout=ThreadsClient.DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=ThreadsClient.DEFAULT_READ_TIMEOUT,
+        retry_budget=None,
+        circuit_breakers=None,
+        circuit_breaker_factory=CircuitBreaker,
+        idempotency_ledger=None,
+        refresh_ahead=ThreadsClient.REFRESH_AHEAD_SECONDS,
+        token_store=None,
+        log_payloads=False,
+        log_sample_rate=1.0,
+        metrics=None,
+        response_cache=None,
+        cache_ttls=None,
+        coalesce_gets=True,
+    ):
+        """
+        Args mirror ThreadsClient; `transport` must be an async transport
+        (AsyncHttpxTransport, AsyncFakeTransport). `http_client` wraps an
+        existing httpx.AsyncClient instead.
+        """
+        if transport is None and httpx is None and http_client is None:
+            raise ImportError("AsyncThreadsClient requires httpx (pip install httpx)")
         self.auth_token = auth_token
-        self.base_url_v1 = 'https://graph.threads.net/v1.0'
+        self.base_url_v1 = (base_url_v1 or ThreadsClient.DEFAULT_BASE_URL_V1).rstrip('/')
         self.auto_refresh = auto_refresh
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.poller = poller or ContainerPoller()
+        self.publish_ledger = publish_ledger
+        self.rate_limiter = rate_limiter
+        self.retry_budget = retry_budget or RetryBudget()
+        self.api_usage = {}
+        # time.monotonic() before which the next call waits because usage is high
+        self._usage_paused_until = 0.0
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else {}
+        self.circuit_breaker_factory = circuit_breaker_factory
+        # Created on first use of an idempotency_key (see the idempotency_ledger property)
+        self._idempotency_ledger = idempotency_ledger
+        identity = identity or {}
+        self._user_id = user_id or identity.get('user_id')
+        self.username = identity.get('username')
+        self.token_expires_at = identity.get('token_expires_at')
+        self._user_id_lock = asyncio.Lock()
+        self.refresh_ahead = refresh_ahead
+        self._last_refresh = None
+        # Shared in-flight refresh (single flight) and the loop timer for the proactive one
+        self._refresh_task = None
+        self._refresh_handle = None
+        self.token_store = token_store
+        self._token_checked_at = 0.0
+        self.log_payloads = log_payloads
+        self.log_sample_rate = log_sample_rate
+        self.metrics = metrics
+        self.response_cache = response_cache
+        self.cache_ttls = {**self.CACHE_TTLS, **(cache_ttls or {})}
+        self.coalesce_gets = coalesce_gets
+        self._in_flight = {}
+        self._bind_state_keys()
+        # The token store is first read (off the event loop) by the first request
+        self._owns_transport = transport is None
+        self.transport = transport or AsyncHttpxTransport(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            client=http_client,
+        )
 
-        # トークンの有効性を確認し、必要に応じて初期化時にリフレッシュを試みる
+    @classmethod
+    async def create(cls, auth_token, **kwargs) -> 'AsyncThreadsClient':
+        """Build a client and resolve its user id up front (mirrors ThreadsClient.__init__)."""
+        client = cls(auth_token, **kwargs)
+        await client.get_user_id()
+        return client
+
+    refresh_url = ThreadsClient.refresh_url
+    _should_refresh_for_identity = ThreadsClient._should_refresh_for_identity
+    _bind_state_keys = ThreadsClient._bind_state_keys
+
+    async def aclose(self):
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self._owns_transport:
+            await self.transport.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    @property
+    def user_id(self):
+        """The resolved user id, or None until get_user_id() has run."""
+        return self._user_id
+
+    async def get_user_id(self) -> str:
+        """Return the Threads user id, calling /me once if it is not known yet."""
+        if self._user_id is not None:
+            return self._user_id
+        async with self._user_id_lock:
+            if self._user_id is not None:
+                return self._user_id
+            token = self.auth_token
+            try:
+                profile = await self.retrieve_profiles()
+            except ThreadsTokenExpiredError as e:
+                if not self._should_refresh_for_identity(e, token):
+                    raise e._with_message(f"Access token expired. Please refresh manually: {e}") from e
+                # auto_refresh: リフレッシュしてから /me をもう一度呼ぶ
+                try:
+                    await self._refresh_token(token)
+                    profile = await self.retrieve_profiles()
+                except ThreadsAuthError as refresh_error:
+                    raise refresh_error._with_message(
+                        f"Access token expired and could not be refreshed. Please refresh manually: {refresh_error}"
+                    ) from refresh_error
+            self.username = profile.get('username')
+            self._user_id = profile['id']
+            self._bind_state_keys()
+            return self._user_id
+
+    async def export_identity(self) -> dict:
+        """See ThreadsClient.export_identity."""
+        return {
+            'user_id': await self.get_user_id(),
+            'username': self.username,
+            'token_expires_at': self.token_expires_at,
+        }
+
+    idempotency_ledger = ThreadsClient.idempotency_ledger
+    circuit_breaker = ThreadsClient.circuit_breaker
+    circuit_states = ThreadsClient.circuit_states
+    invalidate_cache = ThreadsClient.invalidate_cache
+    _cache_key = ThreadsClient._cache_key
+    _retry_delay = ThreadsClient._retry_delay
+    _send_prelude = ThreadsClient._send_prelude
+    _token_store_due = ThreadsClient._token_store_due
+    _check_circuit = ThreadsClient._check_circuit
+    _transport_request = ThreadsClient._transport_request
+    _call_failed = ThreadsClient._call_failed
+    _connection_error = ThreadsClient._connection_error
+    _call_completed = ThreadsClient._call_completed
+    _store_response = ThreadsClient._store_response
+    _should_refresh_for_request = ThreadsClient._should_refresh_for_request
+    _retry_wait = ThreadsClient._retry_wait
+    _exhausted_error = ThreadsClient._exhausted_error
+    _begin_refresh = ThreadsClient._begin_refresh
+    _finish_refresh = ThreadsClient._finish_refresh
+    _publishing_quota = ThreadsClient._publishing_quota
+    _record_published = ThreadsClient._record_published
+    _record_usage = ThreadsClient._record_usage
+    _usage_pause = ThreadsClient._usage_pause
+
+    async def _request(self, method, url, data=None, params=None, use_form_data=False, circuit='default'):
+        """See ThreadsClient._request.
+
+        The shared call runs as its own task, so one caller being cancelled
+        does not cancel it for the others; if the shared task itself is
+        cancelled, each waiter that wasn't sends its own call.
+        """
+        if method != 'GET' or not self.coalesce_gets:
+            return await self._send(method, url, data, params, use_form_data, circuit)
+
+        key = (url, frozenset((params or {}).items()), self.auth_token)
+        flight = self._in_flight.get(key)
+        if flight is None and _current_deadline.get() is not None:
+            # Don't lead a shared call (see ThreadsClient._request)
+            return await self._send(method, url, data, params, use_form_data, circuit)
+        if flight is None:
+            task = asyncio.ensure_future(self._send(method, url, data, params, use_form_data, circuit))
+            flight = self._in_flight[key] = _Flight(task)
+            task.add_done_callback(functools.partial(self._flight_done, key))
+        else:
+            flight.waiters += 1
         try:
-            self.user_id = self.retrieve_profiles()['id']
-        except Exception as e:
-            error_str = str(e)
-            # トークン期限切れエラーの場合、リフレッシュを試みる
-            if '401' in error_str and ('expired' in error_str.lower() or 'OAuthException' in error_str):
-                if self.auto_refresh:
-                    print("Access token expired. Attempting to refresh...")
-                    self.refresh_access_token()
-                    self.user_id = self.retrieve_profiles()['id']
-                else:
-                    raise Exception(f"Access token expired. Please refresh manually: {e}")
-            else:
+            result = await _wait_flight_async(flight.future)
+        except asyncio.CancelledError:
+            if not flight.future.cancelled() or asyncio.current_task().cancelling():
                 raise
+            return await self._send(method, url, data, params, use_form_data, circuit)
+        return copy.deepcopy(result) if flight.waiters else result
+
+    def _flight_done(self, key, task):
+        self._in_flight.pop(key, None)
+        # Every caller may have been cancelled; don't warn about an exception nobody is left to see
+        if not task.cancelled():
+            task.exception()
 
-    def _request(self, method, url, data=None, params=None, use_form_data=False):
-        print(f'url: {url}')
-        print(f'data: {data}')
-        print(f'use_form_data: {use_form_data}')
+    async def _send(self, method, url, data=None, params=None, use_form_data=False, circuit='default'):
+        cache_key, cached = self._send_prelude(method, url, data, params, use_form_data, circuit)
+        if cached is not None:
+            return cached
 
-        last_exception = None
-        for attempt in range(self.MAX_RETRIES):
+        last_error = None
+        refreshed = False
+        attempt = 0
+        backoff = self.INITIAL_BACKOFF_SECONDS
+        breaker = self.circuit_breaker(circuit)
+        sent = 0
+        if self._token_store_due():
+            await self._sync_token_store()
+        self._ensure_refresh_scheduled()
+        while attempt < self.MAX_RETRIES:
+            pause = self._usage_pause()
+            if pause > 0:
+                await _async_sleep(pause, 'Usage throttle')
+            # 障害中のエンドポイントにはリトライも含めて送らない (fail fast)
+            self._check_circuit(breaker, circuit, f"Threads API circuit '{circuit}' is open; not calling {url}", last_error)
             try:
-                if use_form_data:
-                    # Threads API requires form data for certain endpoints (e.g., threads_publish)
-                    form_data = {**(data or {}), 'access_token': self.auth_token}
-                    response = requests.request(
-                        method=method,
-                        url=url,
-                        data=form_data,
-                        params=params
-                    )
-                else:
-                    headers = {
-                        'Content-Type': 'application/json',
-                        'Authorization': f'Bearer {self.auth_token}',
-                    }
-                    response = requests.request(
-                        method=method,
-                        url=url,
-                        headers=headers,
-                        json=data,
-                        params=params
-                    )
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire_async()
+                timeout = _cap_timeout(self.connect_timeout, self.read_timeout)
+            except BaseException:
+                # Out of budget or time before sending: hand back a half-open probe slot
+                if breaker is not None:
+                    breaker.release()
+                raise
+            token = self.auth_token
+            request = self._transport_request(method, url, data, params, use_form_data, token, timeout)
+            sent += 1
+            call = _Call(circuit, method, url, request['params'], data, breaker, sent > 1)
+            try:
+                response = await self.transport.request(**request)
             except Exception as e:
-                last_exception = e
-                wait_seconds = self.INITIAL_BACKOFF_SECONDS * (2 ** attempt)
-                print(f"⚠️  Threads API connection error: {e}. Retrying in {wait_seconds}s (attempt {attempt + 1}/{self.MAX_RETRIES})")
-                time.sleep(wait_seconds)
-                continue
-
-            # Transient server errors (5xx) — retry with exponential backoff
-            if response.status_code >= 500:
-                wait_seconds = self.INITIAL_BACKOFF_SECONDS * (2 ** attempt)
-                print(f"⚠️  Threads API server error ({response.status_code}). Retrying in {wait_seconds}s (attempt {attempt + 1}/{self.MAX_RETRIES})")
-                time.sleep(wait_seconds)
+                last_error = self._connection_error(call, e)
+                attempt += 1
+                if attempt < self.MAX_RETRIES:
+                    wait_seconds = backoff = self._retry_wait(last_error, backoff, attempt)
+                    await _async_sleep(wait_seconds)
                 continue
+            except BaseException:
+                # Cancelled mid-request: hand back a half-open probe slot
+                if breaker is not None:
+                    breaker.release()
+                raise
 
-            if response.status_code != 200:
-                try:
-                    err_json = response.json()
-                except Exception:
-                    err_json = {'error': {'message': response.text}}
-                pprint.pprint(err_json)
+            self._record_usage(response.headers)
+            error = self._call_completed(call, response)
+            if error is None:
+                return self._store_response(cache_key, response.json(), circuit)
 
-            try:
-                response.raise_for_status()
-            except requests.HTTPError as he:
-                # Include response body for better diagnostics
-                try:
-                    body = response.json()
-                except Exception:
-                    body = response.text
-                raise Exception(f"HTTPError {response.status_code} for {url}: {body}")
+            # トークン期限切れの場合、リフレッシュして一度だけ再試行する
+            # (同時に失敗した呼び出しは一つのリフレッシュを共有する)
+            if self._should_refresh_for_request(error, refreshed):
+                await self._refresh_token(token)
+                refreshed = True
+                continue
+            # Permanent, auth and quota errors fail fast without burning backoff time
+            if not error.retryable:
+                raise error
 
-            return response.json()
+            last_error = error
+            attempt += 1
+            if attempt < self.MAX_RETRIES:
+                wait_seconds = backoff = self._retry_wait(error, backoff, attempt)
+                await _async_sleep(wait_seconds)
 
         # All retries exhausted
-        if last_exception:
-            raise Exception(f"Threads API request failed after {self.MAX_RETRIES} retries: {last_exception}")
-        raise Exception(f"Threads API request failed after {self.MAX_RETRIES} retries: HTTP {response.status_code}")
+        raise self._exhausted_error(last_error) from last_error
 
-        return response.json()
+    async def refresh_access_token(self) -> dict:
+        """Refresh the long-lived access token. See ThreadsClient.refresh_access_token.
 
-    def refresh_access_token(self) -> dict:
+        Concurrent callers await one shared refresh task.
         """
-        Refresh the long-lived access token.
-        Returns the new access token information.
+        return await self._refresh_token(self.auth_token)
 
-        Example response:
-            {
-                'access_token': 'new_token_here',
-                'token_type': 'bearer',
-                'expires_in': 5183944  # seconds (approximately 60 days)
-            }
-        """
-        print("Refreshing Threads access token...")
-        url = 'https://graph.threads.net/refresh_access_token'
+    async def _refresh_token(self, stale_token) -> dict:
+        """Refresh unless auth_token has already moved on from `stale_token`."""
+        if self.auth_token != stale_token and self._last_refresh is not None:
+            return self._last_refresh
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_with_store(stale_token))
+        # shield: one caller being cancelled must not cancel the refresh the others wait for
+        return await asyncio.shield(self._refresh_task)
 
-        params = {
-            'grant_type': 'th_refresh_token',
-            'access_token': self.auth_token
-        }
+    async def _refresh_with_store(self, stale_token) -> dict:
+        """See ThreadsClient._refresh_token (the token store part)."""
+        if self.token_store is None:
+            return await self._refresh_access_token()
+        # The lock may be held by another process for a while; wait for it off the event loop
+        async with _token_store_session(self.token_store) as run:
+            record = await run(self.token_store.load)
+            if record is not None and record['access_token'] != stale_token:
+                self._adopt_token(record)
+                return self._last_refresh
+            result = await self._refresh_access_token()
+            await run(self.token_store.save, self._token_record())
+            return result
 
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            result = response.json()
+    async def _sync_token_store(self):
+        """See ThreadsClient._sync_token_store; store I/O runs in a worker thread."""
+        self._token_checked_at = time.monotonic()
+        record = await asyncio.to_thread(self.token_store.load)
+        action = _token_store_action(record, self.auth_token)
+        if action == 'save':
+            await asyncio.to_thread(self.token_store.save, self._token_record())
+        elif action == 'adopt':
+            self._adopt_token(record)
 
-            # 新しいトークンで更新
-            self.auth_token = result['access_token']
+    _token_record = ThreadsClient._token_record
+    _adopt_token = ThreadsClient._adopt_token
 
-            print(f"✅ Token refreshed successfully! Expires in {result.get('expires_in', 'unknown')} seconds")
-            print(f"⚠️  IMPORTANT: Please update your secrets with the new token:")
-            print(f"   New Token: {self.auth_token}")
+    def _token_changed(self):
+        # Re-armed for the new expiry by the next _request
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
 
-            return result
-        except requests.HTTPError as he:
-            try:
-                body = response.json()
-            except Exception:
-                body = response.text
-            raise Exception(f"Failed to refresh token - HTTPError {response.status_code}: {body}")
+    def _ensure_refresh_scheduled(self):
+        """Arm a loop timer that refreshes the token `refresh_ahead` seconds before expiry."""
+        if (
+            self._refresh_handle is not None
+            or not self.auto_refresh
+            or self.refresh_ahead is None
+            or self.token_expires_at is None
+        ):
+            return
+        remaining = self.token_expires_at - time.time()
+        delay = max(0.0, remaining - self.refresh_ahead, remaining / 2)
+        self._refresh_handle = asyncio.get_running_loop().call_later(delay, _wake_for_refresh, weakref.ref(self))
+
+    def _start_background_refresh(self):
+        asyncio.ensure_future(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self._refresh_token(self.auth_token)
         except Exception as e:
-            raise Exception(f"Failed to refresh token: {e}")
+            logger.warning('⚠️  Background token refresh failed: %s', e)
+            remaining = (self.token_expires_at or 0) - time.time()
+            if remaining > 0:
+                self._refresh_handle = asyncio.get_running_loop().call_later(
+                    min(self.REFRESH_RETRY_SECONDS, remaining / 2), _wake_for_refresh, weakref.ref(self),
+                )
 
-    def retrieve_profiles(self) -> dict:
-        """_summary_
-        example response:
-            {
-                'id': 'XXXXX',
-                'username': 'XXXXX',
-                'threads_profile_picture_url': 'XXXXX',
-                'threads_biography': 'XXXXX'
-            }
-        """
-        endpoint = '/me'
-        method = 'GET'
-        url = f'{self.base_url_v1}{endpoint}'
+    async def _refresh_access_token(self) -> dict:
+        call, timeout = self._begin_refresh()
+        settled = False
+        try:
+            response = await self.transport.request('GET', call.url, params=call.params, timeout=timeout)
+            settled = True
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            settled = True
+            self._call_failed(call)
+            raise ThreadsConnectionError(f"Failed to refresh token: {_redact_text(e)}", url=call.url) from e
+        finally:
+            # Deadline or cancellation without an outcome: hand back a half-open probe slot
+            if not settled and call.breaker is not None:
+                call.breaker.release()
+        return self._finish_refresh(call, response)
 
+    async def retrieve_profiles(self) -> dict:
+        """See ThreadsClient.retrieve_profiles."""
+        url = f'{self.base_url_v1}/me'
         params = {
             'fields': 'id,username,threads_profile_picture_url,threads_biography',
             'access_token': self.auth_token
         }
+        return await self._request(method='GET', url=url, params=params, circuit='me')
 
-        return self._request(
-            method=method,
-            url=url,
-            params=params,
-        )
+    async def post_thread(self, text, image_url=None, deadline=None, idempotency_key=None) -> dict:
+        """See ThreadsClient.post_thread. Polling sleeps with asyncio.sleep.
 
-    def post_thread(
-        self,
-        text,
-        image_url = None,
-    ) -> dict:
-        """_summary_
-        example response:
-            {
-                'id': '1010101010101010101'
-            }
+        When `deadline` expires the in-flight step is cancelled and
+        DeadlineExceeded is raised.
         """
-        thread = self.create_thread(text, image_url)
+        with deadline_scope(deadline) as scope:
+            if scope is None:
+                return await self._post_thread(text, image_url, idempotency_key)
+            try:
+                return await asyncio.wait_for(self._post_thread(text, image_url, idempotency_key), scope.remaining())
+            except asyncio.TimeoutError as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                raise DeadlineExceeded("post_thread exceeded its deadline") from e
+
+    async def _post_thread(self, text, image_url, idempotency_key=None):
+        if idempotency_key is not None:
+            record = self.idempotency_ledger.begin(idempotency_key, IdempotencyLedger.fingerprint(text, image_url))
+            if record['state'] == 'published':
+                return {'id': record['media_id']}
+        await self._check_publish_gate()
+        thread = await self.create_thread(text, image_url, idempotency_key)
         container_id = thread['id']
+        return await self._poll_and_publish(
+            container_id, self.poller.start(_media_type(image_url)), idempotency_key=idempotency_key,
+        )
 
-        # Poll container status until FINISHED or PUBLISHED, with a timeout
-        status = self.get_container_status(container_id)
-        wait_secs = 0
-        max_wait = 60  # seconds
-        interval = 5
-        while status in ['IN_PROGRESS'] and wait_secs < max_wait:
-            import time
-            time.sleep(interval)
-            wait_secs += interval
-            status = self.get_container_status(container_id)
+    async def _poll_and_publish(self, container_id, schedule, call=None, idempotency_key=None) -> dict:
+        call = call or (lambda coro_fn, *args: coro_fn(*args))
+        status = 'IN_PROGRESS'
+        while status in ['IN_PROGRESS']:
+            delay = schedule.next_delay()
+            if delay is None:
+                break
+            if delay:
+                await _async_sleep(delay, 'Container status polling')
+            status = await call(self.get_container_status, container_id)
 
+        if status == 'FINISHED':
+            schedule.finished()
         if status in ['ERROR', 'EXPIRED']:
-            raise Exception(f"Threads container not publishable: status={status}")
+            raise ThreadsPermanentError(f"Threads container not publishable: status={status}")
 
-        return self.publish_thread(container_id)
+        return await call(self.publish_thread, container_id, idempotency_key)
 
-    def create_thread(
-        self,
-        text,
-        image_url = None,
-    ) -> dict:
-        """_summary_
-        example response:
-            {
-                'id': '1010101010101010101'
-            }
+    async def publish_many(self, posts, max_concurrency=50):
+        """Async counterpart of ThreadsClient.publish_many.
+
+        Every post runs its own create/poll/publish pipeline as a task, with at
+        most `max_concurrency` API calls in flight. Results are yielded (as an
+        async generator) in completion order with the same dict shape.
         """
-        endpoint = f'/{self.user_id}/threads'
-        method = 'POST'
-        url = f'{self.base_url_v1}{endpoint}'
+        posts = [_normalize_post(post) for post in posts]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def limited(coro_fn, *args):
+            async with semaphore:
+                return await coro_fn(*args)
+
+        async def pipeline(index, post):
+            container_id = None
+            try:
+                thread = await limited(self.create_thread, post['text'], post.get('image_url'), post.get('idempotency_key'))
+                container_id = thread['id']
+                schedule = self.poller.start(_media_type(post.get('image_url')))
+                result = await self._poll_and_publish(
+                    container_id, schedule, call=limited, idempotency_key=post.get('idempotency_key'),
+                )
+                return {'index': index, 'container_id': container_id, 'result': result, 'error': None}
+            except Exception as e:
+                return {'index': index, 'container_id': container_id, 'result': None, 'error': e}
+
+        tasks = [asyncio.ensure_future(pipeline(index, post)) for index, post in enumerate(posts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def create_thread(self, text, image_url=None, idempotency_key=None) -> dict:
+        """See ThreadsClient.create_thread."""
+        if idempotency_key is not None:
+            record = self.idempotency_ledger.begin(idempotency_key, IdempotencyLedger.fingerprint(text, image_url))
+            container_id = self.idempotency_ledger.usable_container(record)
+            if container_id is not None:
+                return {'id': container_id}
+        url = f'{self.base_url_v1}/{await self.get_user_id()}/threads'
 
         data = {
             'text': text,
             'media_type': 'TEXT'
         }
-
         if image_url is not None:
             data['image_url'] = image_url
             data['media_type'] = 'IMAGE'
 
-        return self._request(
-            method=method,
-            url=url,
-            data=data,
-            use_form_data=True,
-        )
-
-    def publish_thread(self, thread_id) -> dict:
-        """_summary_
-        example response:
-            {
-                'success': True
-            }
-        """
-        endpoint = f'/{self.user_id}/threads_publish'
-        method = 'POST'
-        url = f'{self.base_url_v1}{endpoint}'
+        thread = await self._request(method='POST', url=url, data=data, use_form_data=True, circuit='threads')
+        if idempotency_key is not None:
+            self.idempotency_ledger.set_container(idempotency_key, thread['id'])
+        return thread
 
+    async def publish_thread(self, thread_id, idempotency_key=None) -> dict:
+        """See ThreadsClient.publish_thread."""
+        if idempotency_key is not None:
+            resumed = await self._resume_publish(thread_id, idempotency_key)
+            if resumed is not None:
+                return resumed
+        reservation = await self._check_publish_gate(reserve=True)
+        url = f'{self.base_url_v1}/{await self.get_user_id()}/threads_publish'
         data = {'creation_id': thread_id}
+        if idempotency_key is not None:
+            self.idempotency_ledger.set_publishing(idempotency_key)
+        try:
+            result = await self._request(method='POST', url=url, data=data, use_form_data=True, circuit='threads_publish')
+        except Exception:
+            if idempotency_key is not None and await self._confirm_published(thread_id, idempotency_key):
+                return {'id': None}
+            if reservation is not None:
+                self.publish_ledger.release(reservation)
+            raise
+        self._record_published(idempotency_key, result.get('id'))
+        return result
 
-        return self._request(
-            method=method,
-            url=url,
-            data=data,
-            use_form_data=True,
-        )
+    async def _resume_publish(self, thread_id, idempotency_key):
+        """See ThreadsClient._resume_publish."""
+        record = _idempotent_publish_record(self.idempotency_ledger, thread_id, idempotency_key)
+        if record['state'] == 'published':
+            return {'id': record['media_id']}
+        if record['state'] == 'publishing' and await self._confirm_published(thread_id, idempotency_key):
+            return {'id': None}
+        return None
 
-    def get_container_status(self, container_id: str) -> str:
-        """Check publishing status for a container ID."""
-        endpoint = f'/{container_id}'
-        method = 'GET'
-        url = f'{self.base_url_v1}{endpoint}'
+    async def _confirm_published(self, thread_id, idempotency_key) -> bool:
+        """See ThreadsClient._confirm_published."""
+        try:
+            status = await self.get_container_status(thread_id)
+        except Exception as e:
+            logger.warning('⚠️  Could not confirm publish state of container %s: %s', thread_id, e)
+            return False
+        if status != 'PUBLISHED':
+            return False
+        self._record_published(idempotency_key, None)
+        return True
 
-        resp = self._request(
-            method=method,
+    async def _check_publish_gate(self, reserve=False):
+        """See ThreadsClient._check_publish_gate."""
+        ledger = self.publish_ledger
+        if ledger is None:
+            return None
+        self._bind_state_keys()
+        if ledger.needs_reconcile():
+            await self.check_publishing_quota()
+            if ledger.needs_reconcile():
+                ledger.defer_reconcile()
+        return _publish_gate(ledger, reserve)
+
+    async def get_container_status(self, container_id: str) -> str:
+        """Check publishing status for a container ID."""
+        url = f'{self.base_url_v1}/{container_id}'
+        resp = await self._request(
+            method='GET',
             url=url,
             params={'fields': 'status', 'access_token': self.auth_token},
+            circuit='container_status',
         )
         return resp.get('status', 'UNKNOWN')
 
-    def retrieve_thread(
-        self,
-        media_id,
-    ) -> dict:
-        """_summary_
-        example response:
-            {
-                'data': [
-                    {
-                        'id': '1010101010101010101',
-                        'text': 'Hello World!',
-                        'likes_count': 0,
-                        'replies_count': 0,
-                        'retweets_count': 0,
-                        'created_at': '2023-05-25T00:00:00Z'
-                    },
-                    {
-                        'id': '2020202020202020202',
-                        'text': 'Hello Threads!',
-                        'likes_count': 0,
-                        'replies_count': 0,
-                        'retweets_count': 0,
-                        'created_at': '2023-05-25T00:00:00Z'
-        """
-        endpoint = f'/me/threads'
-        method = 'GET'
-        url = f'{self.base_url_v1}{endpoint}'
+    async def delete_thread(self, media_id) -> dict:
+        """See ThreadsClient.delete_thread."""
+        url = f'{self.base_url_v1}/{media_id}'
+        result = await self._request(method='DELETE', url=url, params={'access_token': self.auth_token}, circuit='delete')
+        self.invalidate_cache(*self.INVALIDATE_ON_DELETE)
+        return result
 
-        return self._request(
-            method=method,
+    async def retrieve_thread(self, media_id=None, limit=None, since=None, until=None, after=None) -> dict:
+        """See ThreadsClient.retrieve_thread."""
+        url = f'{self.base_url_v1}/me/threads'
+        return await self._request(
+            method='GET',
             url=url,
-            params={
-                'fields': 'id,text,likes_count,replies_count,retweets_count,created_at,permalink',
-                'id': media_id,
-                'access_token': self.auth_token
-            },
+            params=_threads_page_params(ThreadsClient.THREAD_FIELDS, limit, since, until, after, self.auth_token),
+            circuit='me_threads',
         )
 
-    def check_publishing_quota(self) -> dict:
-        """Check current Threads API publishing quota usage.
+    async def iter_threads(self, since=None, until=None, limit=None, page_size=None, prefetch=False):
+        """Async generator counterpart of ThreadsClient.iter_threads.
 
-        Per official docs (https://developers.facebook.com/docs/threads/overview#rate-limiting):
-        - Threads profiles are limited to 250 API-published posts within a 24-hour moving period.
+        With prefetch the next page is requested as a task while the caller
+        consumes the current one.
+        """
+        if limit is not None and limit <= 0:
+            return
+        page_size = min(page_size or ThreadsClient.THREADS_PAGE_SIZE, 100)
 
-        Returns:
-            dict with keys:
-                quota_usage (int): current number of posts in 24h window
-                quota_total (int): max allowed posts (250)
-                quota_remaining (int): posts remaining
-                can_publish (bool): whether a new post can be published
+        async def fetch(after, remaining):
+            size = page_size if remaining is None else min(page_size, remaining)
+            return await self.retrieve_thread(limit=size, since=since, until=until, after=after)
 
-        Example API response:
-            {
-              "data": [{
-                "quota_usage": 4,
-                "config": {"quota_total": 250, "quota_duration": 86400}
-              }]
-            }
-        """
-        endpoint = f'/{self.user_id}/threads_publishing_limit'
-        method = 'GET'
-        url = f'{self.base_url_v1}{endpoint}'
+        next_page = None
+        try:
+            remaining = limit
+            page = await fetch(None, remaining)
+            while True:
+                posts = page.get('data', [])
+                after = _next_cursor(page)
+                if remaining is not None:
+                    posts = posts[:remaining]
+                    remaining -= len(posts)
+                if after is not None and remaining != 0 and prefetch:
+                    next_page = asyncio.ensure_future(fetch(after, remaining))
+                for post in posts:
+                    yield post
+                if after is None or remaining == 0:
+                    return
+                if next_page is not None:
+                    page, next_page = await next_page, None
+                else:
+                    page = await fetch(after, remaining)
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def retrieve_threads(self, media_ids, chunk_size=None, max_concurrency=4) -> dict:
+        """See ThreadsClient.retrieve_threads; chunks are looked up as concurrent tasks."""
+        media_ids = list(dict.fromkeys(str(media_id) for media_id in media_ids))
+        chunk_size = min(chunk_size or ThreadsClient.MAX_IDS_PER_REQUEST, ThreadsClient.MAX_IDS_PER_REQUEST)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        results = {}
+
+        async def lookup(chunk):
+            try:
+                async with semaphore:
+                    found = await self._retrieve_ids(chunk)
+            except Exception as e:
+                if _should_split_lookup(e, chunk):
+                    middle = len(chunk) // 2
+                    await asyncio.gather(lookup(chunk[:middle]), lookup(chunk[middle:]))
+                else:
+                    _record_lookup(results, chunk, error=e)
+                return
+            _record_lookup(results, chunk, found=found)
+
+        await asyncio.gather(*(
+            lookup(media_ids[start:start + chunk_size]) for start in range(0, len(media_ids), chunk_size)
+        ))
+        return {media_id: results[media_id] for media_id in media_ids}
+
+    async def _retrieve_ids(self, media_ids) -> dict:
+        url = f'{self.base_url_v1}/'
+        return await self._request(
+            method='GET',
+            url=url,
+            params={'ids': ','.join(media_ids), 'fields': ThreadsClient.THREAD_FIELDS, 'access_token': self.auth_token},
+            circuit='ids',
+        )
+
+    async def retrieve_user_insights(self, metric='views', since=None, until=None) -> dict:
+        """See ThreadsClient.retrieve_user_insights."""
+        url = f'{self.base_url_v1}/{await self.get_user_id()}/threads_insights'
+        params = {'metric': metric, 'access_token': self.auth_token}
+        if since is not None:
+            params['since'] = int(since)
+        if until is not None:
+            params['until'] = int(until)
+        return await self._request(method='GET', url=url, params=params, circuit='threads_insights')
+
+    async def update_rate_limit_from_insights(self) -> int:
+        """See ThreadsClient.update_rate_limit_from_insights."""
+        now = time.time()
+        resp = await self.retrieve_user_insights(metric='views', since=now - RateLimiter.WINDOW_SECONDS, until=now)
+        impressions = _sum_insight_values(resp)
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter(impressions=impressions)
+        else:
+            self.rate_limiter.set_impressions(impressions)
+        return impressions
+
+    async def check_publishing_quota(self) -> dict:
+        """See ThreadsClient.check_publishing_quota (fails open the same way)."""
+        url = f'{self.base_url_v1}/{await self.get_user_id()}/threads_publishing_limit'
 
         try:
-            resp = self._request(
-                method=method,
+            resp = await self._request(
+                method='GET',
                 url=url,
                 params={
                     'fields': 'quota_usage,config',
                     'access_token': self.auth_token
                 },
+                circuit='threads_publishing_limit',
             )
 
-            data = resp.get('data', [{}])[0]
-            quota_usage = data.get('quota_usage', 0)
-            config = data.get('config', {})
-            quota_total = config.get('quota_total', 250)
+            return self._publishing_quota(resp)
+        except Exception as e:
+            return _unknown_publishing_quota(e)
 
-            result = {
-                'quota_usage': quota_usage,
-                'quota_total': quota_total,
-                'quota_remaining': quota_total - quota_usage,
-                'can_publish': quota_usage < quota_total,
-            }
-            print(f"📊 Threads publishing quota: {quota_usage}/{quota_total} used, {result['quota_remaining']} remaining")
-            return result
+class OutboxWorkerPool:
+    """Worker threads draining a PublishOutbox through client.post_thread.
+
+    Every post is published under its outbox idempotency key, recorded in a
+    durable client.idempotency_ledger: when the outbox is file-backed and the
+    client's ledger is not, an IdempotencyLedger in the outbox's file is
+    attached to the client. A post whose worker died between create and
+    publish is then resumed by the next worker: the confirmed container is
+    reused and a publish that already landed is confirmed instead of repeated.
+
+    Publishing respects the 250/24h window through client.publish_ledger
+    (an in-memory one is attached if the client has none), which is
+    reconciled with check_publishing_quota(). While the window is full, no
+    posts are leased and they stay queued until the next slot opens.
+
+        outbox = PublishOutbox('outbox.db')
+        client = ThreadsClient(token)
+        outbox.enqueue('Hello Threads!', publish_at=time.time() + 3600)
+        with OutboxWorkerPool(client, outbox, workers=4):
+            ...  # workers run until stop() / the end of the block
+    """
+    MAX_ATTEMPTS = 5
+    RETRY_BACKOFF_SECONDS = 30
+    MAX_RETRY_BACKOFF_SECONDS = 3600
+    # Pause after the API reports the publish limit while the local ledger still sees free slots
+    PUBLISH_LIMIT_PAUSE_SECONDS = 900
+    POLL_SECONDS = 5.0
+
+    def __init__(self, client, outbox, workers=4, max_attempts=MAX_ATTEMPTS, poll_interval=POLL_SECONDS, owner=None):
+        """
+        Args:
+            client: ThreadsClient used for every API call
+            outbox: PublishOutbox to drain
+            workers: number of worker threads
+            max_attempts: leases per post before it is marked failed
+            poll_interval: longest sleep between checks for newly due posts
+            owner: lease owner name for this process (default: pid + random suffix)
+        """
+        self.client = client
+        self.outbox = outbox
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.owner = owner or f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        if client.publish_ledger is None:
+            client.publish_ledger = PublishLedger()
+        ledger = client._idempotency_ledger
+        if outbox.path is not None and (ledger is None or ledger.path is None):
+            # Crash recovery needs the publish steps to outlive the process, like the outbox itself
+            client.idempotency_ledger = IdempotencyLedger(outbox.path)
+        # Unix time before which no post is leased (publish window full)
+        self._paused_until = 0.0
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> 'OutboxWorkerPool':
+        """Start the worker threads; they run until stop()."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, args=(False,), name=f'threads-outbox-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """Stop leasing new posts; with wait=True, let posts in progress finish first."""
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def drain(self):
+        """Publish everything that is due now with the worker threads, then return.
+
+        Handy for cron-style runs. Returns early while the publish window is
+        full; remaining posts stay queued.
+        """
+        self._stop.clear()
+        threads = [threading.Thread(target=self._run, args=(True,), daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self, until_idle):
+        while not self._stop.is_set():
+            try:
+                entry = self.process_one()
+            except Exception as e:
+                # e.g. the outbox database is locked; keep the worker alive
+                logger.error('❌ Outbox worker error: %s', e)
+                entry = None
+            if entry is not None:
+                continue
+            if until_idle:
+                return
+            self._stop.wait(self._idle_seconds())
+
+    def _idle_seconds(self) -> float:
+        now = time.time()
+        if self._paused_until > now:
+            return min(self.poll_interval, self._paused_until - now)
+        due_at = self.outbox.next_due_at()
+        if due_at is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.0, due_at - now))
+
+    def process_one(self):
+        """Lease one due post and run it through create / poll / publish in this thread.
+
+        Returns the entry as left in the outbox, or None when nothing was
+        due (or the publish window is full).
+        """
+        if time.time() < self._paused_until:
+            return None
+        try:
+            # Gate before leasing so a full window leaves posts queued untouched
+            self.client._check_publish_gate()
+        except PublishQuotaExceeded as e:
+            self._pause(e.retry_at)
+            return None
+
+        entry = self.outbox.lease(self.owner)
+        if entry is None:
+            return None
+        entry_id = entry['id']
+        try:
+            # Finish well inside the lease so no other worker picks the post up mid-publish
+            result = self.client.post_thread(
+                entry['text'],
+                entry['image_url'],
+                deadline=self.outbox.lease_seconds * 0.9,
+                idempotency_key=entry['idempotency_key'],
+            )
+        except PublishQuotaExceeded as e:
+            self._pause(e.retry_at)
+            self.outbox.release(entry_id, self.owner, e.retry_at, error=e, count_attempt=False)
+        except ThreadsAPIError as e:
+            if e.error_subcode == PUBLISH_LIMIT_SUBCODE:
+                retry_at = self._publish_limit_reached()
+                self.outbox.release(entry_id, self.owner, retry_at, error=e, count_attempt=False)
+            else:
+                self._retry_or_fail(entry, e, retryable=e.retryable)
         except Exception as e:
-            # クォータチェックが失敗しても投稿自体はブロックしない（フェイルオープン）
-            print(f"⚠️  Failed to check Threads publishing quota: {e}")
-            return {
-                'quota_usage': -1,
-                'quota_total': 250,
-                'quota_remaining': -1,
-                'can_publish': True,  # チェック失敗時は投稿を許可（API側で制限される）
-            }
+            # Connection trouble, open circuits and deadlines are worth another lease;
+            # idempotency conflicts and bad input are not
+            self._retry_or_fail(entry, e, retryable=not isinstance(e, (IdempotencyConflict, ValueError, TypeError)))
+        else:
+            self.outbox.complete(entry_id, self.owner, result.get('id'))
+            logger.info('✅ Outbox post %s published: %s', entry_id, result.get('id'))
+        return self.outbox.get(entry_id)
+
+    def _retry_or_fail(self, entry, error, retryable):
+        if not retryable or entry['attempts'] >= self.max_attempts:
+            logger.error('❌ Outbox post %s failed after %d attempt(s): %s', entry['id'], entry['attempts'], error)
+            self.outbox.fail(entry['id'], self.owner, error)
+            return
+        delay = min(self.MAX_RETRY_BACKOFF_SECONDS, self.RETRY_BACKOFF_SECONDS * 2 ** (entry['attempts'] - 1))
+        delay = random.uniform(delay / 2, delay)
+        logger.warning(
+            '⚠️  Outbox post %s attempt %d failed: %s. Retrying in %.0fs', entry['id'], entry['attempts'], error, delay,
+        )
+        self.outbox.release(entry['id'], self.owner, time.time() + delay, error=error)
+
+    def _publish_limit_reached(self) -> float:
+        """The API refused a publish for quota: resync the ledger and pause until the next slot."""
+        self.client.check_publishing_quota()
+        retry_at = self.client.publish_ledger.next_slot_at()
+        if retry_at <= time.time():
+            retry_at = time.time() + self.PUBLISH_LIMIT_PAUSE_SECONDS
+        self._pause(retry_at)
+        return retry_at
+
+    def _pause(self, until):
+        if until is not None and until > self._paused_until:
+            logger.warning('⏸️  Threads publish window full; outbox paused for %.0fs', until - time.time())
+            self._paused_until = until
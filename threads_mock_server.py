@@ -0,0 +1,610 @@
+"""Stateful local stand-in for graph.threads.net, for load tests and benchmarks.
+
+Implements the endpoints ThreadsClient uses:
+
+    GET  /v1.0/me
+    POST /v1.0/{user_id}/threads
+    POST /v1.0/{user_id}/threads_publish
+    GET  /v1.0/{container_id}?fields=status
+    GET  /v1.0/me/threads
+    GET  /v1.0/?ids=a,b,c
+    DELETE /v1.0/{media_id}
+    GET  /v1.0/{user_id}/threads_publishing_limit
+    GET  /v1.0/{user_id}/threads_insights
+    GET  /refresh_access_token
+
+Containers move from IN_PROGRESS to FINISHED (or ERROR) after a configurable
+per-media-type delay and to EXPIRED when left unpublished, the 250-post
+24h window is enforced per user, and tokens expire. An optional per-user
+call limit reports X-App-Usage and answers over-limit calls with error
+code 4 and Retry-After.
+
+Run it over HTTP:
+
+    python threads_mock_server.py --port 8080 --token test-token
+
+    client = ThreadsClient('test-token', base_url_v1='http://127.0.0.1:8080/v1.0')
+
+or skip sockets entirely with MockTransport:
+
+    api = MockThreadsAPI()
+    token = api.issue_token()
+    client = ThreadsClient(token, transport=MockTransport(api))
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import parse_qsl, urlsplit
+
+from threads_client import Transport, TransportResponse
+
+
+class MockThreadsAPI:
+    """In-memory model of the Threads Graph API.
+
+    handle() takes a parsed request and returns (status_code, body, headers);
+    it is shared by MockThreadsServer (HTTP) and MockTransport (in process).
+    """
+    API_VERSION = 'v1.0'
+    DEFAULT_PROCESSING_DELAYS = {
+        'TEXT': 0.0,
+        'IMAGE': 1.0,
+        'CAROUSEL': 3.0,
+        'VIDEO': 30.0,
+    }
+    # Most IDs accepted by one ?ids= lookup
+    MAX_IDS = 50
+
+    def __init__(
+        self,
+        processing_delays=None,
+        error_rate=0.0,
+        container_ttl=86400,
+        publish_limit=250,
+        publish_window=86400,
+        token_ttl=5184000,
+        call_limit=None,
+        call_window=3600,
+        seed=None,
+    ):
+        """
+        Args:
+            processing_delays: {media_type: seconds} until a container leaves IN_PROGRESS
+            error_rate: probability that a container ends in ERROR instead of FINISHED
+            container_ttl: seconds after which an unpublished container is EXPIRED
+            publish_limit: posts allowed per user per publish_window
+            publish_window: moving window for publish_limit, in seconds
+            token_ttl: lifetime of issued and refreshed tokens, in seconds
+            call_limit: API calls allowed per user per call_window (None: unlimited);
+                responses then carry X-App-Usage, and over-limit calls get
+                error code 4 with a Retry-After header
+            call_window: moving window for call_limit, in seconds
+            seed: seed for the ERROR outcome draw, for reproducible runs
+        """
+        self.processing_delays = {**self.DEFAULT_PROCESSING_DELAYS, **(processing_delays or {})}
+        self.error_rate = error_rate
+        self.container_ttl = container_ttl
+        self.publish_limit = publish_limit
+        self.publish_window = publish_window
+        self.token_ttl = token_ttl
+        self.call_limit = call_limit
+        self.call_window = call_window
+        self._random = random.Random(seed)
+        self._ids = itertools.count(17900000000000001)
+        self._lock = threading.Lock()
+        # token -> {'user_id', 'expires_at'}
+        self.tokens = {}
+        # user_id -> {'id', 'username', ...}
+        self.users = {}
+        # container_id -> {'user_id', 'media_type', 'text', 'created_at', 'ready_at', 'outcome', 'media_id'}
+        self.containers = {}
+        # media_id -> published post
+        self.media = {}
+        # user_id -> [media_id, ...] newest last
+        self.timelines = {}
+        # user_id -> [published_at, ...]
+        self.publish_log = {}
+        # user_id -> deque of call times, for call_limit
+        self.call_log = {}
+        self.request_count = 0
+
+    def _next_id(self) -> str:
+        return str(next(self._ids))
+
+    # --- setup -----------------------------------------------------------
+
+    def add_user(self, username=None, user_id=None) -> str:
+        with self._lock:
+            user_id = user_id or self._next_id()
+            self.users[user_id] = {
+                'id': user_id,
+                'username': username or f'user_{user_id[-6:]}',
+                'threads_profile_picture_url': f'https://example.invalid/{user_id}.jpg',
+                'threads_biography': '',
+            }
+            self.timelines.setdefault(user_id, [])
+            self.publish_log.setdefault(user_id, [])
+            return user_id
+
+    def issue_token(self, user_id=None, ttl=None, token=None) -> str:
+        """Create (or re-register) an access token; creates a user if none is given."""
+        if user_id is None or user_id not in self.users:
+            user_id = self.add_user(user_id=user_id)
+        token = token or f'MOCK{uuid.uuid4().hex}'
+        with self._lock:
+            self.tokens[token] = {
+                'user_id': user_id,
+                'expires_at': time.time() + (self.token_ttl if ttl is None else ttl),
+            }
+        return token
+
+    def expire_token(self, token):
+        with self._lock:
+            self.tokens[token]['expires_at'] = time.time() - 1
+
+    # --- request handling ------------------------------------------------
+
+    @staticmethod
+    def _error(status, message, code, error_type='OAuthException', subcode=None):
+        error = {
+            'message': message,
+            'type': error_type,
+            'code': code,
+            'fbtrace_id': uuid.uuid4().hex[:22],
+        }
+        if subcode is not None:
+            error['error_subcode'] = subcode
+        return status, {'error': error}, {}
+
+    def _authenticate(self, token, now):
+        record = self.tokens.get(token)
+        if record is None:
+            return None, self._error(400, 'Invalid OAuth access token - Cannot parse access token', 190)
+        if record['expires_at'] <= now:
+            return None, self._error(
+                401, 'Error validating access token: Session has expired.', 190, subcode=463,
+            )
+        return record['user_id'], None
+
+    def handle(self, method, path, params=None, form=None, headers=None):
+        """Serve one request; returns (status_code, body_dict, extra_headers)."""
+        params = {**(params or {}), **(form or {})}
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        token = params.pop('access_token', None)
+        if token is None and headers.get('authorization', '').startswith('Bearer '):
+            token = headers['authorization'][len('Bearer '):]
+        now = time.time()
+
+        with self._lock:
+            self.request_count += 1
+            segments = [segment for segment in path.split('/') if segment]
+            if segments == ['refresh_access_token']:
+                return self._refresh(token, params, now)
+            if not segments or segments[0] != self.API_VERSION:
+                return self._error(404, f'Unknown path {path}', 803, 'GraphMethodException')
+            segments = segments[1:]
+
+            user_id, error = self._authenticate(token, now)
+            if error:
+                return error
+            if self.call_limit is None:
+                return self._route(user_id, method, path, segments, params, now)
+
+            calls = self.call_log.setdefault(user_id, deque())
+            while calls and calls[0] <= now - self.call_window:
+                calls.popleft()
+            if len(calls) >= self.call_limit:
+                status, body, headers = self._error(400, 'Application request limit reached', 4)
+                retry_after = math.ceil(calls[0] + self.call_window - now)
+                return status, body, {**headers, **self._usage_headers(100), 'Retry-After': str(retry_after)}
+            calls.append(now)
+            status, body, headers = self._route(user_id, method, path, segments, params, now)
+            percent = min(100, int(100 * len(calls) / self.call_limit))
+            return status, body, {**headers, **self._usage_headers(percent)}
+
+    @staticmethod
+    def _usage_headers(percent):
+        return {'X-App-Usage': json.dumps({'call_count': percent, 'total_cputime': 0, 'total_time': 0})}
+
+    def _route(self, user_id, method, path, segments, params, now):
+        if not segments and method == 'GET' and 'ids' in params:
+            return self._get_objects(user_id, params, now)
+        if segments == ['me'] and method == 'GET':
+            return 200, self._fields(self.users[user_id], params), {}
+        if segments == ['me', 'threads'] and method == 'GET':
+            return self._list_threads(user_id, params)
+        if len(segments) == 2 and segments[0] in (user_id, 'me'):
+            action = segments[1]
+            if action == 'threads' and method == 'POST':
+                return self._create_container(user_id, params, now)
+            if action == 'threads' and method == 'GET':
+                return self._list_threads(user_id, params)
+            if action == 'threads_publish' and method == 'POST':
+                return self._publish(user_id, params, now)
+            if action == 'threads_publishing_limit' and method == 'GET':
+                return self._publishing_limit(user_id, now)
+            if action == 'threads_insights' and method == 'GET':
+                return self._insights(user_id, params, now)
+        if len(segments) == 1 and method == 'GET':
+            return self._get_object(user_id, segments[0], params, now)
+        if len(segments) == 1 and method == 'DELETE':
+            return self._delete_media(user_id, segments[0])
+        return self._error(400, f'Unsupported {method} request for {path}', 100, 'GraphMethodException', 33)
+
+    def _refresh(self, token, params, now):
+        if params.get('grant_type') != 'th_refresh_token':
+            return self._error(400, 'Unsupported grant_type', 100)
+        user_id, error = self._authenticate(token, now)
+        if error:
+            return error
+        new_token = f'MOCK{uuid.uuid4().hex}'
+        self.tokens[new_token] = {'user_id': user_id, 'expires_at': now + self.token_ttl}
+        return 200, {'access_token': new_token, 'token_type': 'bearer', 'expires_in': self.token_ttl}, {}
+
+    @staticmethod
+    def _fields(obj, params):
+        fields = params.get('fields')
+        if not fields:
+            return {'id': obj['id']}
+        return {name: obj[name] for name in fields.split(',') if name in obj}
+
+    def _container_status(self, container, now):
+        if container['media_id'] is not None:
+            return 'PUBLISHED'
+        if now >= container['created_at'] + self.container_ttl:
+            return 'EXPIRED'
+        if now < container['ready_at']:
+            return 'IN_PROGRESS'
+        return container['outcome']
+
+    def _create_container(self, user_id, params, now):
+        media_type = params.get('media_type', 'TEXT')
+        if media_type == 'TEXT' and not params.get('text'):
+            return self._error(400, 'The parameter text is required', 100, 'THApiException', 4279009)
+        if media_type == 'IMAGE' and not params.get('image_url'):
+            return self._error(400, 'The parameter image_url is required', 100, 'THApiException')
+        container_id = self._next_id()
+        outcome = 'ERROR' if self._random.random() < self.error_rate else 'FINISHED'
+        self.containers[container_id] = {
+            'user_id': user_id,
+            'media_type': media_type,
+            'text': params.get('text', ''),
+            'created_at': now,
+            'ready_at': now + self.processing_delays.get(media_type, 0.0),
+            'outcome': outcome,
+            'media_id': None,
+        }
+        return 200, {'id': container_id}, {}
+
+    def _publish(self, user_id, params, now):
+        container = self.containers.get(params.get('creation_id', ''))
+        if container is None or container['user_id'] != user_id:
+            return self._error(400, 'Media ID is not available', 9007, 'THApiException', 2207027)
+        status = self._container_status(container, now)
+        if status == 'IN_PROGRESS':
+            return self._error(400, 'Media is not ready for publishing, please wait for a moment', 9007, 'THApiException', 2207027)
+        if status != 'FINISHED':
+            return self._error(400, f'Media cannot be published (status={status})', 24, 'THApiException', 2207032)
+
+        log = self.publish_log[user_id]
+        cutoff = now - self.publish_window
+        while log and log[0] <= cutoff:
+            log.pop(0)
+        if len(log) >= self.publish_limit:
+            return self._error(
+                400,
+                'You reached maximum number of posts that is allowed to be published by Content Publishing API.',
+                4, 'THApiException', 2207042,
+            )
+
+        media_id = self._next_id()
+        container['media_id'] = media_id
+        log.append(now)
+        self.media[media_id] = {
+            'id': media_id,
+            'text': container['text'],
+            'media_type': container['media_type'],
+            'media_product_type': 'THREADS',
+            'permalink': f'https://www.threads.net/@{self.users[user_id]["username"]}/post/{media_id}',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S+0000', time.gmtime(now)),
+            'created_at': now,
+            'owner': user_id,
+            'likes_count': 0,
+            'replies_count': 0,
+            'retweets_count': 0,
+        }
+        self.timelines[user_id].append(media_id)
+        return 200, {'id': media_id}, {}
+
+    def _get_object(self, user_id, object_id, params, now):
+        container = self.containers.get(object_id)
+        if container is not None:
+            body = {'id': object_id, 'status': self._container_status(container, now)}
+            if body['status'] == 'ERROR':
+                body['error_message'] = 'UNKNOWN'
+            return 200, body, {}
+        post = self.media.get(object_id)
+        if post is not None:
+            return 200, self._fields(post, params), {}
+        return self._error(
+            400, f"Unsupported get request. Object with ID '{object_id}' does not exist", 100,
+            'GraphMethodException', 33,
+        )
+
+    def _delete_media(self, user_id, media_id):
+        post = self.media.get(media_id)
+        if post is None or post['owner'] != user_id:
+            return self._error(
+                400, f"Unsupported delete request. Object with ID '{media_id}' does not exist", 100,
+                'GraphMethodException', 33,
+            )
+        del self.media[media_id]
+        self.timelines[user_id].remove(media_id)
+        return 200, {'success': True, 'deleted_id': media_id}, {}
+
+    def _get_objects(self, user_id, params, now):
+        # Like the Graph API, one unknown ID fails the whole lookup
+        ids = [object_id for object_id in params['ids'].split(',') if object_id]
+        if len(ids) > self.MAX_IDS:
+            return self._error(400, f'Too many IDs. Maximum: {self.MAX_IDS}', 100)
+        body = {}
+        for object_id in ids:
+            status, obj, headers = self._get_object(user_id, object_id, params, now)
+            if status != 200:
+                return status, obj, headers
+            body[object_id] = obj
+        return 200, body, {}
+
+    def _list_threads(self, user_id, params):
+        limit = min(int(params.get('limit', 25)), 100)
+        since = float(params['since']) if 'since' in params else None
+        until = float(params['until']) if 'until' in params else None
+        # Newest first, like the real timeline; cursors are positions in that order
+        timeline = self.timelines[user_id][::-1]
+        start = int(params.get('after', 0) or 0)
+        page = []
+        position = start
+        while position < len(timeline) and len(page) < limit:
+            post = self.media[timeline[position]]
+            position += 1
+            if until is not None and post['created_at'] > until:
+                continue
+            if since is not None and post['created_at'] < since:
+                position = len(timeline)
+                break
+            page.append(self._fields(post, params))
+        body = {'data': page, 'paging': {'cursors': {'before': str(start), 'after': str(position)}}}
+        if position < len(timeline):
+            body['paging']['next'] = f'/{self.API_VERSION}/me/threads?after={position}&limit={limit}'
+        return 200, body, {}
+
+    def _publishing_limit(self, user_id, now):
+        cutoff = now - self.publish_window
+        usage = sum(1 for published_at in self.publish_log[user_id] if published_at > cutoff)
+        return 200, {
+            'data': [{
+                'quota_usage': usage,
+                'config': {'quota_total': self.publish_limit, 'quota_duration': self.publish_window},
+            }],
+        }, {}
+
+    def _insights(self, user_id, params, now):
+        metrics = params.get('metric', 'views').split(',')
+        data = []
+        for metric in metrics:
+            value = len(self.timelines[user_id]) * 100 if metric == 'views' else 0
+            data.append({
+                'name': metric,
+                'period': 'day',
+                'values': [{'value': value, 'end_time': time.strftime('%Y-%m-%dT%H:%M:%S+0000', time.gmtime(now))}],
+                'id': f'{user_id}/insights/{metric}/day',
+            })
+        return 200, {'data': data}, {}
+
+
+class MockTransport(Transport):
+    """Transport that serves ThreadsClient from a MockThreadsAPI without sockets."""
+
+    def __init__(self, api=None, latency=0.0):
+        self.api = api or MockThreadsAPI()
+        self.latency = latency
+
+    def _serve(self, method, url, params, data, json_body, headers):
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+        query.update({key: str(value) for key, value in (params or {}).items()})
+        form = {key: str(value) for key, value in {**(data or {}), **(json_body or {})}.items()}
+        status, body, extra_headers = self.api.handle(method, parts.path, query, form, headers)
+        return TransportResponse(
+            status, {'Content-Type': 'application/json', **extra_headers}, json.dumps(body).encode(),
+        )
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None) -> TransportResponse:
+        if timeout is not None and timeout[1] is not None and self.latency > timeout[1]:
+            time.sleep(timeout[1])
+            raise TimeoutError(f'Simulated read timeout after {timeout[1]}s')
+        if self.latency:
+            time.sleep(self.latency)
+        return self._serve(method, url, params, data, json, headers)
+
+
+class _HTTPProtocol(asyncio.Protocol):
+    """Minimal HTTP/1.1 keep-alive protocol: enough for API clients, cheap per request."""
+    REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found', 500: 'Internal Server Error'}
+
+    def __init__(self, api):
+        self.api = api
+        self.transport = None
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        while True:
+            head_end = self.buffer.find(b'\r\n\r\n')
+            if head_end < 0:
+                return
+            lines = self.buffer[:head_end].decode('latin-1').split('\r\n')
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+            if len(self.buffer) < head_end + 4 + length:
+                return
+            body = self.buffer[head_end + 4:head_end + 4 + length]
+            self.buffer = self.buffer[head_end + 4 + length:]
+            method, target, version = lines[0].split(' ', 2)
+            self._respond(method, target, headers, body, keep_alive=(
+                headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+            ))
+
+    def _respond(self, method, target, headers, body, keep_alive):
+        parts = urlsplit(target)
+        form = {}
+        if body:
+            if headers.get('content-type', '').startswith('application/json'):
+                form = {key: str(value) for key, value in (json.loads(body) or {}).items()}
+            else:
+                form = dict(parse_qsl(body.decode()))
+        status, response_body, extra_headers = self.api.handle(
+            method, parts.path, dict(parse_qsl(parts.query)), form, headers,
+        )
+        payload = json.dumps(response_body).encode()
+        head = [
+            f'HTTP/1.1 {status} {self.REASONS.get(status, "Error")}',
+            'Content-Type: application/json',
+            f'Content-Length: {len(payload)}',
+            f'Connection: {"keep-alive" if keep_alive else "close"}',
+        ]
+        head.extend(f'{name}: {value}' for name, value in extra_headers.items())
+        self.transport.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+        if not keep_alive:
+            self.transport.close()
+
+
+class MockThreadsServer:
+    """HTTP/1.1 keep-alive server around a MockThreadsAPI.
+
+    Runs an asyncio event loop in a background thread (start()/stop(), or use
+    it as a context manager, also ``async with``), or in the foreground via
+    serve_forever(). The socket is bound on the loop's own thread, so the
+    server can be started from code that is already inside an event loop
+    (async load tests, pytest-asyncio).
+    """
+
+    def __init__(self, api=None, host='127.0.0.1', port=0):
+        self.api = api or MockThreadsAPI()
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def base_url_v1(self) -> str:
+        return f'{self.base_url}/{MockThreadsAPI.API_VERSION}'
+
+    def bind(self) -> 'MockThreadsServer':
+        """Create the event loop and listening socket in the calling thread (port 0 picks a free port)."""
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(lambda: _HTTPProtocol(self.api), self.host, self.port)
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def serve_forever(self):
+        if self.loop is None:
+            self.bind()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    def start(self) -> 'MockThreadsServer':
+        """Serve from a background thread; returns once the port is bound."""
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            try:
+                self.bind()
+            except BaseException as e:
+                failure.append(e)
+                return
+            finally:
+                ready.set()
+            self.serve_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        return self
+
+    def stop(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    async def __aenter__(self):
+        return await asyncio.to_thread(self.start)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self.stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the Threads Graph API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--token', default='test-token', help='access token to register')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--image-delay', type=float, default=MockThreadsAPI.DEFAULT_PROCESSING_DELAYS['IMAGE'])
+    parser.add_argument('--video-delay', type=float, default=MockThreadsAPI.DEFAULT_PROCESSING_DELAYS['VIDEO'])
+    parser.add_argument('--publish-limit', type=int, default=250)
+    parser.add_argument('--call-limit', type=int, default=None, help='API calls allowed per user per hour')
+    args = parser.parse_args()
+
+    api = MockThreadsAPI(
+        processing_delays={'IMAGE': args.image_delay, 'VIDEO': args.video_delay},
+        error_rate=args.error_rate,
+        publish_limit=args.publish_limit,
+        call_limit=args.call_limit,
+    )
+    api.issue_token(token=args.token)
+    server = MockThreadsServer(api, args.host, args.port).bind()
+    print(f'Mock Threads API listening on {server.base_url_v1} (token: {args.token})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()